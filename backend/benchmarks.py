@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks for the in-process hot paths in server.py.
+
+Run from the backend directory, e.g. `python benchmarks.py matching`.
+Benchmarks marked as needing MongoDB seed and drop their own scratch database
+on MONGO_URL; the others only import the server module for its helpers.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'benchmarks')
+
+import fake_stripe  # noqa: E402
+import server  # noqa: E402
+
+logging.getLogger("stripe").setLevel(logging.WARNING)
+
+CITIES = [f"City {i}" for i in range(200)]
+SKILLS = ['Acrylic Colors', 'Watercolors', 'Pencil Work', 'Oil Painting', 'Charcoal', 'Digital Art', 'Sculpture', 'Calligraphy']
+
+def timings(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 4),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 4),
+        "p99_ms": round(samples[int(len(samples) * 0.99)] * 1000, 4),
+    }
+
+def measure(func, args_list: list) -> dict:
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - start)
+    return timings(samples)
+
+class InMemoryCollection:
+    """Just enough of a Motor collection for code that streams `find()` results"""
+    def __init__(self, documents: list):
+        self.documents = documents
+
+    def find(self, *args, **kwargs):
+        return self._stream()
+
+    async def _stream(self):
+        for document in self.documents:
+            yield document
+
+def synthetic_artists(count: int, rng: random.Random) -> list:
+    return [
+        {
+            "id": f"artist-{i}",
+            "city": rng.choice(CITIES),
+            "skills": rng.sample(SKILLS, rng.randint(1, 3)),
+            "rating": round(rng.uniform(0, 5), 1),
+            "total_orders": rng.randint(0, 50),
+            "annual_fee_paid": True,
+        }
+        for i in range(count)
+    ]
+
+def bench_matching(artists: int = 100_000, orders: int = 2_000) -> dict:
+    rng = random.Random(7)
+    profiles = synthetic_artists(artists, rng)
+    queries = [(rng.choice(CITIES), rng.choice(SKILLS)) for _ in range(orders)]
+
+    start = time.perf_counter()
+    matcher = server.ArtistMatcher()
+    asyncio.run(matcher.rebuild(InMemoryCollection(profiles)))
+    build_seconds = time.perf_counter() - start
+
+    def linear_scan(city, skill):
+        # What create_custom_order used to do with the two query results
+        priority_ids = [p['id'] for p in profiles if p['city'] == city and skill in p['skills']][:server.MATCH_LOCAL_LIMIT]
+        matching = [p['id'] for p in profiles if skill in p['skills']][:server.MATCH_OTHER_LIMIT]
+        return priority_ids, [artist_id for artist_id in matching if artist_id not in priority_ids]
+
+    updates = [(dict(rng.choice(profiles), rating=round(rng.uniform(0, 5), 1)),) for _ in range(orders)]
+    return {
+        "artists": artists,
+        "rebuild_ms": round(build_seconds * 1000, 1),
+        "match_indexed": measure(matcher.match, queries),
+        "match_linear_scan": measure(linear_scan, queries[:50]),
+        "incremental_upsert": measure(matcher.upsert, updates),
+    }
+
+TITLE_WORDS = ['Monsoon', 'Lotus', 'Temple', 'Village', 'Peacock', 'Sunset', 'Market', 'Dancer', 'River', 'Festival',
+               'Portrait', 'Elephant', 'Harbour', 'Forest', 'Courtyard', 'Rangoli', 'Mountain', 'Fisherman', 'Bazaar', 'Banyan']
+DESCRIPTION_WORDS = TITLE_WORDS + ['light', 'texture', 'colour', 'morning', 'evening', 'quiet', 'vivid', 'layered',
+                                   'traditional', 'modern', 'study', 'memory', 'journey', 'crowd', 'rain', 'gold']
+SEARCH_BENCH_DB = 'benchmarks_search'
+
+async def seed_artworks(collection, count: int, rng: random.Random, batch: int = 10_000):
+    for offset in range(0, count, batch):
+        await collection.insert_many([
+            {
+                "id": f"artwork-{i}",
+                "artist_id": f"artist-{rng.randrange(20_000)}",
+                "title": " ".join(rng.sample(TITLE_WORDS, 3)),
+                "description": " ".join(rng.choices(DESCRIPTION_WORDS, k=25)),
+                "category": rng.choice(SKILLS),
+                "price": float(rng.randint(500, 200_000)),
+                "currency": "INR",
+                "image_url": f"https://example.com/{i}.jpg",
+                "dimensions": "",
+                "status": "available",
+                "created_at": f"2025-01-01T00:00:00.{i:06d}+00:00",
+            }
+            for i in range(offset, min(offset + batch, count))
+        ], ordered=False)
+
+def bench_search(artworks: int = 500_000, queries: int = 200) -> dict:
+    """Needs MongoDB: seeds a synthetic catalogue and times /api/search's aggregation"""
+    rng = random.Random(11)
+    terms = [" ".join(rng.sample(TITLE_WORDS + SKILLS, rng.randint(1, 2))) for _ in range(queries)]
+
+    async def run() -> dict:
+        server.db.connect()
+        collection = server.db.client[SEARCH_BENCH_DB].artworks
+        await collection.drop()
+        try:
+            start = time.perf_counter()
+            await seed_artworks(collection, artworks, rng)
+            await collection.create_indexes(server.INDEXES["artworks"])
+            seed_seconds = time.perf_counter() - start
+
+            first_page, deep_page = [], []
+            for text in terms:
+                start = time.perf_counter()
+                _, _, cursor = await server.text_search(collection, text, {"status": "available"}, ["category"], None, 20)
+                first_page.append(time.perf_counter() - start)
+                if cursor:
+                    start = time.perf_counter()
+                    await server.text_search(collection, text, {"status": "available"}, ["category"], cursor, 20)
+                    deep_page.append(time.perf_counter() - start)
+            return {
+                "artworks": artworks,
+                "seed_and_index_s": round(seed_seconds, 1),
+                "first_page": timings(first_page),
+                "second_page": timings(deep_page) if deep_page else None,
+            }
+        finally:
+            await server.db.client.drop_database(SEARCH_BENCH_DB)
+
+    return asyncio.run(run())
+
+FAKE_STRIPE_PORT = 12111
+
+def bench_checkout(requests: int = 2_000, concurrency_levels: tuple = (1, 16, 64)) -> dict:
+    """Checkout session throughput through the shared PaymentClient against fake_stripe"""
+    fake_server = fake_stripe.start_fake_stripe(FAKE_STRIPE_PORT)
+    checkout_request = server.CheckoutSessionRequest(
+        amount=1000.0,
+        currency="inr",
+        success_url="http://localhost:3000/payment-success?session_id={CHECKOUT_SESSION_ID}",
+        cancel_url="http://localhost:3000/payment-cancel",
+        metadata={"user_id": "bench", "order_type": "membership"},
+    )
+
+    async def run(client, concurrency: int) -> dict:
+        queue = asyncio.Queue()
+        for _ in range(requests):
+            queue.put_nowait(None)
+        samples = []
+
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                start = time.perf_counter()
+                await client.create_checkout_session(checkout_request)
+                samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        return {"rps": round(requests / elapsed, 1), **timings(samples)}
+
+    async def run_levels() -> dict:
+        http_client = server.configure_stripe(api_base=f"http://localhost:{FAKE_STRIPE_PORT}")
+        client = server.PaymentClient("sk_test_benchmark", server.STRIPE_WEBHOOK_URL, http_client)
+        try:
+            return {f"concurrency_{level}": await run(client, level) for level in concurrency_levels}
+        finally:
+            await client.close()
+
+    try:
+        results = asyncio.run(run_levels())
+        results["upstream_calls"] = dict(fake_stripe.calls)
+        return results
+    finally:
+        fake_server.should_exit = True
+
+def synthetic_artworks(count: int, rng: random.Random) -> list:
+    return [
+        {
+            "id": f"artwork-{i}",
+            "artist_id": f"artist-{rng.randrange(20_000)}",
+            "title": " ".join(rng.sample(TITLE_WORDS, 3)),
+            "description": " ".join(rng.choices(DESCRIPTION_WORDS, k=40)),
+            "category": rng.choice(SKILLS),
+            "price": float(rng.randint(500, 200_000)),
+            "currency": "INR",
+            "image_url": f"https://example.com/{i}.jpg",
+            "dimensions": "24x36 inches",
+            "status": "available",
+            "created_at": "2025-01-01T00:00:00+00:00",
+        }
+        for i in range(count)
+    ]
+
+def bench_serialization(repeat: int = 50) -> dict:
+    """List-route serialization: FastAPI's response_model path against list_response's fast paths"""
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import APIRoute, serialize_response
+
+    rng = random.Random(5)
+    routes = {route.path: route for route in server.app.routes if isinstance(route, APIRoute)}
+    cases = {
+        "artworks": (server.ArtworkResponse, routes["/api/artworks"].response_field, synthetic_artworks(1000, rng)),
+        "artists": (server.ArtistProfileResponse, routes["/api/artists"].response_field, synthetic_artists(1000, rng)),
+    }
+    for profile in cases["artists"][2]:
+        profile.update(user_id=profile["id"], bio=" ".join(rng.choices(DESCRIPTION_WORDS, k=60)), pincode="400001",
+                       portfolio_images=[f"https://example.com/p/{n}.jpg" for n in range(6)])
+
+    async def default_path(model, field, docs):
+        content = [model(**doc) for doc in docs]
+        return JSONResponse(await serialize_response(field=field, response_content=content)).body
+
+    async def run() -> dict:
+        results = {}
+        for name, (model, field, docs) in cases.items():
+            for size in (100, 1000):
+                page = docs[:size]
+                paths = {
+                    "response_model": lambda: default_path(model, field, page),
+                    "validate_once": lambda: asyncio.sleep(0, server.encode_items(model, page, trusted=False)),
+                    "trusted_orjson": lambda: asyncio.sleep(0, server.encode_items(model, page, trusted=True)),
+                }
+                for path, call in paths.items():
+                    samples = []
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        await call()
+                        samples.append(time.perf_counter() - start)
+                    results[f"{name}_{size}_{path}"] = timings(samples)
+        return results
+
+    return asyncio.run(run())
+
+class CountingCollection:
+    """find_one with a fixed round-trip time over a bounded connection pool, counting queries"""
+    def __init__(self, documents: dict, latency: float, pool_size: int):
+        self.documents = documents
+        self.latency = latency
+        self.pool = asyncio.Semaphore(pool_size)
+        self.queries = 0
+
+    async def find_one(self, filter: dict, projection=None):
+        self.queries += 1
+        async with self.pool:
+            await asyncio.sleep(self.latency)
+        return self.documents.get(filter["id"])
+
+def bench_coalescing(requests: int = 5_000, concurrency: int = 500, hot_artworks: int = 5,
+                     latency_ms: float = 5.0, cache_seconds: float = 0.25) -> dict:
+    """Thundering herd on a few hot detail reads: DB queries issued with and without SingleFlight"""
+    rng = random.Random(13)
+    documents = {doc["id"]: doc for doc in synthetic_artworks(hot_artworks, rng)}
+    keys = [f"artwork-{rng.randrange(hot_artworks)}" for _ in range(requests)]
+
+    async def run(flight) -> dict:
+        collection = CountingCollection(documents, latency_ms / 1000, server.MONGO_MAX_POOL_SIZE)
+        queue = asyncio.Queue()
+        for key in keys:
+            queue.put_nowait(key)
+        samples = []
+
+        async def read(artwork_id: str):
+            loader = lambda: collection.find_one({"id": artwork_id}, {"_id": 0})
+            return await (flight.do(f"/api/artworks/{artwork_id}?", loader) if flight else loader())
+
+        async def worker():
+            while not queue.empty():
+                artwork_id = queue.get_nowait()
+                start = time.perf_counter()
+                await read(artwork_id)
+                samples.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        return {
+            "db_queries": collection.queries,
+            "queries_per_request": round(collection.queries / requests, 4),
+            "rps": round(requests / elapsed, 1),
+            **timings(samples),
+            **({"single_flight": flight.stats()} if flight else {}),
+        }
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "hot_artworks": hot_artworks,
+        "uncoalesced": asyncio.run(run(None)),
+        "single_flight": asyncio.run(run(server.SingleFlight())),
+        f"single_flight_cache_{cache_seconds}s": asyncio.run(run(server.SingleFlight(cache_seconds))),
+    }
+
+BENCHMARKS = {
+    "matching": bench_matching,
+    "serialization": bench_serialization,
+    "coalescing": bench_coalescing,
+    "search": bench_search,
+    "checkout": bench_checkout,
+}
+
+if __name__ == "__main__":
+    names = sys.argv[1:]
+    if not names:
+        sys.exit(f"usage: python benchmarks.py {{{'|'.join(BENCHMARKS)}}} ...")
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        sys.exit(f"unknown benchmark(s): {', '.join(unknown)}; choose from {', '.join(BENCHMARKS)}")
+    print(json.dumps({name: BENCHMARKS[name]() for name in names}, indent=2))
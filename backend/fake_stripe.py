@@ -0,0 +1,115 @@
+"""Local stand-in for the parts of the Stripe API the payment flow uses.
+
+    uvicorn fake_stripe:app --port 12111
+    STRIPE_API_BASE=http://localhost:12111 uvicorn server:app --port 8001
+
+Sessions live in memory. FAKE_STRIPE_LATENCY_MS adds a delay to every API call
+and FAKE_STRIPE_AUTO_PAY=1 reports every session as paid, so checkout and status
+polling can be exercised and benchmarked without network access.
+"""
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import asyncio
+import os
+import re
+import threading
+import time
+import uuid
+from typing import Dict
+
+LATENCY_SECONDS = float(os.environ.get('FAKE_STRIPE_LATENCY_MS', '0')) / 1000
+AUTO_PAY = os.environ.get('FAKE_STRIPE_AUTO_PAY', '0') == '1'
+
+app = FastAPI()
+sessions: Dict[str, dict] = {}
+calls: Dict[str, int] = {"create_session": 0, "retrieve_session": 0}
+
+def parse_form(items) -> dict:
+    """Turn Stripe's `a[b][0][c]=v` form encoding back into nested dicts"""
+    root: dict = {}
+    for key, value in items:
+        parts = re.findall(r"[^\[\]]+", key)
+        node = root
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return root
+
+def not_found(session_id: str) -> JSONResponse:
+    return JSONResponse(status_code=404, content={"error": {
+        "type": "invalid_request_error",
+        "message": f"No such checkout.session: '{session_id}'",
+    }})
+
+@app.post("/v1/checkout/sessions")
+async def create_session(request: Request):
+    calls["create_session"] += 1
+    await asyncio.sleep(LATENCY_SECONDS)
+    params = parse_form((await request.form()).multi_items())
+
+    line_items = params.get("line_items", {}).values()
+    amount_total = sum(
+        int(item["price_data"]["unit_amount"]) * int(item.get("quantity", 1))
+        for item in line_items
+    )
+    currency = next((item["price_data"].get("currency") for item in line_items), params.get("currency", "inr"))
+
+    session_id = f"cs_test_{uuid.uuid4().hex}"
+    sessions[session_id] = {
+        "id": session_id,
+        "object": "checkout.session",
+        "url": f"{request.base_url}pay/{session_id}",
+        "status": "open",
+        "payment_status": "unpaid",
+        "amount_total": amount_total,
+        "currency": currency,
+        "metadata": params.get("metadata", {}),
+        "mode": params.get("mode", "payment"),
+        "success_url": params.get("success_url"),
+        "cancel_url": params.get("cancel_url"),
+        "created": int(time.time()),
+    }
+    return sessions[session_id]
+
+@app.get("/v1/checkout/sessions/{session_id}")
+async def retrieve_session(session_id: str):
+    calls["retrieve_session"] += 1
+    await asyncio.sleep(LATENCY_SECONDS)
+    session = sessions.get(session_id)
+    if not session:
+        return not_found(session_id)
+    if AUTO_PAY and session["status"] == "open":
+        session.update(status="complete", payment_status="paid")
+    return session
+
+# Test controls (not part of the Stripe API)
+@app.post("/_fake/sessions/{session_id}/pay")
+async def pay_session(session_id: str):
+    session = sessions.get(session_id)
+    if not session:
+        return not_found(session_id)
+    session.update(status="complete", payment_status="paid")
+    return session
+
+@app.post("/_fake/sessions/{session_id}/expire")
+async def expire_session(session_id: str):
+    session = sessions.get(session_id)
+    if not session:
+        return not_found(session_id)
+    session.update(status="expired", payment_status="unpaid")
+    return session
+
+@app.get("/_fake/stats")
+async def stats():
+    return {"sessions": len(sessions), "calls": calls}
+
+def start_fake_stripe(port: int):
+    """Serve this app on localhost from a background thread, for benchmarks and
+    in-process load tests; set `should_exit` on the returned server to stop it"""
+    import uvicorn
+
+    fake_server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    threading.Thread(target=fake_server.run, daemon=True).start()
+    while not fake_server.started:
+        time.sleep(0.01)
+    return fake_server
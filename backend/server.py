@@ -1,25 +1,282 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, PyMongoError
+from pymongo.monitoring import CommandListener
+from starlette.background import BackgroundTask
+from starlette.routing import Match
 import os
+import asyncio
+import base64
+import csv
+import hashlib
+import io
+import shutil
+import tempfile
+import json
 import logging
+import math
+import random
+import secrets
+import socket
+import threading
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, TypeAdapter, ValidationError, create_model
+from pydantic_core import PydanticUndefined
 from typing import List, Optional, Dict
+import time
 import uuid
+import zlib
+from bisect import bisect_left, insort
+from contextlib import asynccontextmanager
+from collections import OrderedDict, defaultdict
+from contextvars import ContextVar
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
+from email.utils import format_datetime
+from functools import lru_cache
 import bcrypt
+import boto3
+import orjson
+import stripe
+from PIL import Image, ImageOps
+from starlette.staticfiles import StaticFiles
 from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Metrics
+# Per-route request latency, in-flight and status counts, plus the Mongo commands
+# each request issued, served at /metrics in Prometheus text format. Routes are
+# labelled by their path template, so ids don't create new series.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COMMAND_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21)
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self, name: str, labels: str):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {cumulative}"
+
+def label_set(**labels) -> str:
+    escaped = {
+        name: str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for name, value in labels.items()
+    }
+    return ",".join(f'{name}="{value}"' for name, value in escaped.items())
+
+class Metrics:
+    def __init__(self):
+        self.in_flight: Dict[tuple, int] = defaultdict(int)
+        self.latency: Dict[tuple, Histogram] = {}
+        self.responses: Dict[tuple, int] = defaultdict(int)
+        self.commands_per_request: Dict[tuple, Histogram] = {}
+        self.commands: Dict[tuple, int] = defaultdict(int)
+        self.command_seconds: Dict[tuple, float] = defaultdict(float)
+        self.rejections: Dict[tuple, int] = defaultdict(int)
+        self.lock = threading.Lock()  # Background commands are recorded from Motor's threads
+
+    def record_commands(self, route: str, commands: list):
+        with self.lock:
+            for name, seconds in commands:
+                self.commands[(route, name)] += 1
+                self.command_seconds[(route, name)] += seconds
+
+    def record_request(self, method: str, route: str, status: int, seconds: float, commands: list):
+        key = (method, route)
+        self.latency.setdefault(key, Histogram(LATENCY_BUCKETS)).observe(seconds)
+        self.responses[(method, route, status)] += 1
+        self.commands_per_request.setdefault(key, Histogram(COMMAND_COUNT_BUCKETS)).observe(len(commands))
+        self.record_commands(route, commands)
+
+    def record_rejection(self, limiter: str, reason: str):
+        self.rejections[(limiter, reason)] += 1
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_requests_in_flight Requests currently being handled",
+            "# TYPE http_requests_in_flight gauge",
+        ]
+        lines += [f"http_requests_in_flight{{{label_set(method=m, route=r)}}} {n}" for (m, r), n in self.in_flight.items()]
+        lines += [
+            "# HELP http_request_duration_seconds Time to the end of the response body",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), histogram in self.latency.items():
+            lines += histogram.samples("http_request_duration_seconds", label_set(method=method, route=route))
+        lines += ["# HELP http_responses_total Responses by status", "# TYPE http_responses_total counter"]
+        lines += [
+            f"http_responses_total{{{label_set(method=m, route=r, status=s)}}} {n}"
+            for (m, r, s), n in self.responses.items()
+        ]
+        lines += [
+            "# HELP http_requests_rejected_total Requests turned away by admission control",
+            "# TYPE http_requests_rejected_total counter",
+        ]
+        lines += [
+            f"http_requests_rejected_total{{{label_set(limiter=name, reason=r)}}} {n}"
+            for (name, r), n in self.rejections.items()
+        ]
+        lines += [
+            "# HELP http_request_mongo_commands Mongo commands issued per request",
+            "# TYPE http_request_mongo_commands histogram",
+        ]
+        for (method, route), histogram in self.commands_per_request.items():
+            lines += histogram.samples("http_request_mongo_commands", label_set(method=method, route=route))
+        with self.lock:
+            commands = dict(self.commands)
+            command_seconds = dict(self.command_seconds)
+        lines += ["# HELP mongo_commands_total Mongo commands by route", "# TYPE mongo_commands_total counter"]
+        lines += [f"mongo_commands_total{{{label_set(route=r, command=c)}}} {n}" for (r, c), n in commands.items()]
+        lines += [
+            "# HELP mongo_command_seconds_total Time spent in Mongo commands by route",
+            "# TYPE mongo_command_seconds_total counter",
+        ]
+        lines += [
+            f"mongo_command_seconds_total{{{label_set(route=r, command=c)}}} {seconds}"
+            for (r, c), seconds in command_seconds.items()
+        ]
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+# The (command, seconds) list of the request being handled. Motor copies the
+# context into its executor threads, so the listener appends to the right list.
+request_commands: ContextVar[Optional[list]] = ContextVar("request_commands", default=None)
+
+class CommandMetricsListener(CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.record(event)
+
+    def failed(self, event):
+        self.record(event)
+
+    def record(self, event):
+        commands = request_commands.get()
+        command = (event.command_name, event.duration_micros / 1e6)
+        if commands is None:
+            metrics.record_commands("background", [command])
+        else:
+            commands.append(command)
+
+def route_template(scope) -> str:
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        method, route = scope["method"], route_template(scope)
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        commands = []
+        token = request_commands.set(commands)
+        metrics.in_flight[(method, route)] += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.in_flight[(method, route)] -= 1
+            metrics.record_request(method, route, status, time.perf_counter() - start, commands)
+            request_commands.reset(token)
+
+# Database
+# The Motor client is created by the app's lifespan (or by tooling calling
+# db.connect()), so importing this module needs no MONGO_URL and opens no
+# sockets. Until then, touching a collection raises instead of hanging.
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '10'))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000'))
+
+class Database:
+    """Lazily connected handle; attribute and item access reach the Motor database"""
+    def __init__(self):
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.database = None
+
+    def connect(self, url: Optional[str] = None, name: Optional[str] = None):
+        if self.client is None:
+            self.client = AsyncIOMotorClient(
+                url or os.environ['MONGO_URL'],
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+                serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+                appname="chitrakalakar",
+                event_listeners=[CommandMetricsListener()],
+            )
+            self.database = self.client[name or os.environ['DB_NAME']]
+        return self.database
+
+    async def warm_up(self):
+        """Wait for a server, then open minPoolSize connections up front so the
+        first requests don't pay for connection setup"""
+        await self.client.admin.command("ping")
+        await asyncio.gather(*(self.client.admin.command("ping") for _ in range(MONGO_MIN_POOL_SIZE)))
+
+    async def ping(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self.client.admin.command("ping"), timeout)
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = self.database = None
+
+    def connected(self):
+        if self.database is None:
+            raise RuntimeError("Database is not connected; run inside the app lifespan or call db.connect()")
+        return self.database
+
+    def __getattr__(self, name: str):
+        return getattr(self.connected(), name)
+
+    def __getitem__(self, name: str):
+        return self.connected()[name]
+
+db = Database()
 
-app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
 STRIPE_API_KEY = os.environ.get('STRIPE_API_KEY')
@@ -46,6 +303,20 @@ class UserResponse(BaseModel):
     has_membership: bool = False
     created_at: str
 
+class ImageVariant(BaseModel):
+    url: str
+    width: int
+    height: int
+
+class ImageResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str  # SHA-256 of the uploaded bytes
+    content_type: str
+    width: int
+    height: int
+    variants: Dict[str, ImageVariant]  # 'original', 'thumb' and 'w<width>' responsive sizes
+    created_at: str
+
 class ArtistProfileCreate(BaseModel):
     user_id: str
     bio: Optional[str] = ""
@@ -53,6 +324,7 @@ class ArtistProfileCreate(BaseModel):
     city: str
     pincode: str
     portfolio_images: List[str] = []
+    portfolio_image_ids: List[str] = []  # Uploaded via POST /api/images
     annual_fee_paid: bool = False
     
 class ArtistProfileResponse(BaseModel):
@@ -64,11 +336,26 @@ class ArtistProfileResponse(BaseModel):
     city: str
     pincode: str
     portfolio_images: List[str]
+    portfolio_variants: List[Dict[str, ImageVariant]] = []
     annual_fee_paid: bool
     commission_rate: float = 0.10
     total_earnings: float = 0.0
     rating: float = 0.0
     total_orders: int = 0
+    distance_km: Optional[float] = None  # Only set by proximity searches
+
+class ArtistCard(BaseModel):
+    """Artist listing card: no bio and only the first portfolio image"""
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    user_id: str
+    skills: List[str]
+    city: str
+    portfolio_images: List[str] = []
+    portfolio_variants: List[Dict[str, ImageVariant]] = []
+    rating: float = 0.0
+    total_orders: int = 0
+    distance_km: Optional[float] = None
 
 class ArtworkCreate(BaseModel):
     artist_id: str
@@ -77,7 +364,8 @@ class ArtworkCreate(BaseModel):
     category: str
     price: float
     currency: str = "INR"
-    image_url: str
+    image_url: str = ""  # Either an external URL or an uploaded image_id
+    image_id: Optional[str] = None
     dimensions: Optional[str] = ""
     
 class ArtworkResponse(BaseModel):
@@ -90,10 +378,41 @@ class ArtworkResponse(BaseModel):
     price: float
     currency: str
     image_url: str
+    image_id: Optional[str] = None
+    image_variants: Dict[str, ImageVariant] = {}
     dimensions: str
     status: str  # 'available', 'sold', 'in_exhibition'
     created_at: str
 
+class ArtworkSummary(BaseModel):
+    """Gallery tile: no description and only the thumbnail among the image variants"""
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    artist_id: str
+    title: str
+    category: str
+    price: float
+    currency: str
+    image_url: str
+    image_variants: Dict[str, ImageVariant] = {}
+    status: str
+    created_at: str
+
+MAX_BULK_ARTWORKS = int(os.environ.get('MAX_BULK_ARTWORKS', '200'))
+
+class ArtworkBulkCreate(BaseModel):
+    artist_id: str
+    # Validated one by one so a bad item is reported instead of failing the batch
+    artworks: List[dict] = Field(..., min_length=1, max_length=MAX_BULK_ARTWORKS)
+
+class BulkItemError(BaseModel):
+    index: int
+    error: str
+
+class ArtworkBulkResponse(BaseModel):
+    created: List[ArtworkResponse]
+    errors: List[BulkItemError]
+
 class CustomOrderCreate(BaseModel):
     user_id: str
     title: str
@@ -146,6 +465,25 @@ class ExhibitionResponse(BaseModel):
     archive_until: Optional[str] = None
     created_at: str
 
+class ArtistSummary(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    user_id: str
+    name: Optional[str] = None
+    city: str
+    skills: List[str]
+    rating: float = 0.0
+
+class ExhibitionDetailResponse(ExhibitionResponse):
+    artworks: List[ArtworkResponse]  # In artwork_ids order; missing artworks are left out
+    artist: Optional[ArtistSummary] = None
+
+class SearchResponse(BaseModel):
+    artworks: List[ArtworkResponse] = []
+    artists: List[ArtistProfileResponse] = []
+    facets: Dict[str, Dict[str, int]] = {}
+    next_cursor: Optional[str] = None
+
 class CheckoutRequest(BaseModel):
     user_id: str
     order_type: str  # 'membership', 'artist_annual', 'exhibition', 'artwork_purchase', 'custom_order'
@@ -153,36 +491,1768 @@ class CheckoutRequest(BaseModel):
     currency: str = "INR"
     metadata: Dict[str, str] = {}
 
-# Helper Functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# Database Indexes
+# Every query shape issued by the routes below must be served by one of these.
+# Applied idempotently on startup; `python server.py check-indexes` verifies it.
+NEWEST_FIRST = [("created_at", DESCENDING), ("id", DESCENDING)]
+BY_ID = [("id", ASCENDING)]
+# Highest rating first, then fewest orders
+RANKED = [("rating", DESCENDING), ("total_orders", ASCENDING), ("id", ASCENDING)]
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "artist_profiles": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING)], unique=True),
+        IndexModel([("annual_fee_paid", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("location", GEOSPHERE)]),
+        IndexModel([("location_table", ASCENDING)]),
+        IndexModel(
+            [("annual_fee_paid", ASCENDING), ("bio", TEXT), ("skills", TEXT)],
+            weights={"skills": 5, "bio": 1},
+        ),
+    ],
+    "artist_rankings": [
+        IndexModel([("scope", ASCENDING)] + RANKED),
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("generation", ASCENDING)]),
+    ],
+    "artworks": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING)] + NEWEST_FIRST),
+        IndexModel([("status", ASCENDING), ("artist_id", ASCENDING)] + NEWEST_FIRST),
+        IndexModel([("status", ASCENDING), ("category", ASCENDING)] + NEWEST_FIRST),
+        IndexModel(
+            [("status", ASCENDING), ("title", TEXT), ("description", TEXT), ("category", TEXT)],
+            weights={"title": 10, "category": 5, "description": 1},
+        ),
+    ],
+    "custom_orders": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING)] + NEWEST_FIRST),
+    ],
+    "exhibitions": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING)] + NEWEST_FIRST),
+        IndexModel([("status", ASCENDING), ("artist_id", ASCENDING)] + NEWEST_FIRST),
+        IndexModel([("status", ASCENDING), ("end_date", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("archive_until", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("artwork_ids", ASCENDING)]),
+    ],
+    "payment_transactions": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("session_id", ASCENDING)], unique=True),
+        IndexModel([("metadata.order_id", ASCENDING)], sparse=True),
+    ],
+    "artist_sales": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("artist_id", ASCENDING)]),
+    ],
+    "payment_events": [
+        IndexModel([("event_id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("locked_until", ASCENDING)]),
+    ],
+    "images": [
+        IndexModel([("id", ASCENDING)], unique=True),
+    ],
+    "cache_entries": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+}
+
+# (route, collection, filter, sort) for every find issued by the API
+QUERY_SHAPES = [
+    ("register/login", "users", {"email": "a@example.com"}, None),
+    ("create_artist_profile", "users", {"id": "x", "role": "artist"}, None),
+    ("create_artist_profile", "artist_profiles", {"user_id": "x"}, None),
+    ("get_all_artists", "artist_rankings", {"scope": "overall"}, RANKED),
+    ("get_all_artists", "artist_rankings", {"scope": "city:x"}, RANKED),
+    ("get_all_artists", "artist_rankings", {"scope": "skill:x"}, RANKED),
+    ("get_all_artists", "artist_rankings", {"scope": "city:x", "skills": "x"}, RANKED),
+    ("get_featured_artists", "artist_rankings", {"scope": "overall"}, RANKED),
+    ("rerank_artist", "artist_rankings", {"id": "x", "scope": {"$nin": ["x", "y"]}}, None),
+    ("rebuild_artist_rankings", "artist_rankings", {"generation": {"$ne": "x"}, "ranked_at": {"$not": {"$gte": "x"}}}, None),
+    ("create_artwork", "artist_profiles", {"id": "x"}, None),
+    ("create_artwork", "images", {"id": {"$in": ["x", "y"]}}, None),
+    ("upload_image", "images", {"id": "x"}, None),
+    ("artist_matcher.rebuild", "artist_profiles", {"annual_fee_paid": True}, None),
+    ("backfill_artist_locations", "artist_profiles", {"location_table": {"$ne": "x"}}, None),
+    ("get_artworks", "artworks", {"status": "available"}, NEWEST_FIRST),
+    ("get_artworks", "artworks", {"status": "available", "artist_id": "x"}, NEWEST_FIRST),
+    ("get_artworks", "artworks", {"status": "available", "category": "x"}, NEWEST_FIRST),
+    ("get_artworks", "artworks", {"status": "available", "artist_id": "x", "category": "x"}, NEWEST_FIRST),
+    ("get_artwork", "artworks", {"id": "x"}, None),
+    ("get_artworks", "artworks", {"id": {"$in": ["x", "y"]}}, None),
+    ("activate_exhibition", "artworks", {"id": {"$in": ["x", "y"]}, "status": "sold"}, None),
+    ("activate_exhibition", "artworks", {"id": {"$in": ["x", "y"]}, "status": {"$ne": "sold"}}, None),
+    ("get_custom_order", "custom_orders", {"id": "x"}, None),
+    ("get_user_orders", "custom_orders", {"user_id": "x"}, NEWEST_FIRST),
+    ("get_exhibitions", "exhibitions", {"status": "active"}, NEWEST_FIRST),
+    ("get_exhibitions", "exhibitions", {"status": "active", "artist_id": "x"}, NEWEST_FIRST),
+    ("get_exhibition", "exhibitions", {"id": "x"}, None),
+    ("create_exhibition", "artworks", {"id": {"$in": ["x", "y"]}, "artist_id": "x"}, None),
+    ("archive_expired_exhibitions", "exhibitions", {"status": "active", "end_date": {"$lte": "x"}}, None),
+    ("archive_expired_exhibitions", "exhibitions", {"status": "active", "artwork_ids": {"$in": ["x", "y"]}}, None),
+    ("purge_expired_archives", "exhibitions", {"status": "archived", "archive_until": {"$lte": "x"}}, None),
+    ("check_payment_status", "payment_transactions", {"session_id": "x"}, None),
+    ("credit_order_payments", "payment_transactions", {"metadata.order_id": "x", "order_type": "custom_order", "payment_status": "paid"}, None),
+    ("refresh_artist_stats", "artist_sales", {"artist_id": "x"}, None),
+    ("check_payment_status", "users", {"id": "x"}, None),
+    ("process_payment_events", "payment_events", {"status": "pending", "available_at": {"$lte": "x"}}, [("available_at", ASCENDING)]),
+    ("process_payment_events", "payment_events", {"status": "processing", "locked_until": {"$lt": "x"}}, None),
+    ("export_artworks", "artworks", {"id": {"$gt": "x"}}, BY_ID),
+    ("export_artists", "artist_profiles", {"id": {"$gt": "x"}}, BY_ID),
+    ("export_payments", "payment_transactions", {"id": {"$gt": "x"}}, BY_ID),
+]
+
+async def ensure_indexes():
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except OperationFailure as e:
+            logger.error(f"Failed to create indexes on {collection}: {e}")
+
+def _plan_stages(plan) -> List[str]:
+    if isinstance(plan, dict):
+        stages = [plan["stage"]] if "stage" in plan else []
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+        return stages
+    if isinstance(plan, list):
+        return [stage for item in plan for stage in _plan_stages(item)]
+    return []
+
+async def check_query_plans() -> List[str]:
+    """Explain every registered query shape and report the ones that scan a whole
+    collection or have to sort their results in memory"""
+    offenders = []
+    for route, collection, query, sort in QUERY_SHAPES:
+        cursor = db[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        stages = _plan_stages(explanation["queryPlanner"]["winningPlan"])
+        for stage in ("COLLSCAN", "SORT"):
+            if stage in stages:
+                offenders.append(f"{stage} {route}: {collection}.find({query}) sort={sort}")
+    return offenders
+
+# Pagination
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', '100'))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '500'))
+MAX_LOOKUP_IDS = int(os.environ.get('MAX_LOOKUP_IDS', '200'))
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def keyset_filter(sort: list, values: list) -> dict:
+    """Filter for the documents strictly after `values` in `sort` order"""
+    ops = ["$gt" if direction == ASCENDING else "$lt" for _, direction in sort]
+    (field, _), *rest = sort
+    if not rest:
+        return {field: {ops[0]: values[0]}}
+    # The leading key is bounded on its own so the index range starts at the cursor;
+    # later keys only break ties among documents equal on the keys before them
+    branches = [{field: {ops[0]: values[0]}}]
+    for i, (tie_field, _) in enumerate(rest, start=1):
+        branch = {name: value for (name, _), value in zip(sort[1:i], values[1:i])}
+        branch[tie_field] = {ops[i]: values[i]}
+        branches.append(branch)
+    return {field: {ops[0] + "e": values[0]}, "$or": branches}
+
+async def fetch_page(collection: str, query: dict, sort: list, cursor: Optional[str], limit: int, response: Response,
+                     projection: Optional[dict] = None) -> List[dict]:
+    """Fetch one page in index order and set the `X-Next-Cursor` header when more remain"""
+    if cursor:
+        query = {**query, **keyset_filter(sort, decode_cursor(cursor, len(sort)))}
+    docs = await db[collection].find(query, projection or {"_id": 0}).sort(sort).limit(limit + 1).to_list(limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor([docs[-1][field] for field, _ in sort])
+    return docs
+
+# Response Cache
+# TTL + LRU cache for hot read-only responses. CACHE_BACKEND=memory keeps entries
+# per process; CACHE_BACKEND=mongo shares them (and their invalidation) across
+# workers via a TTL-indexed collection. Writes invalidate the keys they affect.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', '60'))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '1024'))
+
+FEATURED_ARTISTS_KEY = "featured:artists"
+FEATURED_ARTWORKS_KEY = "featured:artworks"
+
+class MemoryCacheBackend:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self.entries.pop(key, None)
+
+class MongoCacheBackend:
+    def __init__(self, collection_name: str, ttl: float):
+        self.collection_name = collection_name
+        self.ttl = ttl
+
+    @property
+    def collection(self):
+        return db[self.collection_name]
+
+    async def get(self, key: str):
+        entry = await self.collection.find_one({"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}})
+        return entry["value"] if entry else None
+
+    async def set(self, key: str, value):
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+        await self.collection.replace_one({"_id": key}, {"value": value, "expires_at": expires_at}, upsert=True)
+
+    async def delete(self, *keys: str):
+        await self.collection.delete_many({"_id": {"$in": list(keys)}})
+
+class ResponseCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits: Dict[str, int] = {}
+        self.misses: Dict[str, int] = {}
+
+    async def get_or_load(self, key: str, loader):
+        value = await self.backend.get(key)
+        if value is not None:
+            self.hits[key] = self.hits.get(key, 0) + 1
+            return value
+        self.misses[key] = self.misses.get(key, 0) + 1
+        value = await loader()
+        await self.backend.set(key, value)
+        return value
+
+    async def invalidate(self, *keys: str):
+        await self.backend.delete(*keys)
+
+    def stats(self) -> dict:
+        hits = sum(self.hits.values())
+        misses = sum(self.misses.values())
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "keys": {
+                key: {"hits": self.hits.get(key, 0), "misses": self.misses.get(key, 0)}
+                for key in sorted(set(self.hits) | set(self.misses))
+            },
+        }
+
+if CACHE_BACKEND == 'mongo':
+    response_cache = ResponseCache(MongoCacheBackend("cache_entries", CACHE_TTL_SECONDS))
+else:
+    response_cache = ResponseCache(MemoryCacheBackend(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS))
+
+# Request Coalescing
+# When one artwork or artist is suddenly popular, hundreds of identical detail
+# reads arrive together. A SingleFlight runs the loader once per key and hands
+# every concurrent caller the same result; with a micro-cache TTL it also serves
+# callers that arrive just after. Results are shared, so treat them as read-only.
+SINGLE_FLIGHT_CACHE_SECONDS = float(os.environ.get('SINGLE_FLIGHT_CACHE_SECONDS', '0'))
+SINGLE_FLIGHT_CACHE_ENTRIES = int(os.environ.get('SINGLE_FLIGHT_CACHE_ENTRIES', '4096'))
+
+class SingleFlight:
+    def __init__(self, cache_seconds: float = 0.0, cache_entries: int = SINGLE_FLIGHT_CACHE_ENTRIES):
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.recent = MemoryCacheBackend(cache_entries, cache_seconds) if cache_seconds > 0 else None
+        self.loads = 0
+        self.shared = 0
+        self.cached = 0
+
+    async def do(self, key: str, loader):
+        """Result of `loader()`, shared with every concurrent call for `key`"""
+        if self.recent is not None:
+            hit = await self.recent.get(key)
+            if hit is not None:
+                self.cached += 1
+                return hit[0]  # Wrapped so a cached None (not found) still counts as a hit
+        task = self.in_flight.get(key)
+        if task is None:
+            self.loads += 1
+            task = self.in_flight[key] = asyncio.ensure_future(self.load(key, loader))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        else:
+            self.shared += 1
+        # A caller that disconnects mustn't cancel the load for everyone else
+        return await asyncio.shield(task)
+
+    async def load(self, key: str, loader):
+        try:
+            value = await loader()
+            if self.recent is not None:
+                await self.recent.set(key, (value,))
+            return value
+        finally:
+            del self.in_flight[key]
+
+    def stats(self) -> dict:
+        return {"loads": self.loads, "shared": self.shared, "cached": self.cached, "in_flight": len(self.in_flight)}
+
+def read_key(request: Request) -> str:
+    """Coalescing key for a read: its path (route and path params) and sorted query"""
+    return f"{request.url.path}?{'&'.join(sorted(f'{k}={v}' for k, v in request.query_params.multi_items()))}"
+
+detail_reads = SingleFlight(SINGLE_FLIGHT_CACHE_SECONDS)
+
+# Conditional Requests
+# Catalog documents carry a `version` that every write bumps along with
+# `updated_at`, which gives detail routes a strong ETag. Each catalog collection
+# also has a change marker in change_markers, bumped by the same writes, so list
+# routes can answer If-None-Match with one point read before running their query.
+def versioned(update: dict, now: Optional[str] = None) -> dict:
+    """`update` plus the version bump and updated_at stamp of a catalog write"""
+    now = now or datetime.now(timezone.utc).isoformat()
+    return {
+        **update,
+        "$set": {**update.get("$set", {}), "updated_at": now},
+        "$inc": {**update.get("$inc", {}), "version": 1},
+    }
+
+async def mark_changed(*collections: str):
+    now = datetime.now(timezone.utc).isoformat()
+    for name in collections:
+        await db.change_markers.update_one(
+            {"_id": name},
+            {"$inc": {"version": 1}, "$set": {"updated_at": now}},
+            upsert=True
+        )
+
+async def change_marker(collection: str) -> dict:
+    return await db.change_markers.find_one({"_id": collection}) or {"version": 0}
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b("|".join(str(part) for part in parts).encode('utf-8'), digest_size=12)
+    return f'"{digest.hexdigest()}"'
+
+def http_date(iso: Optional[str]) -> Optional[str]:
+    if not iso:
+        return None
+    return format_datetime(datetime.fromisoformat(iso).astimezone(timezone.utc), usegmt=True)
+
+def not_modified(request: Request, response: Response, etag: str, updated_at: Optional[str]) -> Optional[Response]:
+    """Set the validators on `response`; returns a 304 to send instead when the
+    client's If-None-Match already names `etag`"""
+    response.headers["ETag"] = etag
+    last_modified = http_date(updated_at)
+    if last_modified:
+        response.headers["Last-Modified"] = last_modified
+
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers=dict(response.headers))
+    return None
+
+def document_not_modified(request: Request, response: Response, document: dict) -> Optional[Response]:
+    return not_modified(
+        request, response,
+        make_etag(document['id'], document.get('version', 0)),
+        document.get('updated_at') or document.get('created_at')
+    )
+
+async def listing_not_modified(request: Request, response: Response, collection: str) -> Optional[Response]:
+    """Validators for a list route over `collection`, keyed on its change marker and the query string"""
+    marker = await change_marker(collection)
+    return not_modified(
+        request, response,
+        make_etag(request.url.path, request.url.query, collection, marker['version']),
+        marker.get('updated_at')
+    )
+
+async def cached_listing(request: Request, response: Response, key: str, collection: str, load):
+    """Items and validators for a list route served from response_cache.
+
+    The change marker is read just before the query and cached with its items, so
+    a cache hit needs no database call and the ETag always describes the items
+    actually served. Returns (304 response or None, items)."""
+    async def load_with_marker():
+        marker = await change_marker(collection)
+        return {"version": marker['version'], "updated_at": marker.get('updated_at'), "items": await load()}
+    
+    entry = await response_cache.get_or_load(key, load_with_marker)
+    unchanged = not_modified(
+        request, response,
+        make_etag(request.url.path, request.url.query, collection, entry['version']),
+        entry['updated_at']
+    )
+    return unchanged, entry['items']
+
+# Search
+# Relevance-ranked search over the weighted text indexes on artworks and
+# artist_profiles. One aggregation returns the page and the facet counts.
+RELEVANCE = [("score", DESCENDING), ("id", ASCENDING)]
+SEARCH_FACET_LIMIT = 20
+
+async def text_search(collection, text: str, query: dict, facets: List[str], cursor: Optional[str], limit: int) -> tuple:
+    """Return (page of documents, facet counts, next cursor) for a `$text` search"""
+    page = []
+    if cursor:
+        page.append({"$match": keyset_filter(RELEVANCE, decode_cursor(cursor, len(RELEVANCE)))})
+    page += [
+        {"$sort": {"score": -1, "id": 1}},
+        {"$limit": limit + 1},
+        {"$project": {"_id": 0, "location": 0}},
+    ]
+    stages = {"results": page}
+    for field in facets:
+        stages[field] = [
+            {"$unwind": f"${field}"},
+            {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": SEARCH_FACET_LIMIT},
+        ]
+    pipeline = [
+        {"$match": {"$text": {"$search": text}, **query}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+        {"$facet": stages},
+    ]
+    result = (await collection.aggregate(pipeline, allowDiskUse=True).to_list(1))[0]
+    
+    docs = result["results"]
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor([docs[-1]["score"], docs[-1]["id"]])
+    facet_counts = {field: {str(bucket["_id"]): bucket["count"] for bucket in result[field]} for field in facets}
+    return docs, facet_counts, next_cursor
+
+# Pincode Geolocation
+# Offline pincode -> coordinates table. Rows are either full 6-digit pincodes or
+# 3-digit sorting-district prefixes; lookups try the exact pincode first. The
+# shipped table only has district centroids, so every artist in a district sits
+# on the same point: distances rank districts against each other but say nothing
+# about who is closer within one. Profiles record the table version their
+# location was looked up with (location_table), so the startup backfill only reads
+# profiles the current table hasn't seen, unlocatable pincodes included.
+PINCODE_TABLE = ROOT_DIR / 'data' / 'pincode_locations.csv'
+NEARBY_RADIUS_KM = float(os.environ.get('NEARBY_RADIUS_KM', '50'))
+MAX_NEARBY_RADIUS_KM = float(os.environ.get('MAX_NEARBY_RADIUS_KM', '500'))
+
+def load_pincode_locations(path: Path) -> Dict[str, tuple]:
+    with open(path, newline='') as f:
+        return {row['pincode']: (float(row['longitude']), float(row['latitude'])) for row in csv.DictReader(f)}
+
+PINCODE_LOCATIONS = load_pincode_locations(PINCODE_TABLE)
+PINCODE_TABLE_VERSION = hashlib.sha1(PINCODE_TABLE.read_bytes()).hexdigest()[:12]
+
+def pincode_point(pincode: Optional[str]) -> Optional[dict]:
+    """GeoJSON point for a pincode, or None when the table doesn't cover it"""
+    pincode = (pincode or "").strip()
+    coordinates = PINCODE_LOCATIONS.get(pincode) or PINCODE_LOCATIONS.get(pincode[:3])
+    if not coordinates:
+        return None
+    return {"type": "Point", "coordinates": list(coordinates)}
+
+async def find_nearby_artists(point: dict, radius_km: float, query: dict, limit: int, projection: Optional[dict] = None) -> List[dict]:
+    """Nearest artists matching `query` within `radius_km`, closest first, via the 2dsphere
+    index. Artists at the same distance (e.g. the same district) come in RANKED order."""
+    pipeline = [
+        {"$geoNear": {
+            "near": point,
+            "distanceField": "distance_km",
+            "distanceMultiplier": 0.001,
+            "maxDistance": radius_km * 1000,
+            "query": query,
+            "spherical": True,
+        }},
+        {"$sort": {"distance_km": 1, **{field: direction for field, direction in RANKED}}},
+        {"$limit": limit},
+        {"$project": projection or {"_id": 0, "location": 0}},
+    ]
+    return await db.artist_profiles.aggregate(pipeline).to_list(limit)
+
+async def backfill_artist_locations():
+    """Look up the location of every profile the current pincode table hasn't seen"""
+    updates = []
+    changed = False
+    stale = {"location_table": {"$ne": PINCODE_TABLE_VERSION}}
+    async for profile in db.artist_profiles.find(stale, {"_id": 0, "id": 1, "pincode": 1}):
+        point = pincode_point(profile.get('pincode'))
+        if point:
+            update = {"$set": {"location": point, "location_table": PINCODE_TABLE_VERSION}}
+        else:
+            update = {"$set": {"location_table": PINCODE_TABLE_VERSION}, "$unset": {"location": ""}}
+        updates.append(UpdateOne({"id": profile['id']}, versioned(update)))
+        if len(updates) >= 500:
+            await db.artist_profiles.bulk_write(updates, ordered=False)
+            updates, changed = [], True
+    if updates:
+        await db.artist_profiles.bulk_write(updates, ordered=False)
+        changed = True
+    if changed:
+        await mark_changed("artist_profiles")
+
+# Artist Matching
+# Paid artists are kept in memory in city x skill buckets, each sorted by rank
+# (highest rating first, then fewest orders), so matching a custom order reads
+# the top of two buckets instead of querying artist_profiles. Local writes
+# update the buckets directly; a periodic rebuild picks up other workers' writes.
+MATCH_LOCAL_LIMIT = int(os.environ.get('MATCH_LOCAL_LIMIT', '20'))
+MATCH_OTHER_LIMIT = int(os.environ.get('MATCH_OTHER_LIMIT', '100'))
+MATCHER_REFRESH_SECONDS = float(os.environ.get('MATCHER_REFRESH_SECONDS', '300'))
+
+MATCHER_FIELDS = {"_id": 0, "id": 1, "city": 1, "skills": 1, "rating": 1, "total_orders": 1, "annual_fee_paid": 1}
+
+class ArtistMatcher:
+    def __init__(self):
+        self.artists: Dict[str, tuple] = {}  # id -> (rank key, bucket keys)
+        self.buckets: Dict[tuple, List[tuple]] = {}
+
+    @staticmethod
+    def _bucket_keys(city: str, skills: List[str]) -> List[tuple]:
+        keys = [(None, None), (city, None)]
+        for skill in set(skills):
+            keys.append((None, skill))
+            keys.append((city, skill))
+        return keys
+
+    def _entry(self, profile: dict) -> tuple:
+        rank = (-profile.get('rating', 0.0), profile.get('total_orders', 0), profile['id'])
+        return rank, self._bucket_keys(profile['city'], profile.get('skills', []))
+
+    def upsert(self, profile: dict):
+        """Add, re-rank or (once no longer paid) drop one artist profile"""
+        self.remove(profile['id'])
+        if not profile.get('annual_fee_paid'):
+            return
+        rank, keys = self._entry(profile)
+        for key in keys:
+            insort(self.buckets.setdefault(key, []), rank)
+        self.artists[profile['id']] = (rank, keys)
+
+    def remove(self, artist_id: str):
+        entry = self.artists.pop(artist_id, None)
+        if entry is None:
+            return
+        rank, keys = entry
+        for key in keys:
+            bucket = self.buckets[key]
+            del bucket[bisect_left(bucket, rank)]
+
+    def match(self, city: str, skill: Optional[str], local_limit: int = MATCH_LOCAL_LIMIT,
+              other_limit: int = MATCH_OTHER_LIMIT, local_ids: Optional[List[str]] = None) -> tuple:
+        """Return (same-city ids, other ids), each in rank order. `local_ids`, e.g.
+        from a proximity search, replace the same-city tier when given."""
+        if local_ids is None:
+            local_ids = [rank[2] for rank in self.buckets.get((city, skill or None), [])[:local_limit]]
+        local = set(local_ids)
+        other_ids = []
+        for rank in self.buckets.get((None, skill or None), []):
+            if len(other_ids) >= other_limit:
+                break
+            if rank[2] not in local:
+                other_ids.append(rank[2])
+        return local_ids, other_ids
+
+    async def rebuild(self, collection):
+        """Reload every paid artist, sorting each bucket once at the end"""
+        artists, buckets = {}, {}
+        async for profile in collection.find({"annual_fee_paid": True}, MATCHER_FIELDS):
+            rank, keys = self._entry(profile)
+            artists[profile['id']] = (rank, keys)
+            for key in keys:
+                buckets.setdefault(key, []).append(rank)
+        for bucket in buckets.values():
+            bucket.sort()
+        self.artists, self.buckets = artists, buckets
+
+artist_matcher = ArtistMatcher()
+
+async def refresh_artist_matcher():
+    while True:
+        await asyncio.sleep(MATCHER_REFRESH_SECONDS)
+        try:
+            await artist_matcher.rebuild(db.artist_profiles)
+        except Exception as e:
+            logger.error(f"Artist matcher refresh failed: {e}")
+
+# Artist Rankings
+# Each paid artist's public profile is materialized into artist_rankings once per
+# scope it ranks in (overall, its city, each of its skills) and indexed in RANKED
+# order, so featured and artist listings are one index range read. Writes that
+# change a profile re-rank just that artist; entries carry the profile version so
+# an out-of-order re-rank can't overwrite a newer one, and the time they were
+# written so a full rebuild only drops entries nobody has written since it began.
+RANKING_FIELDS = {"_id": 0, "version": 1, **{name: 1 for name in ArtistProfileResponse.model_fields if name != "distance_km"}}
+
+def ranking_scope(city: Optional[str], skill: Optional[str]) -> str:
+    """The scope whose entries cover a listing filtered by `city` and/or `skill`
+    (city and skill together read the city scope and filter on skills)"""
+    if city:
+        return f"city:{city}"
+    if skill:
+        return f"skill:{skill}"
+    return "overall"
+
+def ranking_scopes(profile: dict) -> List[str]:
+    if not profile.get('annual_fee_paid'):
+        return []
+    return ["overall", f"city:{profile['city']}"] + [f"skill:{skill}" for skill in profile['skills']]
+
+def ranking_updates(profile: dict, **extra) -> List[UpdateOne]:
+    version = profile.get('version', 0)
+    ranked_at = datetime.now(timezone.utc).isoformat()
+    return [
+        UpdateOne(
+            {"_id": f"{scope}|{profile['id']}", "version": {"$lte": version}},
+            {"$set": {**profile, **extra, "version": version, "scope": scope, "ranked_at": ranked_at}},
+            upsert=True
+        )
+        for scope in ranking_scopes(profile)
+    ]
+
+async def write_ranking_updates(updates: List[UpdateOne]):
+    try:
+        await db.artist_rankings.bulk_write(updates, ordered=False)
+    except BulkWriteError as e:
+        # A duplicate key means the entry already holds a newer version of the profile
+        if any(error['code'] != 11000 for error in e.details.get('writeErrors', [])):
+            raise
+
+async def rerank_artist(artist_id: str) -> Optional[dict]:
+    """Refresh one artist's ranking entries from its profile; returns the profile"""
+    profile = await db.artist_profiles.find_one({"id": artist_id}, RANKING_FIELDS)
+    scopes = ranking_scopes(profile) if profile else []
+    if scopes:
+        await write_ranking_updates(ranking_updates(profile))
+    await db.artist_rankings.delete_many({"id": artist_id, "scope": {"$nin": scopes}})
+    return profile
+
+async def rebuild_artist_rankings():
+    """Rewrite every entry from artist_profiles, then drop the ones no profile produced.
+
+    An entry this rebuild skipped because a concurrent re-rank had already written a
+    newer version keeps its old generation, so only entries also written before the
+    rebuild began are dropped."""
+    generation = uuid.uuid4().hex
+    started_at = datetime.now(timezone.utc).isoformat()
+    updates = []
+    async for profile in db.artist_profiles.find({"annual_fee_paid": True}, RANKING_FIELDS):
+        updates.extend(ranking_updates(profile, generation=generation))
+        if len(updates) >= 1000:
+            await write_ranking_updates(updates)
+            updates = []
+    if updates:
+        await write_ranking_updates(updates)
+    await db.artist_rankings.delete_many({"generation": {"$ne": generation}, "ranked_at": {"$not": {"$gte": started_at}}})
+
+# Artist Stats
+# Every credit is a sale with its own key ("payment:<session_id>" for money
+# actually paid, "order:<order_id>" for a completed custom order) recorded once in
+# artist_sales, whose unique id is the idempotency key. The profile's totals and
+# rating are then recomputed from the artist's sales with one indexed aggregation
+# and written with a $set, so a retry or a replayed key (however old) never counts
+# a sale twice, and a retry after a failure partway through still refreshes them.
+# The write is guarded on how many sales it counted, so a slower refresh that saw
+# fewer sales can't overwrite a newer one.
+
+async def record_artist_sale(artist_id: str, sale_id: str, amount: float = 0.0, rating: Optional[int] = None, orders: int = 1):
+    """Credit `amount` (net of commission), `orders` and an optional rating to the
+    artist, once per `sale_id`"""
+    profile = await db.artist_profiles.find_one({"id": artist_id}, {"_id": 0, "commission_rate": 1})
+    if not profile:
+        logger.warning(f"Sale {sale_id} for unknown artist {artist_id} not recorded")
+        return
+    try:
+        await db.artist_sales.insert_one({
+            "id": sale_id, "artist_id": artist_id, "orders": orders, "rating": rating,
+            "earnings": round(amount * (1 - profile.get('commission_rate', 0.10)), 2),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        })
+    except DuplicateKeyError:
+        pass  # Already recorded; refreshing the stats again is harmless
+    await refresh_artist_stats(artist_id)
+
+async def refresh_artist_stats(artist_id: str):
+    totals = await db.artist_sales.aggregate([
+        {"$match": {"artist_id": artist_id}},
+        {"$group": {
+            "_id": None,
+            "sales": {"$sum": 1},
+            "total_orders": {"$sum": "$orders"},
+            "total_earnings": {"$sum": "$earnings"},
+            "rating_sum": {"$sum": "$rating"},
+            "rating_count": {"$sum": {"$cond": [{"$gt": ["$rating", None]}, 1, 0]}},
+        }},
+    ]).to_list(1)
+    if not totals:
+        return
+    totals = totals[0]
+    stats = {
+        "sales_counted": totals['sales'],
+        "total_orders": totals['total_orders'],
+        "total_earnings": round(totals['total_earnings'], 2),
+    }
+    if totals['rating_count']:
+        stats['rating'] = round(totals['rating_sum'] / totals['rating_count'], 2)
+    await db.artist_profiles.update_one(
+        {"id": artist_id, "$or": [{"sales_counted": {"$lte": totals['sales']}}, {"sales_counted": {"$exists": False}}]},
+        versioned({"$set": stats})
+    )
+    
+    ranked = await rerank_artist(artist_id)
+    if ranked:
+        artist_matcher.upsert(ranked)
+    await mark_changed("artist_profiles")
+    await response_cache.invalidate(FEATURED_ARTISTS_KEY)
+
+async def credit_order_payments(order: dict):
+    """Credit what was actually paid for a completed custom order to its artist.
+    Runs on completion and again whenever a payment for it is fulfilled; each
+    payment is its own sale, so it's only ever counted once."""
+    async for transaction in db.payment_transactions.find(
+        {"metadata.order_id": order['id'], "order_type": "custom_order", "payment_status": "paid"},
+        {"_id": 0, "session_id": 1, "amount": 1}
+    ):
+        await record_artist_sale(order['selected_artist_id'], f"payment:{transaction['session_id']}", transaction['amount'], orders=0)
+
+# List Serialization
+# Opt-in fast path for list routes. FastAPI's default validates every item again
+# through response_model and encodes with the stdlib json module. With
+# FAST_LIST_RESPONSES=1 items are validated once and encoded by pydantic-core, or,
+# with TRUST_DB_DOCUMENTS=1, our own documents are copied field by field and
+# encoded with orjson. Pages are capped at MAX_PAGE_SIZE and already in memory,
+# so the body is encoded in one piece rather than streamed.
+FAST_LIST_RESPONSES = os.environ.get('FAST_LIST_RESPONSES', '0') == '1'
+TRUST_DB_DOCUMENTS = os.environ.get('TRUST_DB_DOCUMENTS', '0') == '1'
+
+@lru_cache(maxsize=None)
+def list_adapter(model: type) -> TypeAdapter:
+    return TypeAdapter(List[model])
+
+@lru_cache(maxsize=None)
+def model_defaults(model: type) -> Dict[str, object]:
+    defaults = {}
+    for name, field in model.model_fields.items():
+        default = field.get_default(call_default_factory=True)
+        defaults[name] = None if default is PydanticUndefined else default
+    return defaults
+
+def encode_items(model: type, docs: List[dict], trusted: bool = TRUST_DB_DOCUMENTS) -> bytes:
+    """JSON array of `docs` shaped as `model`"""
+    if trusted:
+        defaults = model_defaults(model)
+        return orjson.dumps([{name: doc.get(name, default) for name, default in defaults.items()} for doc in docs])
+    adapter = list_adapter(model)
+    return adapter.dump_json(adapter.validate_python(docs))
+
+def list_response(model: type, docs: List[dict], response: Optional[Response] = None, encoded: bool = False):
+    """Return value for a list route: plain models by default, or a pre-encoded
+    body that bypasses response_model when the fast path is on.
+    `encoded` forces the latter, for models other than the route's response_model."""
+    if not (FAST_LIST_RESPONSES or encoded):
+        return [model(**doc) for doc in docs]
+    encoded = Response(encode_items(model, docs), media_type="application/json")
+    if response is not None:
+        # Headers set on the injected response (e.g. X-Next-Cursor) aren't merged into returned responses
+        for name, value in response.headers.items():
+            if name != "content-length":
+                encoded.headers[name] = value
+    return encoded
+
+# Sparse Fieldsets
+# List routes take `view=` (a named summary model) and `fields=` (a comma-separated
+# subset of that view's fields). The Mongo projection is derived from the chosen
+# model, so fields nobody asked for are never sent, decoded or validated.
+def first_items(field: str, count: int) -> dict:
+    """Projection expression for the first `count` items of an array; unlike the
+    bare {"$slice": n} form it reads the same in find() and in a $project stage"""
+    return {"$concatArrays": [{"$slice": [{"$ifNull": [f"${field}", []]}, count]}]}
+
+ARTWORK_VIEWS = {"full": ArtworkResponse, "summary": ArtworkSummary}
+ARTIST_VIEWS = {"full": ArtistProfileResponse, "card": ArtistCard}
+
+# How a view reads a field when that differs from including it whole
+VIEW_PROJECTIONS = {
+    (ArtworkSummary, "image_variants"): {"image_variants.thumb": 1},
+    (ArtistCard, "portfolio_images"): {"portfolio_images": first_items("portfolio_images", 1)},
+    (ArtistCard, "portfolio_variants"): {"portfolio_variants": first_items("portfolio_variants", 1)},
+}
+
+@lru_cache(maxsize=256)
+def sparse_model(model: type, fields: frozenset) -> type:
+    """`model` cut down to `fields`, keeping their types, defaults and order"""
+    return create_model(
+        f"{model.__name__}Fields",
+        __config__=ConfigDict(extra="ignore"),
+        **{name: (field.annotation, field) for name, field in model.model_fields.items() if name in fields},
+    )
+
+class ListView:
+    """The model a list request is encoded as and the projection it reads with"""
+    def __init__(self, model: type, projection: dict, full: bool):
+        self.model = model
+        self.projection = projection
+        self.full = full  # The route's own response_model, unprojected
+
+def list_view(views: Dict[str, type], view: str, fields: Optional[str], sort: list = ()) -> ListView:
+    if view not in views:
+        raise HTTPException(status_code=400, detail=f"Unknown view {view!r}; choose from {', '.join(views)}")
+    base = model = views[view]
+    if fields:
+        requested = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = requested - set(base.model_fields)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields for view {view!r}: {', '.join(sorted(unknown))}")
+        if requested != set(base.model_fields):
+            model = sparse_model(base, frozenset(requested))
+    if model is views["full"]:
+        return ListView(model, {"_id": 0}, full=True)
+    
+    projection = {"_id": 0}
+    for name in model.model_fields:
+        projection.update(VIEW_PROJECTIONS.get((base, name), {name: 1}))
+    # Keyset cursors are built from the sort fields, so those are always read
+    for field, _ in sort:
+        projection.setdefault(field, 1)
+    return ListView(model, projection, full=False)
+
+# Exports
+# Whole-collection dumps for ops and finance. Rows are read in `id` order with
+# `async for` over one cursor fetching EXPORT_BATCH_SIZE documents per round trip,
+# encoded as NDJSON or CSV (optionally gzipped) and sent in ~EXPORT_CHUNK_BYTES
+# chunks. The response only pulls the next batch as the client drains the last,
+# so memory stays flat whatever the collection size. An interrupted export picks
+# up again with resume_after=<id of the last row received>.
+# Exports need EXPORT_TOKEN configured and sent back as X-Export-Token.
+EXPORT_TOKEN = os.environ.get('EXPORT_TOKEN')
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+EXPORT_CHUNK_BYTES = int(os.environ.get('EXPORT_CHUNK_BYTES', str(64 * 1024)))
+EXPORT_MAX_CONCURRENT = int(os.environ.get('EXPORT_MAX_CONCURRENT', '4'))
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+ARTWORK_EXPORT_COLUMNS = list(ArtworkResponse.model_fields) + ["version", "updated_at"]
+ARTIST_EXPORT_COLUMNS = [name for name in ArtistProfileResponse.model_fields if name != "distance_km"] + ["version", "updated_at"]
+PAYMENT_EXPORT_COLUMNS = [
+    "id", "session_id", "user_id", "order_type", "amount", "currency", "payment_status",
+    "fulfilment_status", "metadata", "created_at", "updated_at", "fulfilled_at",
+]
+
+exports_active = 0
+
+class ExportSlot:
+    """One of the EXPORT_MAX_CONCURRENT export streams. The route takes it before
+    responding; it's given back once, by whichever of the stream's end or the
+    response's background task comes first (a stream that never starts has no end)."""
+    def __init__(self):
+        global exports_active
+        if exports_active >= EXPORT_MAX_CONCURRENT:
+            metrics.record_rejection("export", "concurrency")
+            raise HTTPException(status_code=503, detail="Too many exports running, please retry", headers={"Retry-After": "30"})
+        exports_active += 1
+        self.held = True
+
+    def release(self):
+        global exports_active
+        if self.held:
+            self.held = False
+            exports_active -= 1
+
+    async def release_after_response(self):
+        self.release()
+
+def check_export_access(request: Request) -> ExportSlot:
+    if not EXPORT_TOKEN:
+        raise HTTPException(status_code=403, detail="Exports are disabled")
+    if not secrets.compare_digest(request.headers.get("x-export-token", ""), EXPORT_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid export token")
+    return ExportSlot()
+
+def encode_ndjson(columns: List[str]):
+    return b"", lambda doc: orjson.dumps({column: doc.get(column) for column in columns}) + b"\n"
+
+def encode_csv(columns: List[str]):
+    """Row encoder that writes the header first; lists and dicts become JSON cells"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    
+    def row(values: list) -> bytes:
+        writer.writerow(values)
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line.encode('utf-8')
+    
+    header = row(columns)
+    def encode(doc: dict) -> bytes:
+        values = [doc.get(column) for column in columns]
+        return row([json.dumps(value) if isinstance(value, (list, dict)) else value for value in values])
+    return header, encode
+
+async def export_stream(slot: ExportSlot, collection: str, query: dict, columns: List[str], fmt: str, compress: bool):
+    try:
+        header, encode = encode_csv(columns) if fmt == "csv" else encode_ndjson(columns)
+        # wbits=31 makes zlib write a gzip container
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        chunk = bytearray(header)
+        cursor = db[collection].find(query, {"_id": 0, **{column: 1 for column in columns}}).sort(BY_ID).batch_size(EXPORT_BATCH_SIZE)
+        async for doc in cursor:
+            chunk += encode(doc)
+            if len(chunk) >= EXPORT_CHUNK_BYTES:
+                yield compressor.compress(chunk) if compressor else bytes(chunk)
+                chunk.clear()
+        if compressor:
+            yield compressor.compress(chunk) + compressor.flush()
+        elif chunk:
+            yield bytes(chunk)
+    finally:
+        slot.release()
+
+def export_response(slot: ExportSlot, name: str, collection: str, query: dict, columns: List[str], fmt: str, compress: bool,
+                    resume_after: Optional[str]) -> StreamingResponse:
+    if resume_after:
+        query = {**query, "id": {"$gt": resume_after}}
+    filename = f"{name}.{fmt}" + (".gz" if compress else "")
+    return StreamingResponse(
+        export_stream(slot, collection, query, columns, fmt, compress),
+        media_type="application/gzip" if compress else EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"},
+        background=BackgroundTask(slot.release_after_response),
+    )
+
+# Image Storage
+# Uploads are streamed to a scratch file while being hashed, so an image is
+# stored once per distinct content. A process pool decodes it and renders a
+# square thumbnail plus WebP widths for srcset; the files go to local disk
+# (served at /api/media) or an S3-compatible bucket under content-addressed keys.
+IMAGE_STORAGE = os.environ.get('IMAGE_STORAGE', 'local')
+MEDIA_ROOT = Path(os.environ.get('MEDIA_ROOT', str(ROOT_DIR / 'media')))
+MEDIA_URL = os.environ.get('MEDIA_URL', '/api/media')
+# Uploads in progress live next to MEDIA_ROOT, never under the directory it serves
+MEDIA_SCRATCH = Path(os.environ.get('MEDIA_SCRATCH', str(MEDIA_ROOT.parent / f"{MEDIA_ROOT.name}.uploads")))
+S3_BUCKET = os.environ.get('S3_BUCKET')
+S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+S3_PUBLIC_URL = os.environ.get('S3_PUBLIC_URL')
+MAX_IMAGE_BYTES = int(os.environ.get('MAX_IMAGE_BYTES', str(20 * 1024 * 1024)))
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', '2'))
+IMAGE_TYPES = {"image/jpeg": "jpg", "image/png": "png", "image/webp": "webp"}
+IMAGE_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}  # Pillow format -> content type
+THUMBNAIL_SIZE = 256
+RESPONSIVE_WIDTHS = (480, 960, 1600)
+DISPLAY_VARIANT = "w960"  # What image_url points at for galleries
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+def create_image_executor() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+
+def render_variants(source: str, out_dir: str) -> dict:
+    """Verify the upload at `source` and write its variants into `out_dir`. The
+    original is renamed for the format Pillow detected, whatever the client declared.
+    Runs in the image executor, so it only takes and returns plain data."""
+    with Image.open(source) as image:
+        if image.format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format {image.format}")
+        content_type = IMAGE_FORMATS[image.format]
+        image.verify()
+    original = Path(out_dir) / f"original.{IMAGE_TYPES[content_type]}"
+    os.replace(source, original)
+    with Image.open(original) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    width, height = image.size
+    variants = {"original": {"file": original.name, "width": width, "height": height}}
+    
+    thumbnail = ImageOps.fit(image, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+    thumbnail.save(Path(out_dir) / "thumb.webp", "WEBP", quality=80)
+    variants["thumb"] = {"file": "thumb.webp", "width": THUMBNAIL_SIZE, "height": THUMBNAIL_SIZE}
+    for target in RESPONSIVE_WIDTHS:
+        if target >= width:
+            break
+        resized = image.resize((target, max(1, round(height * target / width))), Image.LANCZOS)
+        resized.save(Path(out_dir) / f"w{target}.webp", "WEBP", quality=82)
+        variants[f"w{target}"] = {"file": f"w{target}.webp", "width": resized.width, "height": resized.height}
+    return {"content_type": content_type, "width": width, "height": height, "variants": variants}
+
+class LocalImageStore:
+    def __init__(self, root: Path, base_url: str, scratch: Path):
+        self.root = root
+        self.base_url = base_url.rstrip('/')
+        self.scratch = scratch
+
+    async def put(self, key: str, path: Path, content_type: str):
+        target = self.root / key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # A rename when scratch space is on the same filesystem as root, a copy otherwise
+        await asyncio.to_thread(shutil.move, path, target)
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+class S3ImageStore:
+    def __init__(self, bucket: str, base_url: Optional[str], endpoint_url: Optional[str] = None):
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.base_url = (base_url or f"{endpoint_url or 'https://s3.amazonaws.com'}/{bucket}").rstrip('/')
+        self.scratch = None
+
+    async def put(self, key: str, path: Path, content_type: str):
+        await asyncio.to_thread(
+            self.client.upload_file, str(path), self.bucket, key,
+            ExtraArgs={"ContentType": content_type, "CacheControl": IMMUTABLE}
+        )
+
+    def url(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+class ImmutableStaticFiles(StaticFiles):
+    """Local media: keys are content hashes, so a file at a URL never changes"""
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        if response.status_code == 200:
+            response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+if IMAGE_STORAGE == 's3':
+    image_store = S3ImageStore(S3_BUCKET, S3_PUBLIC_URL, S3_ENDPOINT_URL)
+else:
+    image_store = LocalImageStore(MEDIA_ROOT, MEDIA_URL, MEDIA_SCRATCH)
+
+async def store_image(executor, path: Path, size: int, image_id: str) -> dict:
+    """Render and store the variants of a new upload and record its image document"""
+    try:
+        rendered = await asyncio.get_running_loop().run_in_executor(
+            executor, render_variants, str(path), str(path.parent)
+        )
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise HTTPException(status_code=400, detail="Not a valid JPEG, PNG or WebP image")
+    
+    variants, puts = {}, []
+    for name, variant in rendered['variants'].items():
+        key = f"images/{image_id[:2]}/{image_id}/{variant['file']}"
+        puts.append(image_store.put(key, path.parent / variant['file'], rendered['content_type'] if name == "original" else "image/webp"))
+        variants[name] = {"url": image_store.url(key), "width": variant['width'], "height": variant['height']}
+    await asyncio.gather(*puts)
+    
+    image = {
+        "id": image_id,
+        "content_type": rendered['content_type'],
+        "bytes": size,
+        "width": rendered['width'],
+        "height": rendered['height'],
+        "variants": variants,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    try:
+        await db.images.insert_one(image)
+    except DuplicateKeyError:
+        pass  # The same bytes were uploaded concurrently; both wrote identical files
+    image.pop('_id', None)
+    return image
+
+async def load_images(image_ids: List[str]) -> Dict[str, dict]:
+    if not image_ids:
+        return {}
+    images = await db.images.find({"id": {"$in": image_ids}}, {"_id": 0}).to_list(len(image_ids))
+    return {image['id']: image for image in images}
+
+def display_url(image: dict) -> str:
+    variants = image['variants']
+    return variants.get(DISPLAY_VARIANT, variants['original'])['url']
+
+def attach_image(artwork_dict: dict, images: Dict[str, dict]) -> Optional[str]:
+    """Point an artwork at its uploaded image's variants; returns what's wrong if it can't"""
+    image_id = artwork_dict.get('image_id')
+    if image_id:
+        image = images.get(image_id)
+        if not image:
+            return f"Unknown image_id {image_id}"
+        artwork_dict['image_url'] = display_url(image)
+        artwork_dict['image_variants'] = image['variants']
+    elif not artwork_dict.get('image_url'):
+        return "image_url or image_id is required"
+    return None
+
+# Admission Control
+# The expensive unauthenticated routes (bcrypt logins, Stripe checkouts, custom
+# order matching) get a token bucket per client IP and per account, plus a cap on
+# how many run at once per process. Callers over their rate get 429 and a full
+# route sheds with 503, both with Retry-After. RATE_LIMIT_BACKEND=mongo shares the
+# buckets across workers. Limits are "<requests>/<seconds>"; empty disables one.
+# The concurrency caps always apply. The buckets are off unless
+# RATE_LIMIT_ENABLED=1: behind a proxy or ingress every request comes from the
+# proxy's address, so enabling them there also needs RATE_LIMIT_TRUST_FORWARDED=1
+# (with the proxy setting X-Forwarded-For) or all clients share one per-IP bucket.
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '0') == '1'
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', '100000'))
+RATE_LIMIT_TRUST_FORWARDED = os.environ.get('RATE_LIMIT_TRUST_FORWARDED', '0') == '1'
+
+class RateLimit:
+    """Bucket of `burst` tokens that refills completely every `seconds`"""
+    def __init__(self, burst: int, seconds: float):
+        self.burst = burst
+        self.rate = burst / seconds
+
+    @classmethod
+    def from_env(cls, name: str, default: str) -> Optional["RateLimit"]:
+        spec = os.environ.get(name, default).strip()
+        if not spec:
+            return None
+        count, seconds = spec.split('/')
+        return cls(int(count), float(seconds))
+
+class MemoryRateLimitBackend:
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def take(self, key: str, limit: RateLimit) -> float:
+        """Spend a token from `key`'s bucket; 0 if there was one, else seconds until there is"""
+        now = time.monotonic()
+        tokens, updated = self.buckets.pop(key, (limit.burst, now))
+        tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+        allowed = tokens >= 1
+        self.buckets[key] = (tokens - 1 if allowed else tokens, now)
+        # Least recently used buckets go first; a dropped bucket just starts full again
+        while len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+        return 0.0 if allowed else (1 - tokens) / limit.rate
+
+    async def peek(self, key: str, limit: RateLimit) -> float:
+        """Like take() without spending the token"""
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (limit.burst, now))
+        tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+        return 0.0 if tokens >= 1 else (1 - tokens) / limit.rate
+
+class MongoRateLimitBackend:
+    """Buckets refilled and spent in one atomic pipeline update, timed by the server's clock"""
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+
+    async def take(self, key: str, limit: RateLimit) -> float:
+        elapsed = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated", "$$NOW"]}]}, 1000]}
+        has_token = {"$gte": ["$tokens", 1]}
+        try:
+            bucket = await db[self.collection_name].find_one_and_update(
+                {"_id": key},
+                [
+                    {"$set": {
+                        "tokens": {"$min": [limit.burst, {"$add": [
+                            {"$ifNull": ["$tokens", limit.burst]},
+                            {"$multiply": [elapsed, limit.rate]},
+                        ]}]},
+                        "updated": "$$NOW",
+                        "expires_at": {"$add": ["$$NOW", int(limit.burst / limit.rate * 1000)]},
+                    }},
+                    {"$set": {
+                        "allowed": has_token,
+                        "tokens": {"$cond": [has_token, {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                    }},
+                ],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except PyMongoError as e:
+            # Fail open: an unreachable limiter shouldn't take the routes down with it
+            logger.warning(f"Rate limit check for {key} failed: {e}")
+            return 0.0
+        return 0.0 if bucket["allowed"] else (1 - bucket["tokens"]) / limit.rate
+
+    async def peek(self, key: str, limit: RateLimit) -> float:
+        """Like take() without spending the token (refill timed by this process's clock)"""
+        try:
+            bucket = await db[self.collection_name].find_one({"_id": key})
+        except PyMongoError as e:
+            logger.warning(f"Rate limit check for {key} failed: {e}")
+            return 0.0
+        if not bucket:
+            return 0.0
+        elapsed = (datetime.now(timezone.utc).replace(tzinfo=None) - bucket["updated"]).total_seconds()
+        tokens = min(limit.burst, bucket["tokens"] + max(elapsed, 0) * limit.rate)
+        return 0.0 if tokens >= 1 else (1 - tokens) / limit.rate
+
+if RATE_LIMIT_BACKEND == 'mongo':
+    rate_limiter = MongoRateLimitBackend("rate_limits")
+else:
+    rate_limiter = MemoryRateLimitBackend(RATE_LIMIT_MAX_KEYS)
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+class Admission:
+    """Rate limits and a concurrency cap for one route.
+
+    Used as a route dependency, which checks the per-IP bucket and holds a
+    concurrency slot until the handler returns; the handler calls check_user()
+    once it has parsed the account out of the body.
+    """
+    def __init__(self, name: str, per_ip: Optional[RateLimit], per_user: Optional[RateLimit], max_concurrent: int):
+        self.name = name
+        self.per_ip = per_ip
+        self.per_user = per_user
+        self.max_concurrent = max_concurrent
+        self.active = 0
+
+    def reject(self, reason: str, status_code: int, retry_after: float):
+        metrics.record_rejection(self.name, reason)
+        detail = "Too many requests, please retry later" if status_code == 429 else "Server busy, please retry"
+        raise HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+    async def __call__(self, request: Request):
+        if RATE_LIMIT_ENABLED and self.per_ip:
+            wait = await rate_limiter.take(f"{self.name}:ip:{client_ip(request)}", self.per_ip)
+            if wait:
+                self.reject("ip_rate", 429, wait)
+        if self.active >= self.max_concurrent:
+            self.reject("concurrency", 503, 1)
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+
+    async def check_user(self, user_key: str, spend: bool = True):
+        """Per-account bucket. With spend=False it only checks a token is left, for
+        routes that spend them on failed attempts alone."""
+        await self.check_bucket("user", user_key, self.per_user, spend)
+
+    async def check_bucket(self, scope: str, key: str, limit: Optional[RateLimit], spend: bool = True):
+        if not RATE_LIMIT_ENABLED or not limit:
+            return
+        wait = await (rate_limiter.take if spend else rate_limiter.peek)(f"{self.name}:{scope}:{key}", limit)
+        if wait:
+            self.reject(f"{scope}_rate", 429, wait)
+
+login_admission = Admission(
+    "login",
+    per_ip=RateLimit.from_env('LOGIN_RATE_PER_IP', '30/60'),
+    per_user=RateLimit.from_env('LOGIN_FAILURES_PER_USER', '5/60'),
+    max_concurrent=int(os.environ.get('LOGIN_MAX_CONCURRENT', '64')),
+)
+# Failed logins for one account from any address, against guessing spread over many
+LOGIN_FAILURES_PER_ACCOUNT = RateLimit.from_env('LOGIN_FAILURES_PER_ACCOUNT', '20/300')
+checkout_admission = Admission(
+    "checkout",
+    per_ip=RateLimit.from_env('CHECKOUT_RATE_PER_IP', '60/60'),
+    per_user=RateLimit.from_env('CHECKOUT_RATE_PER_USER', '10/60'),
+    max_concurrent=int(os.environ.get('CHECKOUT_MAX_CONCURRENT', '64')),
+)
+custom_order_admission = Admission(
+    "custom_order",
+    per_ip=RateLimit.from_env('CUSTOM_ORDER_RATE_PER_IP', '30/60'),
+    per_user=RateLimit.from_env('CUSTOM_ORDER_RATE_PER_USER', '5/60'),
+    max_concurrent=int(os.environ.get('CUSTOM_ORDER_MAX_CONCURRENT', '32')),
+)
+
+# Password Hashing
+# bcrypt is CPU-bound, so it runs on a bounded worker pool instead of the event loop.
+# PASSWORD_EXECUTOR is 'thread' (bcrypt releases the GIL) or 'process'.
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PASSWORD_WORKERS = int(os.environ.get('PASSWORD_WORKERS', '4'))
+PASSWORD_QUEUE_DEPTH = int(os.environ.get('PASSWORD_QUEUE_DEPTH', '32'))
+PASSWORD_EXECUTOR = os.environ.get('PASSWORD_EXECUTOR', 'thread')
+
+password_jobs_pending = 0
+
+def create_password_executor():
+    if PASSWORD_EXECUTOR == 'process':
+        return ProcessPoolExecutor(max_workers=PASSWORD_WORKERS)
+    return ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix="bcrypt")
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
 
 def verify_password(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+def password_needs_rehash(hashed: str) -> bool:
+    # bcrypt hashes look like $2b$12$<salt+digest>
+    return int(hashed.split('$')[2]) != BCRYPT_ROUNDS
+
+async def run_password_job(executor, func, *args):
+    """Run a bcrypt call on the password pool, shedding load once the queue is full"""
+    global password_jobs_pending
+    if password_jobs_pending >= PASSWORD_WORKERS + PASSWORD_QUEUE_DEPTH:
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    password_jobs_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    finally:
+        password_jobs_pending -= 1
+
+# Payment Client
+# One Stripe client per process, created on startup. configure_stripe sets the
+# stripe SDK's process-wide options once: a pooled HTTPX client with explicit
+# timeouts and SDK retries switched off, so PaymentClient._call is the only retry
+# layer. Calls are capped by a semaphore, bounded by STRIPE_TIMEOUT_SECONDS per
+# attempt and retried with jittered backoff when Stripe is transiently unhappy,
+# so a call makes at most STRIPE_MAX_RETRIES + 1 requests.
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE', 'https://api.stripe.com')
+STRIPE_WEBHOOK_URL = os.environ.get(
+    'STRIPE_WEBHOOK_URL',
+    f"{os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001')}/api/webhook/stripe"
+)
+STRIPE_TIMEOUT_SECONDS = float(os.environ.get('STRIPE_TIMEOUT_SECONDS', '10'))
+STRIPE_MAX_CONCURRENCY = int(os.environ.get('STRIPE_MAX_CONCURRENCY', '32'))
+STRIPE_MAX_RETRIES = int(os.environ.get('STRIPE_MAX_RETRIES', '2'))
+STRIPE_RETRY_BACKOFF_SECONDS = float(os.environ.get('STRIPE_RETRY_BACKOFF_SECONDS', '0.25'))
+
+TRANSIENT_STRIPE_ERRORS = (stripe.APIConnectionError, stripe.RateLimitError, asyncio.TimeoutError)
+
+def configure_stripe(api_base: str = STRIPE_API_BASE):
+    """Set the stripe SDK globals once per process and return its shared HTTP client"""
+    http_client = stripe.HTTPXClient(timeout=STRIPE_TIMEOUT_SECONDS, allow_sync_methods=True)
+    stripe.default_http_client = http_client
+    stripe.api_base = api_base
+    stripe.max_network_retries = 0
+    return http_client
+
+class PaymentClient:
+    def __init__(self, api_key: Optional[str], webhook_url: str, http_client):
+        self.http_client = http_client
+        self.checkout = StripeCheckout(api_key=api_key, webhook_url=webhook_url)
+        self.slots = asyncio.Semaphore(STRIPE_MAX_CONCURRENCY)
+
+    async def _call(self, method, *args, retry_on: tuple = TRANSIENT_STRIPE_ERRORS):
+        for attempt in range(STRIPE_MAX_RETRIES + 1):
+            try:
+                async with self.slots:
+                    return await asyncio.wait_for(method(*args), STRIPE_TIMEOUT_SECONDS)
+            except retry_on:
+                if attempt == STRIPE_MAX_RETRIES:
+                    raise
+            await asyncio.sleep(random.uniform(0, STRIPE_RETRY_BACKOFF_SECONDS * 2 ** attempt))
+
+    async def create_checkout_session(self, request: CheckoutSessionRequest) -> CheckoutSessionResponse:
+        # A timed-out create may still have created a session, so only retry rejections
+        return await self._call(self.checkout.create_checkout_session, request, retry_on=(stripe.RateLimitError,))
+
+    async def get_checkout_status(self, session_id: str) -> CheckoutStatusResponse:
+        return await self._call(self.checkout.get_checkout_status, session_id)
+
+    async def handle_webhook(self, body: bytes, signature: Optional[str]):
+        return await self.checkout.handle_webhook(body, signature)
+
+    async def close(self):
+        await self.http_client.close_async()
+        self.http_client.close()
+
+payment_client: Optional[PaymentClient] = None
+
+# Payment Fulfilment
+# Stripe webhooks are stored in the payment_events outbox and acknowledged
+# immediately; a background worker applies them. Fulfilment is claimed with a
+# conditional update on the transaction's session_id, so each payment's side
+# effects run once no matter how often the webhook or status polling sees it.
+OUTBOX_POLL_SECONDS = float(os.environ.get('OUTBOX_POLL_SECONDS', '5'))
+OUTBOX_LEASE_SECONDS = float(os.environ.get('OUTBOX_LEASE_SECONDS', '60'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+
+outbox_wakeup = asyncio.Event()
+
+async def apply_fulfilment(transaction: dict):
+    """Per-order_type side effects of a paid transaction"""
+    order_type = transaction.get('order_type')
+    user_id = transaction.get('user_id')
+    
+    if order_type == "membership":
+        await db.users.update_one({"id": user_id}, {"$set": {"has_membership": True}})
+    elif order_type == "artist_annual":
+        profile = await db.artist_profiles.find_one_and_update(
+            {"user_id": user_id},
+            versioned({"$set": {"annual_fee_paid": True}}),
+            projection=MATCHER_FIELDS,
+            return_document=ReturnDocument.AFTER
+        )
+        if profile:
+            artist_matcher.upsert(profile)
+            await rerank_artist(profile['id'])
+        await mark_changed("artist_profiles")
+        await response_cache.invalidate(FEATURED_ARTISTS_KEY)
+    elif order_type == "exhibition":
+        exhibition_id = transaction['metadata'].get('exhibition_id')
+        if exhibition_id:
+            await db.exhibitions.update_one({"id": exhibition_id}, versioned({"$set": {"status": "paid"}}))
+            await mark_changed("exhibitions")
+    elif order_type == "artwork_purchase":
+        artwork_id = transaction['metadata'].get('artwork_id')
+        session_id = transaction['session_id']
+        # Matches again on a retry by the same session, so the sale is still credited
+        artwork = artwork_id and await db.artworks.find_one_and_update(
+            {"id": artwork_id, "$or": [{"status": {"$ne": "sold"}}, {"sold_session_id": session_id}]},
+            versioned({"$set": {"status": "sold", "sold_session_id": session_id}}),
+            projection={"_id": 0, "artist_id": 1}
+        )
+        if artwork:
+            await mark_changed("artworks")
+            await response_cache.invalidate(FEATURED_ARTWORKS_KEY)
+            await record_artist_sale(artwork['artist_id'], f"payment:{session_id}", transaction['amount'])
+    elif order_type == "custom_order":
+        order_id = transaction['metadata'].get('order_id')
+        order = order_id and await db.custom_orders.find_one(
+            {"id": order_id, "status": "completed"},
+            {"_id": 0, "id": 1, "selected_artist_id": 1}
+        )
+        # Payments for orders still in progress are credited when the order completes
+        if order and order.get('selected_artist_id'):
+            await credit_order_payments(order)
+
+async def fulfil_payment(session_id: str) -> str:
+    """Mark a session paid and apply its side effects, once. Returns "fulfilled"
+    when this call applied them, "already_fulfilled" when there was nothing left to
+    do, or "in_progress" while another worker's claim on it is still live."""
+    now = datetime.now(timezone.utc)
+    transaction = await db.payment_transactions.find_one_and_update(
+        {"session_id": session_id, "$or": [
+            {"payment_status": {"$ne": "paid"}},
+            # A claim whose holder died before finishing
+            {"fulfilment_status": "in_progress", "fulfilment_lease_until": {"$lt": now.isoformat()}},
+        ]},
+        {"$set": {
+            "payment_status": "paid",
+            "fulfilment_status": "in_progress",
+            "fulfilment_lease_until": (now + timedelta(seconds=OUTBOX_LEASE_SECONDS)).isoformat(),
+            "updated_at": now.isoformat()
+        }},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not transaction:
+        current = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0, "fulfilment_status": 1})
+        return "in_progress" if current and current.get('fulfilment_status') == "in_progress" else "already_fulfilled"
+    
+    try:
+        await apply_fulfilment(transaction)
+    except Exception:
+        # Release the claim so the next attempt can take it straight away
+        await db.payment_transactions.update_one(
+            {"session_id": session_id, "fulfilment_status": "in_progress"},
+            {"$set": {"fulfilment_lease_until": now.isoformat()}}
+        )
+        raise
+    await db.payment_transactions.update_one(
+        {"session_id": session_id, "fulfilment_status": "in_progress"},
+        {"$set": {"fulfilment_status": "fulfilled", "fulfilled_at": datetime.now(timezone.utc).isoformat()},
+         "$unset": {"fulfilment_lease_until": ""}}
+    )
+    return "fulfilled"
+
+async def expire_payment(session_id: str):
+    await db.payment_transactions.update_one(
+        {"session_id": session_id, "payment_status": "pending"},
+        {"$set": {"payment_status": "expired", "updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+
+# Payment Status
+# Settled transactions (expired, or paid and fulfilled) are answered from Mongo.
+# "paid" alone isn't settled: it is set when fulfilment is claimed, so a paid
+# transaction whose fulfilment failed has the fulfilment retried by the poll. For
+# pending ones, concurrent polls of a session share one upstream lookup and results
+# are reused for PAYMENT_STATUS_MIN_INTERVAL_SECONDS, so a polling page can't fan
+# out to Stripe.
+PAYMENT_STATUS_MIN_INTERVAL_SECONDS = float(os.environ.get('PAYMENT_STATUS_MIN_INTERVAL_SECONDS', '2'))
+
+def payment_settled(transaction: dict) -> bool:
+    if transaction['payment_status'] == "expired":
+        return True
+    return transaction['payment_status'] == "paid" and transaction.get('fulfilment_status') == "fulfilled"
+
+def local_payment_status(transaction: dict) -> dict:
+    """The status response for a terminal transaction, shaped like Stripe's"""
+    paid = transaction['payment_status'] == "paid"
+    return {
+        "status": "complete" if paid else "expired",
+        "payment_status": "paid" if paid else "unpaid",
+        "amount_total": round(transaction['amount'] * 100),
+        "currency": transaction['currency'].lower()
+    }
+
+class PaymentStatusPoller:
+    def __init__(self, min_interval: float, max_sessions: int = 10000):
+        self.min_interval = min_interval
+        self.max_sessions = max_sessions
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.recent: "OrderedDict[str, tuple]" = OrderedDict()
+        self.counts = {"local": 0, "recent": 0, "coalesced": 0, "upstream": 0}
+
+    async def _fetch_upstream(self, session_id: str) -> CheckoutStatusResponse:
+        self.counts["upstream"] += 1
+        status = await payment_client.get_checkout_status(session_id)
+        self.recent[session_id] = (time.monotonic(), status)
+        self.recent.move_to_end(session_id)
+        while len(self.recent) > self.max_sessions:
+            self.recent.popitem(last=False)
+        return status
+
+    def record_local(self):
+        """Count a poll answered from our own records without a lookup"""
+        self.counts["local"] += 1
+
+    async def get_status(self, session_id: str) -> CheckoutStatusResponse:
+        recent = self.recent.get(session_id)
+        if recent and time.monotonic() - recent[0] < self.min_interval:
+            self.counts["recent"] += 1
+            return recent[1]
+        task = self.inflight.get(session_id)
+        if task:
+            self.counts["coalesced"] += 1
+        else:
+            task = asyncio.ensure_future(self._fetch_upstream(session_id))
+            self.inflight[session_id] = task
+            task.add_done_callback(lambda _: self.inflight.pop(session_id, None))
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        total = sum(self.counts.values())
+        served_locally = total - self.counts["upstream"]
+        return {
+            **self.counts,
+            "requests": total,
+            "hit_rate": served_locally / total if total else 0.0,
+        }
+
+payment_status_poller = PaymentStatusPoller(PAYMENT_STATUS_MIN_INTERVAL_SECONDS)
+
+async def apply_payment_event(event: dict) -> Optional[str]:
+    """Apply one outbox event. While another worker holds the payment's fulfilment
+    claim, returns when that claim expires so the event is retried then: if the
+    holder fails, nothing else would finish the fulfilment."""
+    if event['event_type'] == "checkout.session.expired":
+        await expire_payment(event['session_id'])
+    elif event['payment_status'] == "paid" and await fulfil_payment(event['session_id']) == "in_progress":
+        claim = await db.payment_transactions.find_one({"session_id": event['session_id']}, {"_id": 0, "fulfilment_lease_until": 1})
+        fallback = (datetime.now(timezone.utc) + timedelta(seconds=OUTBOX_LEASE_SECONDS)).isoformat()
+        return (claim or {}).get('fulfilment_lease_until') or fallback
+    return None
+
+async def process_payment_events() -> int:
+    """Drain the outbox; safe to run in several workers at once"""
+    processed = 0
+    while True:
+        now = datetime.now(timezone.utc)
+        event = await db.payment_events.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "available_at": {"$lte": now.isoformat()}},
+                {"status": "processing", "locked_until": {"$lt": now.isoformat()}},
+            ]},
+            {"$set": {"status": "processing", "locked_until": (now + timedelta(seconds=OUTBOX_LEASE_SECONDS)).isoformat()},
+             "$inc": {"attempts": 1}},
+            projection={"_id": 0},
+            sort=[("available_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+        if not event:
+            return processed
+        
+        try:
+            retry_at = await apply_payment_event(event)
+        except Exception as e:
+            logger.error(f"Payment event {event['event_id']} failed (attempt {event['attempts']}): {e}")
+            retry_at = now + timedelta(seconds=min(2 ** event['attempts'], 3600))
+            update = {"status": "failed" if event['attempts'] >= OUTBOX_MAX_ATTEMPTS else "pending",
+                      "available_at": retry_at.isoformat(), "last_error": str(e)}
+        else:
+            if retry_at:
+                update = {"status": "pending", "available_at": retry_at}
+            else:
+                update = {"status": "done", "processed_at": datetime.now(timezone.utc).isoformat()}
+        await db.payment_events.update_one(
+            {"event_id": event['event_id']},
+            {"$set": update, "$unset": {"locked_until": ""}}
+        )
+        processed += 1
+
+async def run_payment_outbox():
+    while True:
+        try:
+            await process_payment_events()
+        except Exception as e:
+            logger.error(f"Payment outbox worker error: {e}")
+        try:
+            await asyncio.wait_for(outbox_wakeup.wait(), OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        outbox_wakeup.clear()
+
+# Custom Order State Machine
+# pending -> matched -> sent_to_artist -> accepted -> in_progress -> completed,
+# with sent_to_artist -> rejected, after which the order can go to another artist.
+# Target status -> statuses it may be entered from.
+ORDER_TRANSITIONS = {
+    "matched": ["pending"],
+    "sent_to_artist": ["matched", "rejected"],
+    "accepted": ["sent_to_artist"],
+    "rejected": ["sent_to_artist"],
+    "in_progress": ["accepted"],
+    "completed": ["in_progress"],
+}
+
+async def transition_order(order_id: str, to_status: str, changes: Optional[dict] = None, guard: Optional[dict] = None) -> dict:
+    """Move an order to `to_status` with one atomic update guarded on its current
+    status, returning the updated order. Missing orders and illegal moves both
+    fail the guard, so neither costs a second query."""
+    order = await db.custom_orders.find_one_and_update(
+        {"id": order_id, "status": {"$in": ORDER_TRANSITIONS[to_status]}, **(guard or {})},
+        {"$set": {"status": to_status, "updated_at": datetime.now(timezone.utc).isoformat(), **(changes or {})}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not order:
+        raise HTTPException(status_code=409, detail=f"Order not found or cannot move to '{to_status}' from its current status")
+    return order
+
+# Exhibition Lifecycle
+# A background task archives exhibitions past end_date (returning their artworks
+# to 'available') and purges archives past archive_until. Every worker runs the
+# loop, but only the holder of a Mongo lease does the work in a given round.
+EXHIBITION_SCHEDULER_INTERVAL_SECONDS = float(os.environ.get('EXHIBITION_SCHEDULER_INTERVAL_SECONDS', '60'))
+EXHIBITION_BATCH_SIZE = int(os.environ.get('EXHIBITION_BATCH_SIZE', '500'))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+async def acquire_leadership(name: str, lease_seconds: float) -> bool:
+    """Take or renew the named lease for this worker; False if another worker holds it"""
+    now = datetime.now(timezone.utc)
+    try:
+        await db.scheduler_leases.find_one_and_update(
+            {"_id": name, "$or": [{"owner": WORKER_ID}, {"lease_until": {"$lt": now.isoformat()}}]},
+            {"$set": {"owner": WORKER_ID, "lease_until": (now + timedelta(seconds=lease_seconds)).isoformat()}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # The lease exists and is held by someone else, so the upsert tried to insert
+        return False
+    return True
+
+async def archive_expired_exhibitions(now: str) -> int:
+    archived = 0
+    while True:
+        expired = await db.exhibitions.find(
+            {"status": "active", "end_date": {"$lte": now}},
+            {"_id": 0, "id": 1, "artwork_ids": 1}
+        ).to_list(EXHIBITION_BATCH_SIZE)
+        if not expired:
+            return archived
+        
+        exhibition_ids = [exhibition['id'] for exhibition in expired]
+        artwork_ids = list({artwork_id for exhibition in expired for artwork_id in exhibition['artwork_ids']})
+        # Artworks are released first, so a crash in between just repeats this batch
+        still_showing = await db.exhibitions.distinct(
+            "artwork_ids",
+            {"status": "active", "artwork_ids": {"$in": artwork_ids}, "id": {"$nin": exhibition_ids}}
+        )
+        await db.artworks.update_many(
+            {"id": {"$in": list(set(artwork_ids) - set(still_showing))}, "status": "in_exhibition"},
+            versioned({"$set": {"status": "available"}}, now)
+        )
+        result = await db.exhibitions.update_many(
+            {"id": {"$in": exhibition_ids}, "status": "active"},
+            versioned({"$set": {"status": "archived", "archived_at": now}}, now)
+        )
+        await mark_changed("artworks", "exhibitions")
+        archived += result.modified_count
+
+async def purge_expired_archives(now: str) -> int:
+    result = await db.exhibitions.delete_many({"status": "archived", "archive_until": {"$lte": now}})
+    if result.deleted_count:
+        await mark_changed("exhibitions")
+    return result.deleted_count
+
+async def run_exhibition_scheduler():
+    while True:
+        try:
+            if await acquire_leadership("exhibition_lifecycle", EXHIBITION_SCHEDULER_INTERVAL_SECONDS * 3):
+                now = datetime.now(timezone.utc).isoformat()
+                archived = await archive_expired_exhibitions(now)
+                purged = await purge_expired_archives(now)
+                if archived:
+                    await response_cache.invalidate(FEATURED_ARTWORKS_KEY)
+                if archived or purged:
+                    logger.info(f"Exhibition lifecycle: archived {archived}, purged {purged}")
+        except Exception as e:
+            logger.error(f"Exhibition scheduler error: {e}")
+        await asyncio.sleep(EXHIBITION_SCHEDULER_INTERVAL_SECONDS)
+
 # Auth Routes
 @api_router.post("/auth/register", response_model=UserResponse)
-async def register(user: UserCreate):
+async def register(request: Request, user: UserCreate):
     existing_user = await db.users.find_one({"email": user.email}, {"_id": 0})
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     user_dict = user.model_dump()
-    user_dict['password'] = hash_password(user_dict['password'])
+    user_dict['password'] = await run_password_job(request.app.state.password_executor, hash_password, user_dict['password'])
     user_dict['id'] = str(uuid.uuid4())
     user_dict['has_membership'] = False
     user_dict['created_at'] = datetime.now(timezone.utc).isoformat()
     
-    await db.users.insert_one(user_dict)
+    try:
+        await db.users.insert_one(user_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     return UserResponse(**{k: v for k, v in user_dict.items() if k != 'password'})
 
-@api_router.post("/auth/login", response_model=UserResponse)
-async def login(credentials: UserLogin):
+@api_router.post("/auth/login", response_model=UserResponse, dependencies=[Depends(login_admission)])
+async def login(request: Request, credentials: UserLogin):
+    # Only failed attempts are counted: per address and account, which is tight and
+    # can't be used to lock anyone else out, and per account from any address, which
+    # is looser and stops guessing spread over many addresses
+    account = credentials.email.lower()
+    address_account = f"{client_ip(request)}:{account}"
+    await login_admission.check_user(address_account, spend=False)
+    await login_admission.check_bucket("account", account, LOGIN_FAILURES_PER_ACCOUNT, spend=False)
+    executor = request.app.state.password_executor
     user = await db.users.find_one({"email": credentials.email}, {"_id": 0})
-    if not user or not verify_password(credentials.password, user['password']):
+    if not user or not await run_password_job(executor, verify_password, credentials.password, user['password']):
+        await login_admission.check_user(address_account)
+        await login_admission.check_bucket("account", account, LOGIN_FAILURES_PER_ACCOUNT)
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    # Upgrade hashes made with a different cost factor while we have the plaintext
+    if password_needs_rehash(user['password']):
+        new_hash = await run_password_job(executor, hash_password, credentials.password)
+        await db.users.update_one(
+            {"id": user['id'], "password": user['password']},
+            {"$set": {"password": new_hash}}
+        )
+    
     return UserResponse(**{k: v for k, v in user.items() if k != 'password'})
 
 # Artist Profile Routes
@@ -197,33 +2267,126 @@ async def create_artist_profile(profile: ArtistProfileCreate):
         raise HTTPException(status_code=400, detail="Artist profile already exists")
     
     profile_dict = profile.model_dump()
+    image_ids = profile_dict.pop('portfolio_image_ids')
+    images = await load_images(image_ids)
+    missing = [image_id for image_id in image_ids if image_id not in images]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Unknown portfolio image ids: {', '.join(missing)}")
+    profile_dict['portfolio_images'] += [display_url(images[image_id]) for image_id in image_ids]
+    profile_dict['portfolio_variants'] = [images[image_id]['variants'] for image_id in image_ids]
     profile_dict['id'] = str(uuid.uuid4())
     profile_dict['commission_rate'] = 0.10
     profile_dict['total_earnings'] = 0.0
     profile_dict['rating'] = 0.0
     profile_dict['total_orders'] = 0
+    profile_dict['version'] = 1
+    profile_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
+    location = pincode_point(profile.pincode)
+    if location:
+        profile_dict['location'] = location
+    profile_dict['location_table'] = PINCODE_TABLE_VERSION
     
-    await db.artist_profiles.insert_one(profile_dict)
+    try:
+        await db.artist_profiles.insert_one(profile_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Artist profile already exists")
+    await rerank_artist(profile_dict['id'])
+    await mark_changed("artist_profiles")
+    await response_cache.invalidate(FEATURED_ARTISTS_KEY)
+    artist_matcher.upsert(profile_dict)
     
     return ArtistProfileResponse(**profile_dict)
 
 @api_router.get("/artists/profile/{user_id}", response_model=ArtistProfileResponse)
-async def get_artist_profile(user_id: str):
-    profile = await db.artist_profiles.find_one({"user_id": user_id}, {"_id": 0})
+async def get_artist_profile(user_id: str, request: Request, response: Response):
+    profile = await detail_reads.do(read_key(request), lambda: db.artist_profiles.find_one({"user_id": user_id}, {"_id": 0}))
     if not profile:
         raise HTTPException(status_code=404, detail="Artist profile not found")
-    return ArtistProfileResponse(**profile)
+    return document_not_modified(request, response, profile) or ArtistProfileResponse(**profile)
 
 @api_router.get("/artists", response_model=List[ArtistProfileResponse])
-async def get_all_artists(city: Optional[str] = None, skill: Optional[str] = None):
+async def get_all_artists(
+    request: Request,
+    response: Response,
+    city: Optional[str] = None,
+    skill: Optional[str] = None,
+    pincode: Optional[str] = None,
+    radius_km: float = Query(NEARBY_RADIUS_KM, gt=0, le=MAX_NEARBY_RADIUS_KM),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    view: str = Query("full", description="'full' profiles or 'card' summaries"),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of the view's fields"),
+):
+    unchanged = await listing_not_modified(request, response, "artist_profiles")
+    if unchanged:
+        return unchanged
+    
+    selected = list_view(ARTIST_VIEWS, view, fields, RANKED)
     query = {"annual_fee_paid": True}
     if city:
         query["city"] = city
     if skill:
         query["skills"] = skill
     
-    artists = await db.artist_profiles.find(query, {"_id": 0}).to_list(100)
-    return [ArtistProfileResponse(**artist) for artist in artists]
+    if pincode:
+        # Nearest `limit` artists within the radius; proximity results are not paged
+        point = pincode_point(pincode)
+        if not point:
+            raise HTTPException(status_code=400, detail="Unknown pincode")
+        artists = await find_nearby_artists(point, radius_km, query, limit, None if selected.full else selected.projection)
+    else:
+        # Best ranked first, read from the materialized ranking
+        ranked_query = {"scope": ranking_scope(city, skill)}
+        if city and skill:
+            ranked_query["skills"] = skill
+        artists = await fetch_page("artist_rankings", ranked_query, RANKED, cursor, limit, response, selected.projection)
+    return list_response(selected.model, artists, response, encoded=not selected.full)
+
+# Image Routes
+@api_router.post("/images", response_model=ImageResponse)
+async def upload_image(request: Request):
+    """Upload one image as the raw request body, with Content-Type image/jpeg,
+    image/png or image/webp. Re-uploading the same bytes returns the stored image."""
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    extension = IMAGE_TYPES.get(content_type)
+    if not extension:
+        raise HTTPException(status_code=415, detail=f"Content-Type must be one of {', '.join(IMAGE_TYPES)}")
+    declared_length = request.headers.get("content-length")
+    if declared_length is not None and not declared_length.strip().isdigit():
+        raise HTTPException(status_code=400, detail="Invalid Content-Length")
+    if declared_length is not None and int(declared_length) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large")
+    
+    if image_store.scratch:
+        image_store.scratch.mkdir(parents=True, exist_ok=True)
+    work_dir = Path(tempfile.mkdtemp(dir=image_store.scratch))
+    try:
+        path = work_dir / f"original.{extension}"
+        digest, size = hashlib.sha256(), 0
+        with open(path, "wb") as upload:
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES:
+                    raise HTTPException(status_code=413, detail="Image too large")
+                digest.update(chunk)
+                upload.write(chunk)
+        if not size:
+            raise HTTPException(status_code=400, detail="Empty upload")
+        
+        image_id = digest.hexdigest()
+        image = await db.images.find_one({"id": image_id}, {"_id": 0})
+        if not image:
+            image = await store_image(request.app.state.image_executor, path, size, image_id)
+        return ImageResponse(**image)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+@api_router.get("/images/{image_id}", response_model=ImageResponse)
+async def get_image(image_id: str):
+    image = await db.images.find_one({"id": image_id}, {"_id": 0})
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return ImageResponse(**image)
 
 # Artwork Routes
 @api_router.post("/artworks", response_model=ArtworkResponse)
@@ -233,61 +2396,159 @@ async def create_artwork(artwork: ArtworkCreate):
         raise HTTPException(status_code=404, detail="Artist not found")
     
     artwork_dict = artwork.model_dump()
+    error = attach_image(artwork_dict, await load_images([artwork.image_id] if artwork.image_id else []))
+    if error:
+        raise HTTPException(status_code=400, detail=error)
     artwork_dict['id'] = str(uuid.uuid4())
     artwork_dict['status'] = 'available'
     artwork_dict['created_at'] = datetime.now(timezone.utc).isoformat()
+    artwork_dict['version'] = 1
+    artwork_dict['updated_at'] = artwork_dict['created_at']
     
     await db.artworks.insert_one(artwork_dict)
+    await mark_changed("artworks")
+    await response_cache.invalidate(FEATURED_ARTWORKS_KEY)
     
     return ArtworkResponse(**artwork_dict)
 
+@api_router.post("/artworks/bulk", response_model=ArtworkBulkResponse)
+async def create_artworks_bulk(bulk: ArtworkBulkCreate):
+    """Create up to MAX_BULK_ARTWORKS artworks for one artist; invalid items are
+    reported by index and the rest are still created"""
+    profile = await db.artist_profiles.find_one({"id": bulk.artist_id}, {"_id": 0, "id": 1})
+    if not profile:
+        raise HTTPException(status_code=404, detail="Artist not found")
+    
+    now = datetime.now(timezone.utc).isoformat()
+    valid, errors = [], []
+    for index, item in enumerate(bulk.artworks):
+        try:
+            valid.append((index, ArtworkCreate(**{**item, "artist_id": bulk.artist_id})))
+        except ValidationError as e:
+            errors.append(BulkItemError(index=index, error="; ".join(
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            )))
+    images = await load_images(list({artwork.image_id for _, artwork in valid if artwork.image_id}))
+    
+    documents, positions = [], []
+    for index, artwork in valid:
+        artwork_dict = artwork.model_dump()
+        error = attach_image(artwork_dict, images)
+        if error:
+            errors.append(BulkItemError(index=index, error=error))
+            continue
+        artwork_dict['id'] = str(uuid.uuid4())
+        artwork_dict['status'] = 'available'
+        artwork_dict['created_at'] = now
+        artwork_dict['version'] = 1
+        artwork_dict['updated_at'] = now
+        documents.append(artwork_dict)
+        positions.append(index)
+    
+    failed = set()
+    if documents:
+        try:
+            await db.artworks.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                failed.add(write_error['index'])
+                errors.append(BulkItemError(index=positions[write_error['index']], error=write_error['errmsg']))
+        await mark_changed("artworks")
+        await response_cache.invalidate(FEATURED_ARTWORKS_KEY)
+    
+    created = [ArtworkResponse(**document) for i, document in enumerate(documents) if i not in failed]
+    return ArtworkBulkResponse(created=created, errors=sorted(errors, key=lambda error: error.index))
+
 @api_router.get("/artworks", response_model=List[ArtworkResponse])
-async def get_artworks(artist_id: Optional[str] = None, category: Optional[str] = None, status: str = "available"):
+async def get_artworks(
+    request: Request,
+    response: Response,
+    artist_id: Optional[str] = None,
+    category: Optional[str] = None,
+    status: str = "available",
+    ids: Optional[str] = Query(None, description="Comma-separated artwork ids; returns those artworks in this order, whatever their status"),
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    view: str = Query("full", description="'full' artworks or 'summary' gallery tiles"),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of the view's fields"),
+):
+    unchanged = await listing_not_modified(request, response, "artworks")
+    if unchanged:
+        return unchanged
+    
+    selected = list_view(ARTWORK_VIEWS, view, fields, NEWEST_FIRST)
+    if ids is not None:
+        artwork_ids = list(dict.fromkeys(artwork_id for artwork_id in ids.split(",") if artwork_id))
+        if len(artwork_ids) > MAX_LOOKUP_IDS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_LOOKUP_IDS} ids per request")
+        found = await db.artworks.find({"id": {"$in": artwork_ids}}, selected.projection).to_list(len(artwork_ids))
+        by_id = {artwork['id']: artwork for artwork in found}
+        artworks = [by_id[artwork_id] for artwork_id in artwork_ids if artwork_id in by_id]
+        return list_response(selected.model, artworks, response, encoded=not selected.full)
+    
     query = {"status": status}
     if artist_id:
         query["artist_id"] = artist_id
     if category:
         query["category"] = category
     
-    artworks = await db.artworks.find(query, {"_id": 0}).to_list(100)
-    return [ArtworkResponse(**artwork) for artwork in artworks]
+    artworks = await fetch_page("artworks", query, NEWEST_FIRST, cursor, limit, response, selected.projection)
+    return list_response(selected.model, artworks, response, encoded=not selected.full)
+
+@api_router.get("/artworks/all", response_model=List[ArtworkResponse])
+async def get_all_artworks_any_location(
+    request: Request,
+    response: Response,
+    category: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    view: str = Query("full", description="'full' artworks or 'summary' gallery tiles"),
+    fields: Optional[str] = Query(None, description="Comma-separated subset of the view's fields"),
+):
+    """Get artworks from all locations without filtering by artist location"""
+    unchanged = await listing_not_modified(request, response, "artworks")
+    if unchanged:
+        return unchanged
+    
+    selected = list_view(ARTWORK_VIEWS, view, fields, NEWEST_FIRST)
+    query = {"status": "available"}
+    if category:
+        query["category"] = category
+    
+    artworks = await fetch_page("artworks", query, NEWEST_FIRST, cursor, limit, response, selected.projection)
+    return list_response(selected.model, artworks, response, encoded=not selected.full)
 
 @api_router.get("/artworks/{artwork_id}", response_model=ArtworkResponse)
-async def get_artwork(artwork_id: str):
-    artwork = await db.artworks.find_one({"id": artwork_id}, {"_id": 0})
+async def get_artwork(artwork_id: str, request: Request, response: Response):
+    artwork = await detail_reads.do(read_key(request), lambda: db.artworks.find_one({"id": artwork_id}, {"_id": 0}))
     if not artwork:
         raise HTTPException(status_code=404, detail="Artwork not found")
-    return ArtworkResponse(**artwork)
+    return document_not_modified(request, response, artwork) or ArtworkResponse(**artwork)
 
 # Custom Order Routes
-@api_router.post("/orders/custom", response_model=CustomOrderResponse)
+@api_router.post("/orders/custom", response_model=CustomOrderResponse, dependencies=[Depends(custom_order_admission)])
 async def create_custom_order(order: CustomOrderCreate):
+    await custom_order_admission.check_user(order.user_id)
     order_dict = order.model_dump()
     order_dict['id'] = str(uuid.uuid4())
     order_dict['status'] = 'pending'
     order_dict['created_at'] = datetime.now(timezone.utc).isoformat()
     
-    # Priority 1: Match artists from same city with matching skills
-    priority_query = {"annual_fee_paid": True, "city": order.preferred_city}
-    if order.category:
-        priority_query["skills"] = order.category
-    
-    priority_artists = await db.artist_profiles.find(priority_query, {"_id": 0, "id": 1}).to_list(20)
-    
-    # Priority 2: If user wants, they can get all artists with matching skills (any location)
-    all_artists_query = {"annual_fee_paid": True}
-    if order.category:
-        all_artists_query["skills"] = order.category
-    
-    all_artists = await db.artist_profiles.find(all_artists_query, {"_id": 0, "id": 1}).to_list(100)
-    
-    # Store both lists: priority (same location) first, then others
-    priority_ids = [artist['id'] for artist in priority_artists]
-    other_ids = [artist['id'] for artist in all_artists if artist['id'] not in priority_ids]
+    # Nearby (or, without a known pincode, same-city) artists with the skill first,
+    # then the best of the rest (any location)
+    nearby_ids = None
+    point = pincode_point(order.preferred_pincode)
+    if point:
+        query = {"annual_fee_paid": True}
+        if order.category:
+            query["skills"] = order.category
+        nearby = await find_nearby_artists(point, NEARBY_RADIUS_KM, query, MATCH_LOCAL_LIMIT, {"_id": 0, "id": 1})
+        nearby_ids = [artist['id'] for artist in nearby]
+    priority_ids, other_ids = artist_matcher.match(order.preferred_city, order.category, local_ids=nearby_ids)
     
     order_dict['matched_artists'] = priority_ids  # Priority artists from same location
     order_dict['all_location_artists'] = other_ids  # Other location artists
-    order_dict['status'] = 'matched' if (priority_artists or all_artists) else 'pending'
+    order_dict['status'] = 'matched' if (priority_ids or other_ids) else 'pending'
     
     await db.custom_orders.insert_one(order_dict)
     
@@ -301,49 +2562,52 @@ async def get_custom_order(order_id: str):
     return CustomOrderResponse(**order)
 
 @api_router.get("/orders/custom/user/{user_id}", response_model=List[CustomOrderResponse])
-async def get_user_orders(user_id: str):
-    orders = await db.custom_orders.find({"user_id": user_id}, {"_id": 0}).to_list(100)
-    return [CustomOrderResponse(**order) for order in orders]
+async def get_user_orders(
+    user_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    orders = await fetch_page("custom_orders", {"user_id": user_id}, NEWEST_FIRST, cursor, limit, response)
+    return list_response(CustomOrderResponse, orders, response)
 
 @api_router.patch("/orders/custom/{order_id}/select-artist")
 async def select_artist_for_order(order_id: str, artist_id: str):
-    order = await db.custom_orders.find_one({"id": order_id}, {"_id": 0})
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    await db.custom_orders.update_one(
-        {"id": order_id},
-        {"$set": {"selected_artist_id": artist_id, "status": "sent_to_artist", "estimated_days": 14}}
+    order = await transition_order(
+        order_id, "sent_to_artist",
+        {"selected_artist_id": artist_id, "estimated_days": 14},
+        guard={"$or": [{"matched_artists": artist_id}, {"all_location_artists": artist_id}]}
     )
-    
-    return {"message": "Order sent to artist for acceptance"}
+    return {"message": "Order sent to artist for acceptance", "order": CustomOrderResponse(**order)}
 
 @api_router.patch("/orders/custom/{order_id}/artist-response")
 async def artist_accept_reject_order(order_id: str, accept: bool, estimated_days: Optional[int] = 14):
-    order = await db.custom_orders.find_one({"id": order_id}, {"_id": 0})
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
     if accept:
-        await db.custom_orders.update_one(
-            {"id": order_id},
-            {"$set": {
-                "artist_accepted": True,
-                "status": "accepted",
-                "estimated_days": estimated_days
-            }}
-        )
-        return {"message": "Order accepted successfully"}
+        order = await transition_order(order_id, "accepted", {"artist_accepted": True, "estimated_days": estimated_days})
+        return {"message": "Order accepted successfully", "order": CustomOrderResponse(**order)}
     else:
-        await db.custom_orders.update_one(
-            {"id": order_id},
-            {"$set": {
-                "artist_accepted": False,
-                "status": "rejected",
-                "selected_artist_id": None
-            }}
-        )
-        return {"message": "Order rejected"}
+        order = await transition_order(order_id, "rejected", {"artist_accepted": False, "selected_artist_id": None})
+        return {"message": "Order rejected", "order": CustomOrderResponse(**order)}
+
+@api_router.patch("/orders/custom/{order_id}/start")
+async def start_order(order_id: str):
+    order = await transition_order(order_id, "in_progress")
+    return {"message": "Order in progress", "order": CustomOrderResponse(**order)}
+
+@api_router.patch("/orders/custom/{order_id}/complete")
+async def complete_order(order_id: str, rating: Optional[int] = Query(None, ge=1, le=5)):
+    try:
+        order = await transition_order(order_id, "completed", {"completed_at": datetime.now(timezone.utc).isoformat(), "rating": rating})
+    except HTTPException:
+        # Completing again retries the crediting below, in case an earlier call failed midway
+        order = await db.custom_orders.find_one({"id": order_id, "status": "completed"}, {"_id": 0})
+        if not order:
+            raise
+    # Both credits are keyed, so retries never count the order or its payments twice
+    if order.get('selected_artist_id'):
+        await record_artist_sale(order['selected_artist_id'], f"order:{order_id}", rating=order.get('rating'))
+        await credit_order_payments(order)
+    return {"message": "Order completed", "order": CustomOrderResponse(**order)}
 
 # Exhibition Routes
 @api_router.post("/exhibitions", response_model=ExhibitionResponse)
@@ -354,38 +2618,108 @@ async def create_exhibition(exhibition: ExhibitionCreate):
     # Base price: 1000 INR or 10 USD for 3 days and 10 artworks
     base_price = 1000.0 if exhibition.duration_days <= 3 else 1000.0 * (exhibition.duration_days / 3)
     
+    owned = await db.artworks.find(
+        {"id": {"$in": exhibition.artwork_ids}, "artist_id": exhibition.artist_id},
+        {"_id": 0, "id": 1, "status": 1}
+    ).to_list(len(exhibition.artwork_ids))
+    not_owned = set(exhibition.artwork_ids) - {artwork['id'] for artwork in owned}
+    if not_owned:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Artworks not found or not owned by this artist: {', '.join(sorted(not_owned))}"
+        )
+    sold = [artwork['id'] for artwork in owned if artwork['status'] == "sold"]
+    if sold:
+        raise HTTPException(status_code=400, detail=f"Artworks already sold: {', '.join(sorted(sold))}")
+    
     exhibition_dict = exhibition.model_dump()
     exhibition_dict['id'] = str(uuid.uuid4())
     exhibition_dict['status'] = 'pending_payment'
     exhibition_dict['price_paid'] = base_price
     exhibition_dict['currency'] = 'INR'
     exhibition_dict['created_at'] = datetime.now(timezone.utc).isoformat()
+    exhibition_dict['version'] = 1
+    exhibition_dict['updated_at'] = exhibition_dict['created_at']
     
     await db.exhibitions.insert_one(exhibition_dict)
+    await mark_changed("exhibitions")
     
     return ExhibitionResponse(**exhibition_dict)
 
 @api_router.get("/exhibitions", response_model=List[ExhibitionResponse])
-async def get_exhibitions(artist_id: Optional[str] = None, status: str = "active"):
+async def get_exhibitions(
+    request: Request,
+    response: Response,
+    artist_id: Optional[str] = None,
+    status: str = "active",
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    unchanged = await listing_not_modified(request, response, "exhibitions")
+    if unchanged:
+        return unchanged
+    
     query = {"status": status}
     if artist_id:
         query["artist_id"] = artist_id
     
-    exhibitions = await db.exhibitions.find(query, {"_id": 0}).to_list(100)
-    return [ExhibitionResponse(**exhibition) for exhibition in exhibitions]
+    exhibitions = await fetch_page("exhibitions", query, NEWEST_FIRST, cursor, limit, response)
+    return list_response(ExhibitionResponse, exhibitions, response)
 
 @api_router.get("/exhibitions/{exhibition_id}", response_model=ExhibitionResponse)
-async def get_exhibition(exhibition_id: str):
+async def get_exhibition(exhibition_id: str, request: Request, response: Response):
     exhibition = await db.exhibitions.find_one({"id": exhibition_id}, {"_id": 0})
     if not exhibition:
         raise HTTPException(status_code=404, detail="Exhibition not found")
-    return ExhibitionResponse(**exhibition)
+    return document_not_modified(request, response, exhibition) or ExhibitionResponse(**exhibition)
+
+@api_router.get("/exhibitions/{exhibition_id}/expanded", response_model=ExhibitionDetailResponse)
+async def get_exhibition_expanded(exhibition_id: str, request: Request, response: Response):
+    """The exhibition with its artworks and an artist summary, in one aggregation"""
+    pipeline = [
+        {"$match": {"id": exhibition_id}},
+        {"$limit": 1},
+        {"$lookup": {"from": "artworks", "localField": "artwork_ids", "foreignField": "id", "as": "artworks"}},
+        {"$lookup": {"from": "artist_profiles", "localField": "artist_id", "foreignField": "id", "as": "artist"}},
+        {"$unwind": {"path": "$artist", "preserveNullAndEmptyArrays": True}},
+        {"$lookup": {"from": "users", "localField": "artist.user_id", "foreignField": "id", "as": "artist_user"}},
+        {"$addFields": {"artist_name": {"$arrayElemAt": ["$artist_user.name", 0]}}},
+        {"$project": {"_id": 0, "artist_user": 0, "artworks._id": 0, "artist._id": 0, "artist.location": 0}},
+    ]
+    results = await db.exhibitions.aggregate(pipeline).to_list(1)
+    if not results:
+        raise HTTPException(status_code=404, detail="Exhibition not found")
+    
+    exhibition = results[0]
+    by_id = {artwork['id']: artwork for artwork in exhibition['artworks']}
+    exhibition['artworks'] = [by_id[artwork_id] for artwork_id in exhibition['artwork_ids'] if artwork_id in by_id]
+    artist = exhibition.pop('artist', None)
+    exhibition['artist'] = {**artist, "name": exhibition.pop('artist_name', None)} if artist else None
+    
+    # Any write to the exhibition, one of its artworks or the artist changes the tag
+    etag = make_etag(
+        exhibition['id'], exhibition.get('version', 0),
+        *(f"{artwork['id']}.{artwork.get('version', 0)}" for artwork in exhibition['artworks']),
+        artist and f"{artist['id']}.{artist.get('version', 0)}"
+    )
+    updated_at = max(
+        [exhibition.get('updated_at') or exhibition['created_at']]
+        + [artwork.get('updated_at') or artwork['created_at'] for artwork in exhibition['artworks']]
+        + ([artist['updated_at']] if artist and artist.get('updated_at') else [])
+    )
+    return not_modified(request, response, etag, updated_at) or ExhibitionDetailResponse(**exhibition)
 
 @api_router.patch("/exhibitions/{exhibition_id}/activate")
 async def activate_exhibition(exhibition_id: str):
     exhibition = await db.exhibitions.find_one({"id": exhibition_id}, {"_id": 0})
     if not exhibition:
         raise HTTPException(status_code=404, detail="Exhibition not found")
+    sold = await db.artworks.find(
+        {"id": {"$in": exhibition['artwork_ids']}, "status": "sold"},
+        {"_id": 0, "id": 1}
+    ).to_list(len(exhibition['artwork_ids']))
+    if sold:
+        raise HTTPException(status_code=400, detail=f"Artworks already sold: {', '.join(sorted(artwork['id'] for artwork in sold))}")
     
     start_date = datetime.now(timezone.utc)
     end_date = start_date + timedelta(days=exhibition['duration_days'])
@@ -393,30 +2727,30 @@ async def activate_exhibition(exhibition_id: str):
     
     await db.exhibitions.update_one(
         {"id": exhibition_id},
-        {"$set": {
+        versioned({"$set": {
             "status": "active",
             "start_date": start_date.isoformat(),
             "end_date": end_date.isoformat(),
             "archive_until": archive_until.isoformat()
-        }}
+        }}, start_date.isoformat())
     )
     
-    # Update artwork status
+    # Update artwork status; one sold since the check above stays sold, or the
+    # scheduler would put it back on sale when the exhibition is archived
     await db.artworks.update_many(
-        {"id": {"$in": exhibition['artwork_ids']}},
-        {"$set": {"status": "in_exhibition"}}
+        {"id": {"$in": exhibition['artwork_ids']}, "status": {"$ne": "sold"}},
+        versioned({"$set": {"status": "in_exhibition"}}, start_date.isoformat())
     )
+    await mark_changed("artworks", "exhibitions")
+    await response_cache.invalidate(FEATURED_ARTWORKS_KEY)
     
     return {"message": "Exhibition activated successfully"}
 
 # Payment Routes
-@api_router.post("/payments/checkout")
+@api_router.post("/payments/checkout", dependencies=[Depends(checkout_admission)])
 async def create_checkout(request: Request, checkout_req: CheckoutRequest):
+    await checkout_admission.check_user(checkout_req.user_id)
     host_url = str(request.base_url)
-    webhook_url = f"{host_url}api/webhook/stripe"
-    
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
-    
     origin_url = request.headers.get('origin', host_url.rstrip('/'))
     success_url = f"{origin_url}/payment-success?session_id={{CHECKOUT_SESSION_ID}}"
     cancel_url = f"{origin_url}/payment-cancel"
@@ -429,7 +2763,7 @@ async def create_checkout(request: Request, checkout_req: CheckoutRequest):
         metadata={**checkout_req.metadata, "user_id": checkout_req.user_id, "order_type": checkout_req.order_type}
     )
     
-    session: CheckoutSessionResponse = await stripe_checkout.create_checkout_session(checkout_request)
+    session: CheckoutSessionResponse = await payment_client.create_checkout_session(checkout_request)
     
     # Create payment transaction record
     transaction = {
@@ -449,31 +2783,24 @@ async def create_checkout(request: Request, checkout_req: CheckoutRequest):
 
 @api_router.get("/payments/status/{session_id}")
 async def check_payment_status(session_id: str):
-    webhook_url = f"{os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001')}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
+    transaction = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
+    if transaction and payment_settled(transaction):
+        payment_status_poller.record_local()
+        return local_payment_status(transaction)
+    if transaction and transaction['payment_status'] == "paid":
+        # Paid, but an earlier fulfilment failed or is still running: this takes
+        # over a released or expired claim, and is a no-op while one is live
+        await fulfil_payment(session_id)
+        payment_status_poller.record_local()
+        return local_payment_status(transaction)
     
-    status: CheckoutStatusResponse = await stripe_checkout.get_checkout_status(session_id)
+    status: CheckoutStatusResponse = await payment_status_poller.get_status(session_id)
     
-    # Update transaction if payment completed
-    transaction = await db.payment_transactions.find_one({"session_id": session_id}, {"_id": 0})
-    if transaction and status.payment_status == "paid" and transaction['payment_status'] != "paid":
-        await db.payment_transactions.update_one(
-            {"session_id": session_id},
-            {"$set": {"payment_status": "paid", "updated_at": datetime.now(timezone.utc).isoformat()}}
-        )
-        
-        # Process payment based on order type
-        order_type = transaction.get('order_type')
-        user_id = transaction.get('user_id')
-        
-        if order_type == "membership":
-            await db.users.update_one({"id": user_id}, {"$set": {"has_membership": True}})
-        elif order_type == "artist_annual":
-            await db.artist_profiles.update_one({"user_id": user_id}, {"$set": {"annual_fee_paid": True}})
-        elif order_type == "exhibition":
-            exhibition_id = transaction['metadata'].get('exhibition_id')
-            if exhibition_id:
-                await db.exhibitions.update_one({"id": exhibition_id}, {"$set": {"status": "paid"}})
+    # Fallback for missed or delayed webhooks; a no-op once the outbox has fulfilled it
+    if status.payment_status == "paid":
+        await fulfil_payment(session_id)
+    elif status.status == "expired":
+        await expire_payment(session_id)
     
     return {
         "status": status.status,
@@ -482,52 +2809,220 @@ async def check_payment_status(session_id: str):
         "currency": status.currency
     }
 
+@api_router.get("/payments/stats")
+async def get_payment_status_stats():
+    return payment_status_poller.stats()
+
 @api_router.post("/webhook/stripe")
 async def stripe_webhook(request: Request):
     body = await request.body()
     signature = request.headers.get("Stripe-Signature")
     
-    webhook_url = f"{os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:8001')}/api/webhook/stripe"
-    stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
-    
     try:
-        webhook_response = await stripe_checkout.handle_webhook(body, signature)
-        return {"received": True}
+        webhook_response = await payment_client.handle_webhook(body, signature)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    
+    if webhook_response.session_id:
+        now = datetime.now(timezone.utc).isoformat()
+        try:
+            await db.payment_events.insert_one({
+                "event_id": webhook_response.event_id,
+                "event_type": webhook_response.event_type,
+                "session_id": webhook_response.session_id,
+                "payment_status": webhook_response.payment_status,
+                "metadata": webhook_response.metadata,
+                "status": "pending",
+                "attempts": 0,
+                "available_at": now,
+                "received_at": now
+            })
+        except DuplicateKeyError:
+            pass  # Stripe redelivered an event we already have
+        outbox_wakeup.set()
+    return {"received": True}
 
 # Featured Content Routes
 @api_router.get("/featured/artists", response_model=List[ArtistProfileResponse])
-async def get_featured_artists():
-    artists = await db.artist_profiles.find(
-        {"annual_fee_paid": True},
-        {"_id": 0}
-    ).sort("rating", -1).limit(6).to_list(6)
-    return [ArtistProfileResponse(**artist) for artist in artists]
+async def get_featured_artists(request: Request, response: Response):
+    async def load():
+        return await db.artist_rankings.find(
+            {"scope": "overall"},
+            {"_id": 0}
+        ).sort(RANKED).limit(6).to_list(6)
+    
+    unchanged, artists = await cached_listing(request, response, FEATURED_ARTISTS_KEY, "artist_profiles", load)
+    if unchanged:
+        return unchanged
+    return list_response(ArtistProfileResponse, artists, response)
 
 @api_router.get("/featured/artworks", response_model=List[ArtworkResponse])
-async def get_featured_artworks():
-    artworks = await db.artworks.find(
-        {"status": "available"},
-        {"_id": 0}
-    ).limit(8).to_list(8)
-    return [ArtworkResponse(**artwork) for artwork in artworks]
+async def get_featured_artworks(request: Request, response: Response):
+    async def load():
+        return await db.artworks.find(
+            {"status": "available"},
+            {"_id": 0}
+        ).limit(8).to_list(8)
+    
+    unchanged, artworks = await cached_listing(request, response, FEATURED_ARTWORKS_KEY, "artworks", load)
+    if unchanged:
+        return unchanged
+    return list_response(ArtworkResponse, artworks, response)
 
-@api_router.get("/artworks/all", response_model=List[ArtworkResponse])
-async def get_all_artworks_any_location(category: Optional[str] = None, limit: int = 100):
-    """Get artworks from all locations without filtering by artist location"""
-    query = {"status": "available"}
+# Search Routes
+@api_router.get("/search", response_model=SearchResponse)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: str = Query("artworks", alias="type", pattern="^(artworks|artists)$"),
+    category: Optional[str] = None,
+    city: Optional[str] = None,
+    skill: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Relevance-ranked search over artworks (title, description, category) or artists (bio, skills)"""
+    if kind == "artworks":
+        query = {"status": "available"}
+        if category:
+            query["category"] = category
+        artworks, facets, next_cursor = await text_search(db.artworks, q, query, ["category"], cursor, limit)
+        return SearchResponse(artworks=artworks, facets=facets, next_cursor=next_cursor)
+    
+    query = {"annual_fee_paid": True}
+    if city:
+        query["city"] = city
+    if skill:
+        query["skills"] = skill
+    artists, facets, next_cursor = await text_search(db.artist_profiles, q, query, ["city", "skills"], cursor, limit)
+    return SearchResponse(artists=artists, facets=facets, next_cursor=next_cursor)
+
+# Export Routes
+EXPORT_FORMAT = Query("ndjson", alias="format", pattern="^(ndjson|csv)$")
+EXPORT_GZIP = Query(False, alias="gzip")
+EXPORT_RESUME = Query(None, description="id of the last row already received; the export continues after it")
+
+@api_router.get("/export/artworks")
+async def export_artworks(
+    request: Request,
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+    artist_id: Optional[str] = None,
+    fmt: str = EXPORT_FORMAT,
+    compress: bool = EXPORT_GZIP,
+    resume_after: Optional[str] = EXPORT_RESUME,
+):
+    slot = check_export_access(request)
+    query = {}
+    if status:
+        query["status"] = status
     if category:
         query["category"] = category
-    
-    artworks = await db.artworks.find(query, {"_id": 0}).limit(limit).to_list(limit)
-    return [ArtworkResponse(**artwork) for artwork in artworks]
+    if artist_id:
+        query["artist_id"] = artist_id
+    return export_response(slot, "artworks", "artworks", query, ARTWORK_EXPORT_COLUMNS, fmt, compress, resume_after)
+
+@api_router.get("/export/artists")
+async def export_artists(
+    request: Request,
+    city: Optional[str] = None,
+    skill: Optional[str] = None,
+    fmt: str = EXPORT_FORMAT,
+    compress: bool = EXPORT_GZIP,
+    resume_after: Optional[str] = EXPORT_RESUME,
+):
+    slot = check_export_access(request)
+    query = {}
+    if city:
+        query["city"] = city
+    if skill:
+        query["skills"] = skill
+    return export_response(slot, "artist_profiles", "artist_profiles", query, ARTIST_EXPORT_COLUMNS, fmt, compress, resume_after)
+
+@api_router.get("/export/payments")
+async def export_payments(
+    request: Request,
+    payment_status: Optional[str] = None,
+    order_type: Optional[str] = None,
+    user_id: Optional[str] = None,
+    since: Optional[str] = Query(None, description="ISO timestamp; transactions created at or after it"),
+    until: Optional[str] = Query(None, description="ISO timestamp; transactions created before it"),
+    fmt: str = EXPORT_FORMAT,
+    compress: bool = EXPORT_GZIP,
+    resume_after: Optional[str] = EXPORT_RESUME,
+):
+    slot = check_export_access(request)
+    query = {}
+    if payment_status:
+        query["payment_status"] = payment_status
+    if order_type:
+        query["order_type"] = order_type
+    if user_id:
+        query["user_id"] = user_id
+    if since or until:
+        query["created_at"] = {**({"$gte": since} if since else {}), **({"$lt": until} if until else {})}
+    return export_response(slot, "payment_transactions", "payment_transactions", query, PAYMENT_EXPORT_COLUMNS, fmt, compress, resume_after)
+
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    return {**response_cache.stats(), "single_flight": detail_reads.stats()}
 
 @api_router.get("/")
 async def root():
     return {"message": "ChitraKalakar API - Give Life To Your Imagination"}
 
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Lifecycle
+# Startup connects and warms the pool, prepares indexes and in-memory state, and
+# only then marks the app ready. Draining happens before the lifespan hears about
+# shutdown: on SIGTERM uvicorn stops accepting connections and waits for in-flight
+# requests, up to --timeout-graceful-shutdown, before running the code after
+# `yield`. So deployments should give the pod a preStop delay (e.g. `sleep 10`)
+# long enough for it to leave the load balancer first, and run uvicorn with
+# --timeout-graceful-shutdown set to how long a request may take to finish.
+READINESS_PING_TIMEOUT_SECONDS = 1.0
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global payment_client
+    app.state.ready = False
+    # Created per lifespan, so an app started again (e.g. by a second TestClient) gets live pools
+    app.state.password_executor = create_password_executor()
+    app.state.image_executor = create_image_executor()
+    db.connect()
+    await db.warm_up()
+    await ensure_indexes()
+    await backfill_artist_locations()
+    if not await db.artist_rankings.find_one({}, {"_id": 1}):
+        await rebuild_artist_rankings()
+    await artist_matcher.rebuild(db.artist_profiles)
+    payment_client = PaymentClient(STRIPE_API_KEY, STRIPE_WEBHOOK_URL, configure_stripe())
+    background = [
+        asyncio.create_task(refresh_artist_matcher()),
+        asyncio.create_task(run_exhibition_scheduler()),
+        asyncio.create_task(run_payment_outbox()),
+    ]
+    app.state.ready = True
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        await payment_client.close()
+        db.close()
+        app.state.password_executor.shutdown(wait=False, cancel_futures=True)
+        app.state.image_executor.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan)
 app.include_router(api_router)
+if IMAGE_STORAGE == 'local':
+    app.mount(MEDIA_URL, ImmutableStaticFiles(directory=MEDIA_ROOT, check_dir=False), name="media")
 
 app.add_middleware(
     CORSMiddleware,
@@ -535,14 +3030,49 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Retry-After"],
 )
+# Outermost, so it times everything including CORS handling
+app.add_middleware(MetricsMiddleware)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """Liveness: the event loop is serving requests"""
+    return {"status": "ok"}
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """Readiness: startup has finished and MongoDB answers"""
+    if not getattr(app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Starting up")
+    if not await db.ping(READINESS_PING_TIMEOUT_SECONDS):
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready"}
+
+if __name__ == "__main__":
+    import sys
+
+    if sys.argv[1:] not in (["check-indexes"], ["rebuild-rankings"]):
+        sys.exit("usage: python server.py {check-indexes|rebuild-rankings}")
+
+    async def run_index_check() -> int:
+        await ensure_indexes()
+        offenders = await check_query_plans()
+        for offender in offenders:
+            print(offender)
+        print(f"{len(QUERY_SHAPES)} query shapes checked, {len(offenders)} problems")
+        return 1 if offenders else 0
+
+    async def run_rebuild_rankings() -> int:
+        await rebuild_artist_rankings()
+        print(f"{await db.artist_rankings.count_documents({})} ranking entries")
+        return 0
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+    db.connect()
+    if sys.argv[1] == "rebuild-rankings":
+        sys.exit(asyncio.run(run_rebuild_rankings()))
+    sys.exit(asyncio.run(run_index_check()))
@@ -41,7 +41,7 @@ export default function AboutPage({ user, onLogout }) {
   const fetchStats = async () => {
     try {
       const [artists, artworks, exhibitions] = await Promise.all([
-        axios.get(`${API}/artists`),
+        axios.get(`${API}/artists?fields=id`),
         axios.get(`${API}/featured/artworks`),
         axios.get(`${API}/exhibitions?status=active`)
       ]);
@@ -35,8 +35,10 @@ export default function ArtistDashboard({ user, onLogout }) {
     price: '',
     currency: 'INR',
     image_url: '',
+    image_id: null,
     dimensions: ''
   });
+  const [imageUploading, setImageUploading] = useState(false);
   const [exhibitionForm, setExhibitionForm] = useState({
     title: '',
     description: '',
@@ -123,6 +125,7 @@ export default function ArtistDashboard({ user, onLogout }) {
         price: '',
         currency: 'INR',
         image_url: '',
+        image_id: null,
         dimensions: ''
       });
     } catch (error) {
@@ -130,6 +133,27 @@ export default function ArtistDashboard({ user, onLogout }) {
     }
   };
 
+  const handleImageUpload = async (e) => {
+    const file = e.target.files[0];
+    if (!file) return;
+    setImageUploading(true);
+    try {
+      const response = await axios.post(`${API}/images`, file, {
+        headers: { 'Content-Type': file.type }
+      });
+      const variants = response.data.variants;
+      setArtworkForm((prev) => ({
+        ...prev,
+        image_id: response.data.id,
+        image_url: (variants.w960 || variants.original).url
+      }));
+    } catch (error) {
+      toast.error('Failed to upload image');
+    } finally {
+      setImageUploading(false);
+    }
+  };
+
   const handleExhibitionCreate = async (e) => {
     e.preventDefault();
     try {
@@ -399,12 +423,19 @@ export default function ArtistDashboard({ user, onLogout }) {
                     data-testid="artwork-image-url"
                     id="artwork-image"
                     value={artworkForm.image_url}
-                    onChange={(e) => setArtworkForm({ ...artworkForm, image_url: e.target.value })}
+                    onChange={(e) => setArtworkForm({ ...artworkForm, image_url: e.target.value, image_id: null })}
                     placeholder="https://example.com/image.jpg"
-                    required
+                    required={!artworkForm.image_id}
+                  />
+                  <Input
+                    data-testid="artwork-image-file"
+                    type="file"
+                    accept="image/jpeg,image/png,image/webp"
+                    onChange={handleImageUpload}
+                    disabled={imageUploading}
                   />
                 </div>
-                <Button data-testid="submit-artwork-btn" type="submit" className="w-full rounded-full">
+                <Button data-testid="submit-artwork-btn" type="submit" className="w-full rounded-full" disabled={imageUploading}>
                   Add Artwork
                 </Button>
               </form>
@@ -20,25 +20,17 @@ export default function ExhibitionArchivePage({ user, onLogout }) {
       
       // Fetch artworks for each exhibition
       for (const exhibition of response.data) {
-        fetchExhibitionArtworks(exhibition.id, exhibition.artwork_ids);
+        fetchExhibitionArtworks(exhibition.id);
       }
     } catch (error) {
       console.error('Error fetching archived exhibitions:', error);
     }
   };
 
-  const fetchExhibitionArtworks = async (exhibitionId, artworkIds) => {
+  const fetchExhibitionArtworks = async (exhibitionId) => {
     try {
-      const artworks = [];
-      for (const artworkId of artworkIds) {
-        try {
-          const response = await axios.get(`${API}/artworks/${artworkId}`);
-          artworks.push(response.data);
-        } catch (err) {
-          console.error(`Error fetching artwork ${artworkId}:`, err);
-        }
-      }
-      setExhibitionArtworks((prev) => ({ ...prev, [exhibitionId]: artworks }));
+      const response = await axios.get(`${API}/exhibitions/${exhibitionId}/expanded`);
+      setExhibitionArtworks((prev) => ({ ...prev, [exhibitionId]: response.data.artworks }));
     } catch (error) {
       console.error('Error fetching exhibition artworks:', error);
     }
@@ -21,21 +21,17 @@ export default function ExhibitionPage({ user, onLogout }) {
       
       // Fetch artworks for each exhibition
       for (const exhibition of response.data) {
-        fetchExhibitionArtworks(exhibition.id, exhibition.artwork_ids);
+        fetchExhibitionArtworks(exhibition.id);
       }
     } catch (error) {
       console.error('Error fetching exhibitions:', error);
     }
   };
 
-  const fetchExhibitionArtworks = async (exhibitionId, artworkIds) => {
+  const fetchExhibitionArtworks = async (exhibitionId) => {
     try {
-      const artworks = [];
-      for (const artworkId of artworkIds) {
-        const response = await axios.get(`${API}/artworks/${artworkId}`);
-        artworks.push(response.data);
-      }
-      setExhibitionArtworks((prev) => ({ ...prev, [exhibitionId]: artworks }));
+      const response = await axios.get(`${API}/exhibitions/${exhibitionId}/expanded`);
+      setExhibitionArtworks((prev) => ({ ...prev, [exhibitionId]: response.data.artworks }));
     } catch (error) {
       console.error('Error fetching exhibition artworks:', error);
     }
@@ -32,7 +32,7 @@ export default function UserDashboard({ user, onLogout }) {
 
   const fetchAllLocationArtworks = async () => {
     try {
-      const response = await axios.get(`${API}/artworks/all`);
+      const response = await axios.get(`${API}/artworks/all?view=summary`);
       setAllLocationArtworks(response.data);
     } catch (error) {
       console.error('Error fetching all artworks:', error);
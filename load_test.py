@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""Concurrent load generator for the ChitraKalakar API.
+
+Drives the same endpoints and payloads as backend_test.py, but from many
+concurrent async clients, and reports latency percentiles, throughput and error
+rates per scenario:
+
+    python load_test.py --scenario browse --concurrency 32 --duration 30
+    python load_test.py --scenario all --base-url http://localhost:8001
+
+Without --base-url the app is imported and served in-process (MONGO_URL/DB_NAME
+as for the server, with DB_NAME defaulting to a scratch `loadtest` database), and
+backend/fake_stripe.py is started on localhost as the payment provider. Against a
+running server, start it with STRIPE_API_BASE pointing at fake_stripe too, and
+with RATE_LIMIT_ENABLED=0 (the default): every simulated client comes from this
+machine's address, so per-IP limits would turn the run into a 429 benchmark.
+Checkouts and custom orders are spread across --users seeded buyer accounts so
+per-user limits don't single out one account either; 429s are reported as
+rate_limited in each summary.
+Results are written in backend_test_results.json's layout (summary, test_results,
+test_data) with the latency fields added.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).parent / "backend"
+FAKE_STRIPE_PORT = 12112
+
+CITIES = {
+    "Mumbai": "400001", "New Delhi": "110001", "Bengaluru": "560001", "Chennai": "600001",
+    "Kolkata": "700001", "Pune": "411001", "Hyderabad": "500001", "Jaipur": "302001",
+}
+SKILLS = ["Acrylic Colors", "Watercolors", "Pencil Work", "Oil Painting", "Charcoal", "Digital Art"]
+SEARCH_TERMS = ["portrait", "landscape", "Watercolors", "village", "abstract", "Oil Painting"]
+
+def percentile(samples: list, fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def latency_summary(samples: list) -> dict:
+    return {
+        "p50_ms": round(percentile(samples, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+    }
+
+class ChitraKalakarLoadTester:
+    def __init__(self, client: httpx.AsyncClient, seed: int = 42):
+        self.client = client
+        self.rng = random.Random(seed)
+        self.samples = {}  # operation -> [(seconds, ok)]
+        self.user_data = {}
+        self.users = []
+        self.rate_limited = 0
+        self.artist_data = {"profiles": [], "artworks": [], "exhibitions": []}
+
+    async def request(self, name, method, endpoint, expected_status=200, record=True, **kwargs):
+        """Send one request; returns the JSON body on the expected status, else None"""
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, f"/api/{endpoint}", **kwargs)
+            ok = response.status_code == expected_status
+        except httpx.HTTPError:
+            response, ok = None, False
+        if record:
+            self.samples.setdefault(name, []).append((time.perf_counter() - start, ok))
+            if response is not None and response.status_code == 429:
+                self.rate_limited += 1
+        if ok and response.content:
+            return response.json()
+        return None
+
+    # Setup: the backend_test.py flows, repeated to build a catalogue to read from
+    async def seed(self, users: int, artists: int, artworks_per_artist: int):
+        stamp = datetime.now().strftime('%H%M%S%f')
+
+        async def seed_user(i: int):
+            user = await self.request("seed", "POST", "auth/register", record=False, json={
+                "email": f"loaduser_{stamp}_{i}@example.com",
+                "password": "testpass123",
+                "name": f"Load Test User {i}",
+                "role": "user",
+            })
+            if user:
+                self.users.append(user)
+
+        for start in range(0, users, 8):
+            await asyncio.gather(*(seed_user(i) for i in range(start, min(start + 8, users))))
+        if not self.users:
+            raise SystemExit("Could not register the load test users; is the API up?")
+        self.user_data = self.users[0]
+
+        async def seed_artist(i: int):
+            city = self.rng.choice(list(CITIES))
+            artist = await self.request("seed", "POST", "auth/register", record=False, json={
+                "email": f"loadartist_{stamp}_{i}@example.com",
+                "password": "testpass123",
+                "name": f"Load Test Artist {i}",
+                "role": "artist",
+            })
+            profile = artist and await self.request("seed", "POST", "artists/profile", record=False, json={
+                "user_id": artist["id"],
+                "bio": f"Artist working in {city}",
+                "skills": self.rng.sample(SKILLS, 2),
+                "city": city,
+                "pincode": CITIES[city],
+                "portfolio_images": [],
+                "annual_fee_paid": True,
+            })
+            if not profile:
+                return
+            self.artist_data["profiles"].append(profile)
+            created = await self.request("seed", "POST", "artworks/bulk", record=False, json={
+                "artist_id": profile["id"],
+                "artworks": [
+                    {
+                        "title": f"{self.rng.choice(SEARCH_TERMS)} study {n}",
+                        "description": "A beautiful test artwork",
+                        "category": self.rng.choice(profile["skills"]),
+                        "price": float(self.rng.randint(1000, 50000)),
+                        "currency": "INR",
+                        "image_url": "https://images.unsplash.com/photo-1562785072-c65ab858fcbc",
+                        "dimensions": "24x36 inches",
+                    }
+                    for n in range(artworks_per_artist)
+                ],
+            })
+            artworks = created["created"] if created else []
+            self.artist_data["artworks"].extend(artworks)
+            if artworks:
+                exhibition = await self.request("seed", "POST", "exhibitions", record=False, json={
+                    "artist_id": profile["id"],
+                    "title": f"Exhibition {i}",
+                    "description": "A test virtual exhibition",
+                    "artwork_ids": [artwork["id"] for artwork in artworks[:5]],
+                    "duration_days": 3,
+                })
+                if exhibition:
+                    await self.request("seed", "PATCH", f"exhibitions/{exhibition['id']}/activate", record=False)
+                    self.artist_data["exhibitions"].append(exhibition)
+
+        # A few at a time, since registration hashes passwords on a bounded pool
+        for start in range(0, artists, 8):
+            await asyncio.gather(*(seed_artist(i) for i in range(start, min(start + 8, artists))))
+
+    # Browse-heavy: the public catalogue pages
+    async def browse_artworks(self):
+        page = await self.request("GET artworks", "GET", "artworks", params={"limit": 20})
+        if page and self.rng.random() < 0.3:
+            await self.request("GET artworks?category", "GET", "artworks",
+                               params={"category": self.rng.choice(SKILLS), "limit": 20})
+
+    async def browse_artwork_detail(self):
+        if self.artist_data["artworks"]:
+            artwork = self.rng.choice(self.artist_data["artworks"])
+            await self.request("GET artworks/{id}", "GET", f"artworks/{artwork['id']}")
+
+    async def browse_artists(self):
+        params = {"limit": 20}
+        if self.rng.random() < 0.5:
+            params["city"] = self.rng.choice(list(CITIES))
+        await self.request("GET artists", "GET", "artists", params=params)
+
+    async def browse_artist_profile(self):
+        if self.artist_data["profiles"]:
+            profile = self.rng.choice(self.artist_data["profiles"])
+            await self.request("GET artists/profile/{user_id}", "GET", f"artists/profile/{profile['user_id']}")
+
+    async def browse_featured(self):
+        await self.request("GET featured/artists", "GET", "featured/artists")
+        await self.request("GET featured/artworks", "GET", "featured/artworks")
+
+    async def browse_exhibitions(self):
+        exhibitions = await self.request("GET exhibitions", "GET", "exhibitions", params={"status": "active"})
+        if exhibitions:
+            exhibition = self.rng.choice(exhibitions)
+            await self.request("GET exhibitions/{id}/expanded", "GET", f"exhibitions/{exhibition['id']}/expanded")
+
+    async def browse_search(self):
+        await self.request("GET search", "GET", "search", params={"q": self.rng.choice(SEARCH_TERMS), "limit": 20})
+
+    # Checkout burst: create sessions and poll them the way the success page does
+    async def checkout(self):
+        session = await self.request("POST payments/checkout", "POST", "payments/checkout", json={
+            "user_id": self.rng.choice(self.users)["id"],
+            "order_type": "membership",
+            "amount": 1000.0,
+            "currency": "INR",
+            "metadata": {"membership_type": "annual"},
+        }, headers={"origin": "http://localhost:3000"})
+        if session:
+            for _ in range(3):
+                await self.request("GET payments/status/{session_id}", "GET", f"payments/status/{session['session_id']}")
+
+    # Order-matching flood: custom orders through matching and artist selection
+    async def custom_order(self):
+        city = self.rng.choice(list(CITIES))
+        order = await self.request("POST orders/custom", "POST", "orders/custom", json={
+            "user_id": self.rng.choice(self.users)["id"],
+            "title": "Custom Portrait",
+            "description": "Need a custom portrait painting",
+            "category": self.rng.choice(SKILLS),
+            "budget": 10000.0,
+            "currency": "INR",
+            "preferred_city": city,
+            "preferred_pincode": CITIES[city] if self.rng.random() < 0.7 else "",
+        })
+        candidates = order and (order["matched_artists"] or order["all_location_artists"])
+        if candidates:
+            await self.request("PATCH orders/custom/{id}/select-artist", "PATCH",
+                               f"orders/custom/{order['id']}/select-artist",
+                               params={"artist_id": candidates[0]})
+
+    async def user_orders(self):
+        user = self.rng.choice(self.users)
+        await self.request("GET orders/custom/user/{user_id}", "GET", f"orders/custom/user/{user['id']}")
+
+    def scenarios(self) -> dict:
+        """Scenario -> [(operation, weight)]"""
+        return {
+            "browse": [
+                (self.browse_artworks, 30), (self.browse_artwork_detail, 20), (self.browse_artists, 15),
+                (self.browse_artist_profile, 10), (self.browse_featured, 10), (self.browse_exhibitions, 10),
+                (self.browse_search, 5),
+            ],
+            "checkout": [(self.checkout, 80), (self.browse_featured, 20)],
+            "matching": [(self.custom_order, 85), (self.user_orders, 15)],
+        }
+
+    async def run(self, scenario: str, concurrency: int, duration: float) -> dict:
+        operations, weights = zip(*self.scenarios()[scenario])
+        self.samples = {}
+        self.rate_limited = 0
+        deadline = time.perf_counter() + duration
+
+        async def worker(rng: random.Random):
+            while time.perf_counter() < deadline:
+                await rng.choices(operations, weights)[0]()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(random.Random(self.rng.random())) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        return self.report(scenario, concurrency, elapsed)
+
+    def report(self, scenario: str, concurrency: int, elapsed: float) -> dict:
+        all_samples = [sample for samples in self.samples.values() for sample in samples]
+        failed = sum(1 for _, ok in all_samples if not ok)
+        test_results = []
+        for name, samples in sorted(self.samples.items()):
+            errors = sum(1 for _, ok in samples if not ok)
+            test_results.append({
+                "test": name,
+                "success": errors == 0,
+                "details": f"{len(samples)} requests, {errors} errors",
+                "requests": len(samples),
+                "error_rate": round(errors / len(samples), 4),
+                "rps": round(len(samples) / elapsed, 1),
+                **latency_summary([seconds for seconds, _ in samples]),
+                "timestamp": datetime.now().isoformat(),
+            })
+        total = len(all_samples)
+        return {
+            "summary": {
+                "scenario": scenario,
+                "concurrency": concurrency,
+                "duration_s": round(elapsed, 2),
+                "total_tests": total,
+                "passed_tests": total - failed,
+                "success_rate": (total - failed) / total * 100 if total else 0,
+                "error_rate": round(failed / total, 4) if total else 0,
+                "rate_limited": self.rate_limited,
+                "rps": round(total / elapsed, 1),
+                **latency_summary([seconds for seconds, _ in all_samples]),
+                "timestamp": datetime.now().isoformat(),
+            },
+            "test_results": test_results,
+        }
+
+async def main_async(args) -> dict:
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+        app = None
+    else:
+        sys.path.insert(0, str(BACKEND_DIR))
+        os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+        os.environ.setdefault("DB_NAME", "loadtest")
+        os.environ.setdefault("STRIPE_API_KEY", "sk_test_loadtest")
+        os.environ.setdefault("STRIPE_API_BASE", f"http://127.0.0.1:{FAKE_STRIPE_PORT}")
+        os.environ.setdefault("FAKE_STRIPE_AUTO_PAY", "1")
+        # Seeding registers accounts; full-cost hashing would dominate setup time
+        os.environ.setdefault("BCRYPT_ROUNDS", "4")
+        # Every simulated user shares one client address, which the per-IP limits would throttle
+        os.environ["RATE_LIMIT_ENABLED"] = "0"
+        import logging
+        import server
+        from fake_stripe import start_fake_stripe
+        logging.getLogger().setLevel(logging.WARNING)
+        start_fake_stripe(FAKE_STRIPE_PORT)
+        app = server.app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://loadtest", timeout=args.timeout)
+
+    async def run() -> dict:
+        tester = ChitraKalakarLoadTester(client, seed=args.seed)
+        print(f"🌱 Seeding {args.users} users, {args.artists} artists x {args.artworks} artworks...")
+        await tester.seed(args.users, args.artists, args.artworks)
+        results = {}
+        for scenario in (tester.scenarios() if args.scenario == "all" else [args.scenario]):
+            print(f"🚀 {scenario}: {args.concurrency} clients for {args.duration}s")
+            results[scenario] = await tester.run(scenario, args.concurrency, args.duration)
+            summary = results[scenario]["summary"]
+            print(f"📈 {summary['rps']} req/s, p50 {summary['p50_ms']} ms, p95 {summary['p95_ms']} ms, "
+                  f"p99 {summary['p99_ms']} ms, errors {summary['error_rate'] * 100:.2f}%")
+            if summary["rate_limited"]:
+                print(f"⚠️  {summary['rate_limited']} requests were rate limited; run the target with RATE_LIMIT_ENABLED=0")
+        results["test_data"] = {"user_data": tester.user_data, "seeded": {
+            "users": len(tester.users), **{kind: len(items) for kind, items in tester.artist_data.items()}
+        }}
+        return results
+
+    async with client:
+        if app is None:
+            return await run()
+        async with app.router.lifespan_context(app):
+            try:
+                return await run()
+            finally:
+                if os.environ["DB_NAME"] == "loadtest":
+                    await server.db.client.drop_database("loadtest")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", choices=["browse", "checkout", "matching", "all"], default="all")
+    parser.add_argument("--base-url", help="Load a running server (e.g. http://localhost:8001) instead of the app in-process")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per scenario")
+    parser.add_argument("--users", type=int, default=50, help="Buyer accounts to seed and spread orders across")
+    parser.add_argument("--artists", type=int, default=40, help="Artists to seed")
+    parser.add_argument("--artworks", type=int, default=10, help="Artworks to seed per artist")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="load_test_results.json")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0 if all(
+        result["summary"]["error_rate"] == 0 for name, result in results.items() if name != "test_data"
+    ) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+import mongomock
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pymongo import ReturnDocument
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "test_database")
+
+import server  # noqa: E402
+
+_find_one_and_update = mongomock.collection.Collection.find_one_and_update
+
+def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                        return_document=ReturnDocument.BEFORE, **kwargs):
+    """mongomock looks the document up again by `filter` after updating it, so with
+    ReturnDocument.AFTER it returns None whenever the update changes a filtered field
+    (as every guarded claim and transition does). Re-read it by _id like MongoDB."""
+    if return_document != ReturnDocument.AFTER or upsert:
+        return _find_one_and_update(self, filter, update, projection=projection, sort=sort, upsert=upsert,
+                                    return_document=return_document, **kwargs)
+    before = _find_one_and_update(self, filter, update, projection={"_id": 1}, sort=sort, **kwargs)
+    return before and self.find_one({"_id": before["_id"]}, projection)
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def mongo(monkeypatch):
+    """server.db on a fresh in-memory database with the app's indexes"""
+    monkeypatch.setattr(mongomock.collection.Collection, "find_one_and_update", find_one_and_update)
+    client = AsyncMongoMockClient()
+    monkeypatch.setattr(server.db, "client", client)
+    monkeypatch.setattr(server.db, "database", client[os.environ["DB_NAME"]])
+    await server.ensure_indexes()
+    yield server.db
+
+@pytest.fixture
+def executors(monkeypatch):
+    """Small thread pools standing in for the ones the lifespan puts on app.state"""
+    pools = {"password_executor": ThreadPoolExecutor(1), "image_executor": ThreadPoolExecutor(1)}
+    for name, pool in pools.items():
+        monkeypatch.setattr(server.app.state, name, pool, raising=False)
+    yield server.app.state
+    for pool in pools.values():
+        pool.shutdown()
+
+@pytest.fixture
+async def client(mongo, executors, monkeypatch):
+    """HTTP client for server.app (without its lifespan) with an empty response cache"""
+    monkeypatch.setattr(server, "response_cache", server.ResponseCache(server.MemoryCacheBackend(64, 60)))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+        yield client
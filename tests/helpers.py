@@ -0,0 +1,28 @@
+from datetime import datetime, timedelta, timezone
+
+def iso(seconds: float = 0) -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).isoformat()
+
+async def insert_artist(mongo):
+    await mongo.artist_profiles.insert_one({
+        "id": "artist-1", "user_id": "artist-user", "city": "Pune", "skills": ["Watercolors"],
+        "commission_rate": 0.10, "total_earnings": 0.0, "total_orders": 0, "rating": 0.0,
+        "annual_fee_paid": False, "version": 1,
+    })
+
+async def insert_transaction(mongo, session_id, order_type, amount=100.0, **fields):
+    await mongo.payment_transactions.insert_one({
+        "id": f"tx-{session_id}", "session_id": session_id, "user_id": "buyer", "order_type": order_type,
+        "amount": amount, "currency": "INR", "payment_status": "pending", **fields,
+    })
+
+async def insert_event(mongo, event_id, session_id, **fields):
+    await mongo.payment_events.insert_one({
+        "event_id": event_id, "event_type": "checkout.session.completed", "session_id": session_id,
+        "payment_status": "paid", "metadata": {}, "status": "pending", "attempts": 0,
+        "available_at": iso(), **fields,
+    })
+
+async def artist_totals(mongo) -> tuple:
+    profile = await mongo.artist_profiles.find_one({"id": "artist-1"})
+    return profile["total_orders"], profile["total_earnings"]
@@ -0,0 +1,80 @@
+import pytest
+
+import server
+from server import complete_order, fulfil_payment, record_artist_sale
+from tests.helpers import artist_totals, insert_artist, insert_transaction, iso
+
+pytestmark = pytest.mark.anyio
+
+async def test_artwork_sale_is_credited_once_across_retries(mongo, monkeypatch):
+    await insert_artist(mongo)
+    await mongo.artworks.insert_one({"id": "artwork-1", "artist_id": "artist-1", "status": "available"})
+    await insert_transaction(mongo, "sess-1", "artwork_purchase", metadata={"artwork_id": "artwork-1"})
+
+    rerank = server.rerank_artist
+    calls = []
+    async def rerank_failing_once(artist_id):
+        calls.append(artist_id)
+        if len(calls) == 1:
+            raise RuntimeError("rerank failed")
+        return await rerank(artist_id)
+    monkeypatch.setattr(server, "rerank_artist", rerank_failing_once)
+
+    with pytest.raises(RuntimeError):
+        await fulfil_payment("sess-1")
+    # The failed attempt released its claim, so the retry goes straight through
+    assert await fulfil_payment("sess-1") == "fulfilled"
+    assert await fulfil_payment("sess-1") == "already_fulfilled"
+    assert await artist_totals(mongo) == (1, 90.0)
+    assert (await mongo.artworks.find_one({"id": "artwork-1"}))["status"] == "sold"
+    assert await mongo.artist_sales.count_documents({"id": "payment:sess-1"}) == 1
+
+async def test_custom_order_credits_paid_amount_once(mongo):
+    await insert_artist(mongo)
+    await mongo.custom_orders.insert_one({
+        "id": "order-1", "user_id": "buyer", "status": "in_progress", "selected_artist_id": "artist-1",
+        "title": "Portrait", "description": "Family portrait", "category": "Watercolors", "budget": 999.0,
+        "currency": "INR", "preferred_city": "Pune", "preferred_pincode": "", "created_at": iso(),
+    })
+    await insert_transaction(mongo, "deposit", "custom_order", amount=50.0, metadata={"order_id": "order-1"})
+    await fulfil_payment("deposit")
+    # Not credited until the order completes
+    assert await artist_totals(mongo) == (0, 0.0)
+
+    await complete_order("order-1", 4)
+    await complete_order("order-1", 4)
+    assert await artist_totals(mongo) == (1, 45.0)
+
+    await insert_transaction(mongo, "balance", "custom_order", amount=20.0, metadata={"order_id": "order-1"})
+    await fulfil_payment("balance")
+    await fulfil_payment("balance")
+    assert await artist_totals(mongo) == (1, 63.0)
+    assert (await mongo.artist_profiles.find_one({"id": "artist-1"}))["rating"] == 4.0
+
+async def test_replayed_sale_key_is_never_counted_twice(mongo):
+    await insert_artist(mongo)
+    await record_artist_sale("artist-1", "payment:first", 10.0)
+    for i in range(60):
+        await record_artist_sale("artist-1", f"payment:{i}", 10.0)
+    # E.g. a webhook for the first sale redelivered much later
+    await record_artist_sale("artist-1", "payment:first", 10.0)
+    assert await artist_totals(mongo) == (61, 549.0)
+
+async def test_retry_after_a_crash_before_the_profile_update_refreshes_everything(mongo):
+    await insert_artist(mongo)
+    await record_artist_sale("artist-1", "order:a", rating=5)
+    # The sale was recorded, then the process died before updating the profile
+    await mongo.artist_sales.insert_one({
+        "id": "order:b", "artist_id": "artist-1", "orders": 1, "earnings": 0.0, "rating": 2, "created_at": iso(),
+    })
+    await record_artist_sale("artist-1", "order:b", rating=2)
+    profile = await mongo.artist_profiles.find_one({"id": "artist-1"})
+    assert (profile["total_orders"], profile["rating"], profile["sales_counted"]) == (2, 3.5, 2)
+
+async def test_a_refresh_that_counted_fewer_sales_does_not_overwrite(mongo):
+    await insert_artist(mongo)
+    await record_artist_sale("artist-1", "order:a", rating=5)
+    # A concurrent refresh already wrote totals covering more sales than this one sees
+    await mongo.artist_profiles.update_one({"id": "artist-1"}, {"$set": {"sales_counted": 3, "total_orders": 3}})
+    await record_artist_sale("artist-1", "order:b", rating=1)
+    assert (await artist_totals(mongo))[0] == 3
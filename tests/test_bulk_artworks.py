@@ -0,0 +1,43 @@
+import pytest
+
+import server
+from tests.helpers import insert_artist
+
+pytestmark = pytest.mark.anyio
+
+ARTWORK = {"title": "Monsoon", "description": "d", "category": "oil", "price": 1500.0,
+           "image_url": "https://example.com/monsoon.jpg"}
+
+async def test_bulk_create_reports_bad_items_and_creates_the_rest(client, mongo):
+    await insert_artist(mongo)
+    response = await client.post("/api/artworks/bulk", json={"artist_id": "artist-1", "artworks": [
+        {**ARTWORK, "title": "One"},
+        {**ARTWORK, "price": "priceless"},
+        {**ARTWORK, "image_url": "", "title": "No image"},
+        {**ARTWORK, "image_id": "missing", "title": "Unknown image"},
+        {**ARTWORK, "title": "Two", "artist_id": "someone-else"},
+    ]})
+    assert response.status_code == 200
+    body = response.json()
+    assert [artwork["title"] for artwork in body["created"]] == ["One", "Two"]
+    assert all(artwork["artist_id"] == "artist-1" for artwork in body["created"])
+    assert [error["index"] for error in body["errors"]] == [1, 2, 3]
+    assert body["errors"][0]["error"].startswith("price:")
+    assert await mongo.artworks.count_documents({}) == 2
+
+async def test_bulk_create_needs_a_known_artist_and_some_items(client, mongo):
+    assert (await client.post("/api/artworks/bulk", json={"artist_id": "nobody", "artworks": [ARTWORK]})).status_code == 404
+    await insert_artist(mongo)
+    assert (await client.post("/api/artworks/bulk", json={"artist_id": "artist-1", "artworks": []})).status_code == 422
+
+async def test_lookup_by_ids_keeps_the_requested_order(client, mongo, monkeypatch):
+    await mongo.artworks.insert_many([
+        {**ARTWORK, "id": artwork_id, "artist_id": "artist-1", "currency": "INR", "dimensions": "",
+         "status": status, "created_at": "2024-01-01"}
+        for artwork_id, status in (("a", "available"), ("b", "sold"), ("c", "available"))
+    ])
+    response = await client.get("/api/artworks", params={"ids": "c,missing,a,b,c"})
+    assert [artwork["id"] for artwork in response.json()] == ["c", "a", "b"]
+
+    monkeypatch.setattr(server, "MAX_LOOKUP_IDS", 2)
+    assert (await client.get("/api/artworks", params={"ids": "a,b,c"})).status_code == 400
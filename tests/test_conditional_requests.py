@@ -0,0 +1,38 @@
+import pytest
+
+from server import versioned
+from tests.helpers import insert_artist
+
+pytestmark = pytest.mark.anyio
+
+ARTWORK = {"artist_id": "artist-1", "title": "Monsoon", "description": "d", "category": "oil", "price": 1500.0,
+           "image_url": "https://example.com/monsoon.jpg"}
+
+async def test_artwork_detail_answers_if_none_match(client, mongo):
+    await insert_artist(mongo)
+    artwork_id = (await client.post("/api/artworks", json=ARTWORK)).json()["id"]
+    first = await client.get(f"/api/artworks/{artwork_id}")
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"].endswith("GMT")
+
+    unchanged = await client.get(f"/api/artworks/{artwork_id}", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert (unchanged.status_code, unchanged.content, unchanged.headers["etag"]) == (304, b"", etag)
+
+    await mongo.artworks.update_one({"id": artwork_id}, versioned({"$set": {"price": 1800.0}}))
+    changed = await client.get(f"/api/artworks/{artwork_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["price"] == 1800.0
+    assert changed.headers["etag"] != etag
+
+async def test_artwork_listing_etag_follows_writes_and_the_query(client, mongo):
+    await insert_artist(mongo)
+    await client.post("/api/artworks", json=ARTWORK)
+    etag = (await client.get("/api/artworks")).headers["etag"]
+    assert (await client.get("/api/artworks", headers={"If-None-Match": etag})).status_code == 304
+    # Another query over the same collection has its own validator
+    assert (await client.get("/api/artworks?category=oil", headers={"If-None-Match": etag})).status_code == 200
+
+    await client.post("/api/artworks", json={**ARTWORK, "title": "Dusk"})
+    relisted = await client.get("/api/artworks", headers={"If-None-Match": etag})
+    assert relisted.status_code == 200
+    assert sorted(artwork["title"] for artwork in relisted.json()) == ["Dusk", "Monsoon"]
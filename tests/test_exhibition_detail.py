@@ -0,0 +1,47 @@
+import pytest
+
+from server import versioned
+from tests.helpers import insert_artist
+
+pytestmark = pytest.mark.anyio
+
+async def insert_artworks(mongo, *artwork_ids, artist_id="artist-1"):
+    await mongo.artworks.insert_many([
+        {"id": artwork_id, "artist_id": artist_id, "title": artwork_id.upper(), "description": "d", "category": "oil",
+         "price": 100.0, "currency": "INR", "image_url": "https://example.com/a.jpg", "dimensions": "",
+         "status": "available", "created_at": "2024-01-01T00:00:00+00:00", "version": 1}
+        for artwork_id in artwork_ids
+    ])
+
+async def test_expanded_exhibition_embeds_artworks_and_artist(client, mongo):
+    await insert_artist(mongo)
+    await mongo.users.insert_one({"id": "artist-user", "name": "Asha"})
+    await insert_artworks(mongo, "a", "b", "c")
+    exhibition = (await client.post("/api/exhibitions", json={
+        "artist_id": "artist-1", "title": "t", "description": "d", "artwork_ids": ["c", "a", "b"],
+    })).json()
+    await mongo.artworks.delete_one({"id": "b"})
+
+    response = await client.get(f"/api/exhibitions/{exhibition['id']}/expanded")
+    body = response.json()
+    assert [artwork["id"] for artwork in body["artworks"]] == ["c", "a"]
+    assert body["artist"] == {"id": "artist-1", "user_id": "artist-user", "name": "Asha", "city": "Pune",
+                              "skills": ["Watercolors"], "rating": 0.0}
+
+    # A write to one of its artworks changes the expanded view's validator
+    etag = response.headers["etag"]
+    assert (await client.get(f"/api/exhibitions/{exhibition['id']}/expanded", headers={"If-None-Match": etag})).status_code == 304
+    await mongo.artworks.update_one({"id": "a"}, versioned({"$set": {"price": 150.0}}))
+    assert (await client.get(f"/api/exhibitions/{exhibition['id']}/expanded", headers={"If-None-Match": etag})).status_code == 200
+    assert (await client.get("/api/exhibitions/missing/expanded")).status_code == 404
+
+async def test_exhibitions_only_take_the_artists_own_artworks(client, mongo):
+    await insert_artist(mongo)
+    await insert_artworks(mongo, "mine")
+    await insert_artworks(mongo, "theirs", artist_id="artist-2")
+    response = await client.post("/api/exhibitions", json={
+        "artist_id": "artist-1", "title": "t", "description": "d", "artwork_ids": ["mine", "theirs", "ghost"],
+    })
+    assert response.status_code == 400
+    assert response.json()["detail"].endswith("ghost, theirs")
+    assert await mongo.exhibitions.count_documents({}) == 0
@@ -0,0 +1,71 @@
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import (ExhibitionCreate, acquire_leadership, activate_exhibition, archive_expired_exhibitions,
+                    create_exhibition, purge_expired_archives)
+from tests.helpers import iso
+
+pytestmark = pytest.mark.anyio
+
+async def insert_artworks(mongo, **statuses):
+    await mongo.artworks.insert_many([
+        {"id": artwork_id, "artist_id": "artist-1", "status": status, "version": 1}
+        for artwork_id, status in statuses.items()
+    ])
+
+async def artwork_statuses(mongo) -> dict:
+    return {artwork["id"]: artwork["status"] async for artwork in mongo.artworks.find({})}
+
+async def test_sold_artworks_cannot_be_exhibited(mongo):
+    await insert_artworks(mongo, a="available", b="sold")
+    with pytest.raises(HTTPException) as error:
+        await create_exhibition(ExhibitionCreate(artist_id="artist-1", title="t", description="d", artwork_ids=["a", "b"]))
+    assert error.value.status_code == 400
+    assert "b" in error.value.detail
+
+    exhibition = await create_exhibition(ExhibitionCreate(artist_id="artist-1", title="t", description="d", artwork_ids=["a"]))
+    # Sold between creation and activation
+    await mongo.artworks.update_one({"id": "a"}, {"$set": {"status": "sold"}})
+    with pytest.raises(HTTPException) as error:
+        await activate_exhibition(exhibition.id)
+    assert error.value.status_code == 400
+    assert await artwork_statuses(mongo) == {"a": "sold", "b": "sold"}
+
+async def test_activation_puts_artworks_on_show(mongo):
+    await insert_artworks(mongo, a="available", b="available")
+    exhibition = await create_exhibition(ExhibitionCreate(artist_id="artist-1", title="t", description="d", artwork_ids=["a", "b"]))
+    await activate_exhibition(exhibition.id)
+    assert await artwork_statuses(mongo) == {"a": "in_exhibition", "b": "in_exhibition"}
+    stored = await mongo.exhibitions.find_one({"id": exhibition.id})
+    assert stored["status"] == "active"
+    assert stored["start_date"] < stored["end_date"] < stored["archive_until"]
+
+async def test_archive_releases_only_artworks_no_longer_shown(mongo):
+    await insert_artworks(mongo, shown="in_exhibition", sold="sold", shared="in_exhibition")
+    await mongo.exhibitions.insert_many([
+        {"id": "ended", "status": "active", "end_date": iso(-60), "artwork_ids": ["shown", "sold", "shared"]},
+        {"id": "running", "status": "active", "end_date": iso(3600), "artwork_ids": ["shared"]},
+    ])
+    assert await archive_expired_exhibitions(iso()) == 1
+    assert await artwork_statuses(mongo) == {"shown": "available", "sold": "sold", "shared": "in_exhibition"}
+    assert (await mongo.exhibitions.find_one({"id": "ended"}))["status"] == "archived"
+    assert (await mongo.exhibitions.find_one({"id": "running"}))["status"] == "active"
+    assert await archive_expired_exhibitions(iso()) == 0
+
+async def test_purge_deletes_archives_past_their_retention(mongo):
+    await mongo.exhibitions.insert_many([
+        {"id": "old", "status": "archived", "archive_until": iso(-60)},
+        {"id": "recent", "status": "archived", "archive_until": iso(3600)},
+    ])
+    assert await purge_expired_archives(iso()) == 1
+    assert [exhibition["id"] async for exhibition in mongo.exhibitions.find({})] == ["recent"]
+
+async def test_only_one_worker_holds_the_scheduler_lease(mongo, monkeypatch):
+    assert await acquire_leadership("lifecycle", 60) is True
+    assert await acquire_leadership("lifecycle", 60) is True  # Renewal by the holder
+    monkeypatch.setattr(server, "WORKER_ID", "other-worker")
+    assert await acquire_leadership("lifecycle", 60) is False
+    await mongo.scheduler_leases.update_one({"_id": "lifecycle"}, {"$set": {"lease_until": iso(-1)}})
+    assert await acquire_leadership("lifecycle", 60) is True
+    assert (await mongo.scheduler_leases.find_one({"_id": "lifecycle"}))["owner"] == "other-worker"
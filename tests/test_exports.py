@@ -0,0 +1,60 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+import server
+from server import ExportSlot
+
+pytestmark = pytest.mark.anyio
+
+TOKEN = {"X-Export-Token": "secret"}
+
+@pytest.fixture
+async def artworks(mongo, monkeypatch):
+    monkeypatch.setattr(server, "EXPORT_TOKEN", "secret")
+    monkeypatch.setattr(server, "EXPORT_CHUNK_BYTES", 256)  # Several chunks per export
+    await mongo.artworks.insert_many([
+        {"id": f"aw-{i:02d}", "artist_id": "artist-1", "title": f"T{i}", "description": "d", "category": "oil",
+         "price": 100.0, "currency": "INR", "image_url": "", "dimensions": "", "status": "available",
+         "image_variants": {"thumb": {"url": "/t.webp", "width": 1, "height": 1}}, "created_at": "2024-01-01"}
+        for i in reversed(range(12))
+    ])
+
+async def test_exports_need_the_token(client, monkeypatch):
+    assert (await client.get("/api/export/artworks")).status_code == 403
+    monkeypatch.setattr(server, "EXPORT_TOKEN", "secret")
+    assert (await client.get("/api/export/artworks", headers={"X-Export-Token": "guess"})).status_code == 401
+
+async def test_ndjson_export_is_in_id_order_and_resumes(client, artworks):
+    response = await client.get("/api/export/artworks", headers=TOKEN)
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["id"] for row in rows] == [f"aw-{i:02d}" for i in range(12)]
+    assert list(rows[0]) == server.ARTWORK_EXPORT_COLUMNS
+
+    resumed = await client.get("/api/export/artworks", params={"resume_after": "aw-09"}, headers=TOKEN)
+    assert [json.loads(line)["id"] for line in resumed.text.splitlines()] == ["aw-10", "aw-11"]
+
+async def test_gzipped_csv_export(client, artworks):
+    response = await client.get("/api/export/artworks", params={"format": "csv", "gzip": "true"}, headers=TOKEN)
+    assert response.headers["content-disposition"] == 'attachment; filename="artworks.csv.gz"'
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.content).decode())))
+    assert len(rows) == 12
+    assert json.loads(rows[0]["image_variants"]) == {"thumb": {"url": "/t.webp", "width": 1, "height": 1}}
+
+async def test_export_slots_are_capped_and_given_back(client, artworks, monkeypatch):
+    monkeypatch.setattr(server, "EXPORT_MAX_CONCURRENT", 1)
+    held = ExportSlot()
+    try:
+        response = await client.get("/api/export/artworks", headers=TOKEN)
+        assert (response.status_code, response.headers["retry-after"]) == (503, "30")
+    finally:
+        held.release()
+    held.release()  # Giving a slot back twice frees it only once
+    assert server.exports_active == 0
+
+    assert (await client.get("/api/export/artworks", headers=TOKEN)).status_code == 200
+    assert server.exports_active == 0
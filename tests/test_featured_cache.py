@@ -0,0 +1,39 @@
+import pytest
+
+import server
+from server import MemoryCacheBackend
+from tests.helpers import insert_artist
+
+pytestmark = pytest.mark.anyio
+
+ARTWORK = {"artist_id": "artist-1", "title": "Monsoon", "description": "d", "category": "oil", "price": 1500.0,
+           "image_url": "https://example.com/monsoon.jpg"}
+
+async def featured_titles(client) -> list:
+    response = await client.get("/api/featured/artworks")
+    assert response.status_code == 200
+    return [artwork["title"] for artwork in response.json()]
+
+async def test_featured_artworks_are_cached_until_a_write_invalidates_them(client, mongo):
+    await insert_artist(mongo)
+    assert await featured_titles(client) == []
+    # Written behind the API's back: the cached listing is still served
+    await mongo.artworks.insert_one({**ARTWORK, "id": "direct", "title": "Direct", "currency": "INR",
+                                     "dimensions": "", "status": "available", "created_at": "2024-01-01"})
+    assert await featured_titles(client) == []
+    assert server.response_cache.stats()["keys"][server.FEATURED_ARTWORKS_KEY] == {"hits": 1, "misses": 1}
+
+    assert (await client.post("/api/artworks", json=ARTWORK)).status_code == 200
+    assert sorted(await featured_titles(client)) == ["Direct", "Monsoon"]
+
+async def test_memory_cache_expires_and_evicts_least_recently_used(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(server.time, "monotonic", lambda: now[0])
+    cache = MemoryCacheBackend(max_entries=2, ttl=60)
+    await cache.set("a", 1)
+    await cache.set("b", 2)
+    assert await cache.get("a") == 1
+    await cache.set("c", 3)  # "b" is the least recently used
+    assert (await cache.get("a"), await cache.get("b"), await cache.get("c")) == (1, None, 3)
+    now[0] += 60
+    assert await cache.get("a") is None
@@ -0,0 +1,55 @@
+import io
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from starlette.requests import Request
+
+import server
+from server import LocalImageStore, upload_image
+
+pytestmark = pytest.mark.anyio
+
+def png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 120, 40)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+def upload(body: bytes, content_type: str = "image/png") -> Request:
+    chunks = [body[:1000], body[1000:]]
+    async def receive():
+        chunk = chunks.pop(0) if chunks else b""
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+    headers = [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())]
+    return Request({"type": "http", "method": "POST", "path": "/api/images", "headers": headers, "app": server.app}, receive)
+
+@pytest.fixture
+def media(tmp_path, monkeypatch, executors):
+    store = LocalImageStore(tmp_path / "media", "/api/media", tmp_path / "media.uploads")
+    monkeypatch.setattr(server, "image_store", store)
+    return store
+
+def stored_files(root) -> list:
+    return sorted(path.relative_to(root).as_posix() for path in root.rglob("*") if path.is_file())
+
+async def test_upload_renders_variants_once_per_content(mongo, media):
+    body = png(1200, 800)
+    image = await upload_image(upload(body))
+    assert set(image.variants) == {"original", "thumb", "w480", "w960"}
+    assert (image.variants["w960"].width, image.variants["w960"].height) == (960, 640)
+    assert image.variants["original"].url.startswith("/api/media/images/")
+
+    again = await upload_image(upload(body))
+    assert again.id == image.id
+    assert await mongo.images.count_documents({}) == 1
+    prefix = f"images/{image.id[:2]}/{image.id}"
+    assert stored_files(media.root) == [f"{prefix}/{name}" for name in ("original.png", "thumb.webp", "w480.webp", "w960.webp")]
+    # Nothing in progress is ever under the served directory, and nothing is left behind
+    assert not (media.root / ".uploads").exists()
+    assert stored_files(media.scratch) == []
+
+async def test_upload_rejects_content_that_is_not_an_image(mongo, media):
+    with pytest.raises(HTTPException) as error:
+        await upload_image(upload(b"not an image at all" * 100))
+    assert error.value.status_code == 400
+    assert not media.root.exists() or stored_files(media.root) == []
+    assert await mongo.images.count_documents({}) == 0
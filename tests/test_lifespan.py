@@ -0,0 +1,26 @@
+import os
+
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+
+def test_the_app_can_be_started_again(monkeypatch):
+    client = AsyncMongoMockClient()
+    def connect():
+        server.db.client, server.db.database = client, client[os.environ["DB_NAME"]]
+    async def warm_up():
+        pass
+    monkeypatch.setattr(server.db, "connect", connect)
+    monkeypatch.setattr(server.db, "warm_up", warm_up)
+
+    pools = []
+    for attempt in range(2):
+        with TestClient(server.app) as http:
+            assert server.app.state.ready is True
+            user = {"email": f"artist{attempt}@example.com", "name": "A", "role": "artist", "password": "secret"}
+            # Hashing runs on the password pool this lifespan created
+            assert http.post("/api/auth/register", json=user).status_code == 200
+            pools.append(server.app.state.password_executor)
+        assert server.app.state.ready is False
+    assert pools[0] is not pools[1]
@@ -0,0 +1,31 @@
+import json
+
+from fastapi import Response
+
+import server
+from server import ArtworkResponse, encode_items, list_response
+
+ARTWORK = {
+    "_id": "mongo-id", "id": "aw-1", "artist_id": "artist-1", "title": "Monsoon", "description": "d",
+    "category": "oil", "price": 1500.0, "currency": "inr", "image_url": "/media/aw-1.webp",
+    "dimensions": "30x40", "status": "available", "created_at": "2024-01-01T00:00:00", "version": 3,
+}
+
+def test_trusted_encoding_matches_validated_encoding():
+    docs = [ARTWORK, {**ARTWORK, "id": "aw-2", "image_id": "img-2"}]
+    trusted = json.loads(encode_items(ArtworkResponse, docs, trusted=True))
+    validated = json.loads(encode_items(ArtworkResponse, docs, trusted=False))
+    assert trusted == validated
+    assert trusted[0]["image_variants"] == {} and "version" not in trusted[0]
+
+def test_list_response_is_plain_models_unless_the_fast_path_is_on(monkeypatch):
+    monkeypatch.setattr(server, "FAST_LIST_RESPONSES", False)
+    assert list_response(ArtworkResponse, [ARTWORK]) == [ArtworkResponse(**ARTWORK)]
+
+    monkeypatch.setattr(server, "FAST_LIST_RESPONSES", True)
+    injected = Response()
+    injected.headers["X-Next-Cursor"] = "abc"
+    encoded = list_response(ArtworkResponse, [ARTWORK] * 3, injected)
+    assert encoded.headers["X-Next-Cursor"] == "abc"
+    assert int(encoded.headers["content-length"]) == len(encoded.body)
+    assert [item["id"] for item in json.loads(encoded.body)] == ["aw-1"] * 3
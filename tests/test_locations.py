@@ -0,0 +1,30 @@
+import pytest
+
+import server
+from server import PINCODE_TABLE_VERSION, backfill_artist_locations, change_marker, pincode_point
+
+def test_pincode_point_falls_back_to_the_district_prefix(monkeypatch):
+    monkeypatch.setitem(server.PINCODE_LOCATIONS, "411001", (73.85, 18.52))
+    assert pincode_point(" 411001 ") == {"type": "Point", "coordinates": [73.85, 18.52]}
+    assert pincode_point("411045") == {"type": "Point", "coordinates": [73.8567, 18.5204]}
+    assert pincode_point("999999") is None
+    assert pincode_point(None) is None
+
+@pytest.mark.anyio
+async def test_backfill_locates_each_profile_once_per_table(mongo):
+    await mongo.artist_profiles.insert_many([
+        {"id": "pune", "user_id": "pune", "pincode": "411045", "version": 1},
+        {"id": "nowhere", "user_id": "nowhere", "pincode": "999999", "location": {"type": "Point", "coordinates": [0, 0]}, "version": 1},
+        {"id": "done", "user_id": "done", "pincode": "400001", "location_table": PINCODE_TABLE_VERSION, "version": 1},
+    ])
+    await backfill_artist_locations()
+    profiles = {profile["id"]: profile async for profile in mongo.artist_profiles.find({})}
+    assert profiles["pune"]["location"] == {"type": "Point", "coordinates": [73.8567, 18.5204]}
+    assert "location" not in profiles["nowhere"]
+    assert "location" not in profiles["done"]
+    assert [profiles[name]["version"] for name in ("pune", "nowhere", "done")] == [2, 2, 1]
+    assert all(profile["location_table"] == PINCODE_TABLE_VERSION for profile in profiles.values())
+
+    marker = await change_marker("artist_profiles")
+    await backfill_artist_locations()
+    assert await change_marker("artist_profiles") == marker
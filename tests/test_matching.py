@@ -0,0 +1,62 @@
+import pytest
+
+from server import ArtistMatcher
+
+def artist(artist_id, city, skills, rating=0.0, total_orders=0, paid=True):
+    return {"id": artist_id, "city": city, "skills": skills, "rating": rating,
+            "total_orders": total_orders, "annual_fee_paid": paid}
+
+ARTISTS = [
+    artist("a", "Pune", ["Oil Painting"], rating=4.0, total_orders=10),
+    artist("b", "Pune", ["Oil Painting", "Charcoal"], rating=4.0, total_orders=2),
+    artist("c", "Pune", ["Charcoal"], rating=5.0),
+    artist("d", "Delhi", ["Oil Painting"], rating=4.5),
+    artist("e", "Delhi", ["Oil Painting"], rating=4.9, paid=False),
+]
+
+class Profiles:
+    """The find() surface ArtistMatcher.rebuild reads"""
+    def __init__(self, profiles):
+        self.profiles = profiles
+
+    async def _iterate(self, query):
+        for profile in self.profiles:
+            if all(profile.get(field) == value for field, value in query.items()):
+                yield profile
+
+    def find(self, query, projection=None):
+        return self._iterate(query)
+
+@pytest.fixture
+def matcher():
+    matcher = ArtistMatcher()
+    for profile in ARTISTS:
+        matcher.upsert(profile)
+    return matcher
+
+def test_match_orders_by_rating_then_fewest_orders(matcher):
+    assert matcher.match("Pune", "Oil Painting") == (["b", "a"], ["d"])
+    assert matcher.match("Pune", None) == (["c", "b", "a"], ["d"])
+    assert matcher.match("Mumbai", "Charcoal") == ([], ["c", "b"])
+
+def test_limits_and_local_ids(matcher):
+    assert matcher.match("Pune", "Oil Painting", local_limit=1, other_limit=1) == (["b"], ["d"])
+    assert matcher.match("Pune", "Oil Painting", local_ids=["d"]) == (["d"], ["b", "a"])
+
+def test_upsert_reranks_and_drops_unpaid(matcher):
+    matcher.upsert(artist("a", "Pune", ["Oil Painting"], rating=4.8))
+    assert matcher.match("Pune", "Oil Painting")[0] == ["a", "b"]
+    matcher.upsert(artist("b", "Pune", ["Oil Painting", "Charcoal"], paid=False))
+    assert matcher.match("Pune", "Oil Painting")[0] == ["a"]
+    assert matcher.match("Pune", "Charcoal")[0] == ["c"]
+    matcher.remove("a")
+    assert matcher.match("Pune", "Oil Painting") == ([], ["d"])
+
+@pytest.mark.anyio
+async def test_rebuild_matches_incremental_upserts(matcher):
+    rebuilt = ArtistMatcher()
+    await rebuilt.rebuild(Profiles(ARTISTS))
+    assert rebuilt.artists == matcher.artists
+    assert {key: bucket for key, bucket in rebuilt.buckets.items()} == {
+        key: bucket for key, bucket in matcher.buckets.items() if bucket
+    }
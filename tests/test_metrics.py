@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from server import CommandMetricsListener, Metrics, request_commands
+
+@pytest.fixture
+def fresh_metrics(monkeypatch):
+    fresh = Metrics()
+    monkeypatch.setattr(server, "metrics", fresh)
+    return fresh
+
+@pytest.mark.anyio
+async def test_requests_are_counted_by_route_template(client, fresh_metrics):
+    for artwork_id in ("a", "b"):
+        assert (await client.get(f"/api/artworks/{artwork_id}")).status_code == 404
+    await client.get("/nowhere")
+    exposition = (await client.get("/metrics")).text
+
+    route = 'method="GET",route="/api/artworks/{artwork_id}"'
+    assert f'http_responses_total{{{route},status="404"}} 2' in exposition
+    assert f'http_request_duration_seconds_count{{{route}}} 2' in exposition
+    assert f'http_request_duration_seconds_bucket{{{route},le="+Inf"}} 2' in exposition
+    assert 'http_responses_total{method="GET",route="unmatched",status="404"} 1' in exposition
+    assert f'http_requests_in_flight{{{route}}} 0' in exposition
+
+def test_mongo_commands_are_charged_to_the_request_that_issued_them(fresh_metrics):
+    listener = CommandMetricsListener()
+    event = SimpleNamespace(command_name="find", duration_micros=1500)
+    commands = []
+    token = request_commands.set(commands)
+    try:
+        listener.succeeded(event)
+    finally:
+        request_commands.reset(token)
+    assert commands == [("find", 0.0015)]
+
+    listener.failed(event)  # Outside any request
+    assert fresh_metrics.commands == {("background", "find"): 1}
+
+def test_label_values_are_escaped():
+    assert server.label_set(route='a"b\\c\nd') == 'route="a\\"b\\\\c\\nd"'
@@ -0,0 +1,45 @@
+import pytest
+from fastapi import HTTPException
+
+from server import ORDER_TRANSITIONS, transition_order
+
+pytestmark = pytest.mark.anyio
+
+async def insert_order(mongo, status="pending", **fields):
+    await mongo.custom_orders.insert_one({"id": "order-1", "user_id": "buyer", "status": status, **fields})
+
+async def test_happy_path(mongo):
+    await insert_order(mongo)
+    for status in ("matched", "sent_to_artist", "rejected", "sent_to_artist", "accepted", "in_progress", "completed"):
+        order = await transition_order("order-1", status)
+        assert order["status"] == status
+        assert "_id" not in order
+
+@pytest.mark.parametrize("current, target", [
+    ("pending", "completed"),
+    ("pending", "accepted"),
+    ("matched", "in_progress"),
+    ("accepted", "rejected"),
+    ("completed", "in_progress"),
+    ("completed", "completed"),
+])
+async def test_illegal_transition_is_rejected(mongo, current, target):
+    assert current not in ORDER_TRANSITIONS[target]
+    await insert_order(mongo, status=current)
+    with pytest.raises(HTTPException) as error:
+        await transition_order("order-1", target)
+    assert error.value.status_code == 409
+    assert (await mongo.custom_orders.find_one({"id": "order-1"}))["status"] == current
+
+async def test_missing_order_is_rejected(mongo):
+    with pytest.raises(HTTPException) as error:
+        await transition_order("missing", "matched")
+    assert error.value.status_code == 409
+
+async def test_guard_must_match(mongo):
+    await insert_order(mongo, status="sent_to_artist", selected_artist_id="artist-1")
+    with pytest.raises(HTTPException):
+        await transition_order("order-1", "accepted", guard={"selected_artist_id": "artist-2"})
+    order = await transition_order("order-1", "accepted", {"accepted_at": "now"}, guard={"selected_artist_id": "artist-1"})
+    assert order["status"] == "accepted"
+    assert order["accepted_at"] == "now"
@@ -0,0 +1,52 @@
+import pytest
+from fastapi import HTTPException, Response
+from pymongo import ASCENDING, DESCENDING
+
+from server import NEWEST_FIRST, decode_cursor, encode_cursor, fetch_page, keyset_filter
+
+def test_keyset_filter_single_key():
+    assert keyset_filter([("id", ASCENDING)], ["x"]) == {"id": {"$gt": "x"}}
+
+def test_keyset_filter_breaks_ties_on_later_keys():
+    # The leading key's bound also limits the tie branches to its cursor value
+    assert keyset_filter(NEWEST_FIRST, ["2024-01-01", "b"]) == {
+        "created_at": {"$lte": "2024-01-01"},
+        "$or": [{"created_at": {"$lt": "2024-01-01"}}, {"id": {"$lt": "b"}}],
+    }
+
+def test_keyset_filter_mixed_directions():
+    sort = [("rating", DESCENDING), ("total_orders", ASCENDING), ("id", ASCENDING)]
+    assert keyset_filter(sort, [4.5, 3, "x"]) == {
+        "rating": {"$lte": 4.5},
+        "$or": [{"rating": {"$lt": 4.5}}, {"total_orders": {"$gt": 3}}, {"total_orders": 3, "id": {"$gt": "x"}}],
+    }
+
+def test_cursor_round_trip_and_rejects_garbage():
+    assert decode_cursor(encode_cursor(["2024-01-01", "b"]), 2) == ["2024-01-01", "b"]
+    for cursor in ("not base64!", encode_cursor(["only one"]), encode_cursor({"a": 1})):
+        with pytest.raises(HTTPException) as error:
+            decode_cursor(cursor, 2)
+        assert error.value.status_code == 400
+
+@pytest.mark.anyio
+async def test_pages_are_continuous_across_tied_created_at(mongo):
+    # Several documents share each created_at, and page boundaries fall inside the ties
+    docs = [
+        {"id": f"aw-{i:02d}", "status": "available", "created_at": f"2024-01-0{1 + i // 4}T00:00:00"}
+        for i in range(11)
+    ]
+    await mongo.artworks.insert_many([dict(doc) for doc in docs])
+    await mongo.artworks.insert_one({"id": "aw-sold", "status": "sold", "created_at": "2024-01-02T00:00:00"})
+    expected = [doc["id"] for doc in sorted(docs, key=lambda doc: (doc["created_at"], doc["id"]), reverse=True)]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        response = Response()
+        page = await fetch_page("artworks", {"status": "available"}, NEWEST_FIRST, cursor, 3, response)
+        seen.extend(doc["id"] for doc in page)
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == expected
+    assert pages == 4
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import server
+from server import BCRYPT_ROUNDS, UserLogin, hash_password, login, run_password_job
+
+pytestmark = pytest.mark.anyio
+
+async def test_password_jobs_are_shed_once_the_queue_is_full(monkeypatch, executors):
+    monkeypatch.setattr(server, "PASSWORD_WORKERS", 1)
+    monkeypatch.setattr(server, "PASSWORD_QUEUE_DEPTH", 1)
+    release = threading.Event()
+    running = [asyncio.ensure_future(run_password_job(executors.password_executor, release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException) as error:
+        await run_password_job(executors.password_executor, release.wait)
+    assert error.value.status_code == 503
+    assert error.value.headers == {"Retry-After": "1"}
+
+    release.set()
+    assert await asyncio.gather(*running) == [True, True]
+    assert server.password_jobs_pending == 0
+
+async def test_login_upgrades_hashes_made_with_another_cost(mongo, executors):
+    await mongo.users.insert_one({
+        "id": "u1", "email": "artist@example.com", "name": "A", "role": "artist",
+        "password": hash_password("secret", rounds=4), "has_membership": False, "created_at": "2024-01-01",
+    })
+    request = Request({"type": "http", "method": "POST", "path": "/", "headers": [], "client": ("10.0.0.1", 1), "app": server.app})
+    credentials = UserLogin(email="artist@example.com", password="secret")
+
+    assert (await login(request, credentials)).id == "u1"
+    upgraded = (await mongo.users.find_one({"id": "u1"}))["password"]
+    assert upgraded.startswith(f"$2b${BCRYPT_ROUNDS:02d}$")
+    # Already at the configured cost: left alone
+    await login(request, credentials)
+    assert (await mongo.users.find_one({"id": "u1"}))["password"] == upgraded
@@ -0,0 +1,54 @@
+import pytest
+
+import server
+from server import check_payment_status
+from tests.helpers import insert_transaction, iso
+
+pytestmark = pytest.mark.anyio
+
+class Upstream:
+    """Stands in for PaymentClient and counts the status lookups that reach it"""
+    def __init__(self, payment_status="paid", status="complete"):
+        self.lookups = 0
+        self.response = server.CheckoutStatusResponse(
+            status=status, payment_status=payment_status, amount_total=10000, currency="inr", metadata={}
+        )
+
+    async def get_checkout_status(self, session_id):
+        self.lookups += 1
+        return self.response
+
+@pytest.fixture
+def upstream(monkeypatch):
+    upstream = Upstream()
+    monkeypatch.setattr(server, "payment_client", upstream)
+    monkeypatch.setattr(server, "payment_status_poller", server.PaymentStatusPoller(0))
+    return upstream
+
+async def test_settled_payments_are_answered_locally(mongo, upstream):
+    await insert_transaction(mongo, "paid", "membership", metadata={}, payment_status="paid", fulfilment_status="fulfilled")
+    await insert_transaction(mongo, "expired", "membership", metadata={}, payment_status="expired")
+    assert (await check_payment_status("paid"))["payment_status"] == "paid"
+    assert (await check_payment_status("expired"))["status"] == "expired"
+    assert upstream.lookups == 0
+    assert server.payment_status_poller.stats()["local"] == 2
+
+async def test_poll_retries_a_failed_fulfilment(mongo, upstream):
+    # A previous fulfilment claimed the payment, then failed and released its claim
+    await mongo.users.insert_one({"id": "buyer", "has_membership": False})
+    await insert_transaction(mongo, "sess-1", "membership", metadata={}, payment_status="paid",
+                             fulfilment_status="in_progress", fulfilment_lease_until=iso(-1))
+    status = await check_payment_status("sess-1")
+    assert status["payment_status"] == "paid"
+    assert upstream.lookups == 0
+    assert (await mongo.payment_transactions.find_one({"session_id": "sess-1"}))["fulfilment_status"] == "fulfilled"
+    assert (await mongo.users.find_one({"id": "buyer"}))["has_membership"] is True
+
+async def test_pending_payments_ask_upstream_and_fulfil(mongo, upstream):
+    await mongo.users.insert_one({"id": "buyer", "has_membership": False})
+    await insert_transaction(mongo, "sess-1", "membership", metadata={})
+    assert (await check_payment_status("sess-1"))["payment_status"] == "paid"
+    assert upstream.lookups == 1
+    assert (await mongo.users.find_one({"id": "buyer"}))["has_membership"] is True
+    await check_payment_status("sess-1")
+    assert upstream.lookups == 1
@@ -0,0 +1,95 @@
+import pytest
+
+import server
+from server import fulfil_payment, process_payment_events
+from tests.helpers import artist_totals, insert_artist, insert_event, insert_transaction, iso
+
+pytestmark = pytest.mark.anyio
+
+async def test_fulfil_payment_runs_once(mongo):
+    await mongo.users.insert_one({"id": "buyer", "has_membership": False})
+    await insert_transaction(mongo, "sess-1", "membership", metadata={})
+    assert await fulfil_payment("sess-1") == "fulfilled"
+    assert await fulfil_payment("sess-1") == "already_fulfilled"
+    transaction = await mongo.payment_transactions.find_one({"session_id": "sess-1"})
+    assert transaction["payment_status"] == "paid"
+    assert transaction["fulfilment_status"] == "fulfilled"
+    assert "fulfilment_lease_until" not in transaction
+    assert (await mongo.users.find_one({"id": "buyer"}))["has_membership"] is True
+
+async def test_fulfilment_claim_is_leased(mongo):
+    # Held by a live worker: left alone. Held past its lease: taken over.
+    await insert_transaction(mongo, "held", "membership", metadata={}, payment_status="paid",
+                             fulfilment_status="in_progress", fulfilment_lease_until=iso(60))
+    await insert_transaction(mongo, "abandoned", "membership", metadata={}, payment_status="paid",
+                             fulfilment_status="in_progress", fulfilment_lease_until=iso(-60))
+    assert await fulfil_payment("held") == "in_progress"
+    assert await fulfil_payment("abandoned") == "fulfilled"
+    assert (await mongo.payment_transactions.find_one({"session_id": "abandoned"}))["fulfilment_status"] == "fulfilled"
+
+async def test_outbox_applies_each_payment_once(mongo):
+    await insert_artist(mongo)
+    await mongo.artworks.insert_one({"id": "artwork-1", "artist_id": "artist-1", "status": "available"})
+    await insert_transaction(mongo, "sess-1", "artwork_purchase", metadata={"artwork_id": "artwork-1"})
+    # Stripe can send more than one event for the same session
+    await insert_event(mongo, "evt-1", "sess-1")
+    await insert_event(mongo, "evt-2", "sess-1")
+
+    assert await process_payment_events() == 2
+    assert await process_payment_events() == 0
+    assert await mongo.payment_events.count_documents({"status": "done"}) == 2
+    assert await artist_totals(mongo) == (1, 90.0)
+
+async def test_outbox_claims_are_leased(mongo, monkeypatch):
+    applied = []
+    async def apply(event):
+        applied.append(event["event_id"])
+    monkeypatch.setattr(server, "apply_payment_event", apply)
+    await insert_event(mongo, "live", "sess-1", status="processing", locked_until=iso(60))
+    await insert_event(mongo, "expired", "sess-2", status="processing", locked_until=iso(-60))
+    await insert_event(mongo, "later", "sess-3", available_at=iso(60))
+
+    assert await process_payment_events() == 1
+    assert applied == ["expired"]
+    event = await mongo.payment_events.find_one({"event_id": "expired"})
+    assert event["status"] == "done"
+    assert event["attempts"] == 1
+    assert "locked_until" not in event
+
+async def test_outbox_backs_off_then_gives_up(mongo, monkeypatch):
+    async def fail(event):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(server, "apply_payment_event", fail)
+    monkeypatch.setattr(server, "OUTBOX_MAX_ATTEMPTS", 2)
+    await insert_event(mongo, "evt-1", "sess-1")
+
+    assert await process_payment_events() == 1
+    event = await mongo.payment_events.find_one({"event_id": "evt-1"})
+    assert (event["status"], event["attempts"], event["last_error"]) == ("pending", 1, "boom")
+    assert event["available_at"] > iso()
+
+    await mongo.payment_events.update_one({"event_id": "evt-1"}, {"$set": {"available_at": iso(-1)}})
+    assert await process_payment_events() == 1
+    event = await mongo.payment_events.find_one({"event_id": "evt-1"})
+    assert (event["status"], event["attempts"]) == ("failed", 2)
+    assert await process_payment_events() == 0
+
+async def test_outbox_retries_a_payment_another_worker_is_fulfilling(mongo):
+    await mongo.users.insert_one({"id": "buyer", "has_membership": False})
+    lease_until = iso(30)
+    await insert_transaction(mongo, "sess-1", "membership", metadata={}, payment_status="paid",
+                             fulfilment_status="in_progress", fulfilment_lease_until=lease_until)
+    await insert_event(mongo, "evt-1", "sess-1")
+
+    # The holder (e.g. a status poll) is still working on it: come back when its lease ends
+    assert await process_payment_events() == 1
+    event = await mongo.payment_events.find_one({"event_id": "evt-1"})
+    assert (event["status"], event["available_at"]) == ("pending", lease_until)
+
+    # The holder failed and released its claim; the retried event finishes the job
+    await mongo.payment_transactions.update_one({"session_id": "sess-1"}, {"$set": {"fulfilment_lease_until": iso(-1)}})
+    await mongo.payment_events.update_one({"event_id": "evt-1"}, {"$set": {"available_at": iso(-1)}})
+    assert await process_payment_events() == 1
+    assert (await mongo.payment_events.find_one({"event_id": "evt-1"}))["status"] == "done"
+    assert (await mongo.payment_transactions.find_one({"session_id": "sess-1"}))["fulfilment_status"] == "fulfilled"
+    assert (await mongo.users.find_one({"id": "buyer"}))["has_membership"] is True
@@ -0,0 +1,32 @@
+import pytest
+
+from server import rebuild_artist_rankings, rerank_artist
+from tests.helpers import iso
+
+pytestmark = pytest.mark.anyio
+
+def profile(artist_id, version=1, **fields):
+    return {"id": artist_id, "user_id": f"user-{artist_id}", "name": artist_id, "city": "Pune", "skills": ["oil"],
+            "annual_fee_paid": True, "rating": 4.0, "total_orders": 1, "version": version, **fields}
+
+async def ranked(mongo) -> dict:
+    return {entry["_id"]: entry["version"] async for entry in mongo.artist_rankings.find({})}
+
+async def test_rerank_follows_the_profile(mongo):
+    await mongo.artist_profiles.insert_one(profile("a"))
+    await rerank_artist("a")
+    assert await ranked(mongo) == {"overall|a": 1, "city:Pune|a": 1, "skill:oil|a": 1}
+    await mongo.artist_profiles.update_one({"id": "a"}, {"$set": {"skills": ["ink"], "version": 2}})
+    await rerank_artist("a")
+    assert await ranked(mongo) == {"overall|a": 2, "city:Pune|a": 2, "skill:ink|a": 2}
+
+async def test_rebuild_keeps_entries_a_concurrent_rerank_wrote(mongo):
+    await mongo.artist_profiles.insert_many([profile("a"), profile("gone", annual_fee_paid=False)])
+    await mongo.artist_rankings.insert_many([
+        # Left over from before the rebuild: the profile no longer ranks
+        {"_id": "overall|gone", "id": "gone", "scope": "overall", "version": 1, "ranked_at": iso(-60)},
+        # Written by a re-rank while the rebuild ran, from a newer profile than it read
+        {"_id": "overall|a", "id": "a", "scope": "overall", "version": 2, "ranked_at": iso(60)},
+    ])
+    await rebuild_artist_rankings()
+    assert await ranked(mongo) == {"overall|a": 2, "city:Pune|a": 1, "skill:oil|a": 1}
@@ -0,0 +1,114 @@
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import server
+from server import Admission, MemoryRateLimitBackend, RateLimit, UserLogin, hash_password, login
+
+pytestmark = pytest.mark.anyio
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(server.time, "monotonic", clock)
+    return clock
+
+def test_rate_limit_from_env(monkeypatch):
+    monkeypatch.setenv("TEST_LIMIT", "5/60")
+    limit = RateLimit.from_env("TEST_LIMIT", "1/1")
+    assert limit.burst == 5
+    assert limit.rate == pytest.approx(5 / 60)
+    monkeypatch.setenv("TEST_LIMIT", "")
+    assert RateLimit.from_env("TEST_LIMIT", "1/1") is None
+
+async def test_burst_then_wait_for_next_token(clock):
+    backend, limit = MemoryRateLimitBackend(100), RateLimit(3, 60)  # a token every 20s
+    assert [await backend.take("ip", limit) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert await backend.take("ip", limit) == pytest.approx(20.0)
+    clock.now += 10
+    assert await backend.take("ip", limit) == pytest.approx(10.0)
+    clock.now += 10
+    assert await backend.take("ip", limit) == 0.0
+    assert await backend.take("ip", limit) == pytest.approx(20.0)
+
+async def test_refill_is_capped_at_burst(clock):
+    backend, limit = MemoryRateLimitBackend(100), RateLimit(3, 60)
+    for _ in range(3):
+        await backend.take("ip", limit)
+    clock.now += 3600
+    assert [await backend.take("ip", limit) for _ in range(4)][-1] == pytest.approx(20.0)
+
+async def test_peek_does_not_spend(clock):
+    backend, limit = MemoryRateLimitBackend(100), RateLimit(1, 10)
+    assert await backend.peek("ip", limit) == 0.0
+    assert await backend.peek("ip", limit) == 0.0
+    assert await backend.take("ip", limit) == 0.0
+    assert await backend.peek("ip", limit) == pytest.approx(10.0)
+
+async def test_buckets_are_per_key(clock):
+    backend, limit = MemoryRateLimitBackend(100), RateLimit(1, 10)
+    assert await backend.take("a", limit) == 0.0
+    assert await backend.take("b", limit) == 0.0
+    assert await backend.take("a", limit) > 0
+
+async def test_least_recently_used_bucket_is_dropped(clock):
+    backend, limit = MemoryRateLimitBackend(2), RateLimit(1, 10)
+    for key in ("a", "b", "c"):
+        await backend.take(key, limit)
+    assert list(backend.buckets) == ["b", "c"]
+    # A dropped bucket starts full again
+    assert await backend.take("a", limit) == 0.0
+
+def request_from(address: str) -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": [], "client": (address, 1234), "app": server.app})
+
+async def test_concurrency_cap_applies_with_rate_limits_off(monkeypatch):
+    monkeypatch.setattr(server, "RATE_LIMIT_ENABLED", False)
+    admission = Admission("test", per_ip=RateLimit(1, 60), per_user=None, max_concurrent=1)
+    first = admission(request_from("10.0.0.1"))
+    await first.__anext__()
+    with pytest.raises(HTTPException) as error:
+        await admission(request_from("10.0.0.2")).__anext__()
+    assert error.value.status_code == 503
+    await first.aclose()
+    assert admission.active == 0
+    # The per-IP bucket stays off: the same address gets in again straight away
+    second = admission(request_from("10.0.0.1"))
+    await second.__anext__()
+    await second.aclose()
+
+@pytest.fixture
+def login_limits(monkeypatch, clock, executors):
+    monkeypatch.setattr(server, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(server, "rate_limiter", MemoryRateLimitBackend(100))
+    monkeypatch.setattr(server.login_admission, "per_user", RateLimit(2, 60))
+    monkeypatch.setattr(server, "LOGIN_FAILURES_PER_ACCOUNT", RateLimit(4, 300))
+
+async def attempt(address: str, password: str) -> int:
+    try:
+        await login(request_from(address), UserLogin(email="artist@example.com", password=password))
+    except HTTPException as error:
+        return error.status_code
+    return 200
+
+async def test_login_failures_are_limited_per_address_and_per_account(mongo, login_limits):
+    await mongo.users.insert_one({
+        "id": "u1", "email": "artist@example.com", "name": "A", "role": "artist",
+        "password": hash_password("right", rounds=4), "has_membership": False, "created_at": "2024-01-01",
+    })
+    # Correct passwords never spend a token
+    assert [await attempt("10.0.0.1", "right") for _ in range(3)] == [200, 200, 200]
+    # Two failures per address and account...
+    assert [await attempt("10.0.0.1", "wrong") for _ in range(3)] == [401, 401, 429]
+    # ...don't hold back other addresses, until the account's own budget runs out
+    assert await attempt("10.0.0.2", "wrong") == 401
+    assert await attempt("10.0.0.3", "wrong") == 401
+    assert await attempt("10.0.0.4", "wrong") == 429
+    assert await attempt("10.0.0.4", "right") == 429
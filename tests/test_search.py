@@ -0,0 +1,54 @@
+import pytest
+
+import server
+from server import decode_cursor, text_search
+
+pytestmark = pytest.mark.anyio
+
+class Cursor:
+    def __init__(self, result):
+        self.result = result
+
+    async def to_list(self, length):
+        return [self.result]
+
+class SearchCollection:
+    """Answers text_search's one aggregation with a canned $facet result
+    (mongomock has no $text) and keeps the pipeline it was given"""
+    def __init__(self, result):
+        self.result = result
+        self.pipeline = None
+
+    def aggregate(self, pipeline, **kwargs):
+        self.pipeline = pipeline
+        return Cursor(self.result)
+
+async def test_text_search_pages_by_relevance_and_counts_facets():
+    collection = SearchCollection({
+        "results": [{"id": "a", "score": 2.5}, {"id": "b", "score": 1.5}, {"id": "c", "score": 1.0}],
+        "category": [{"_id": "oil", "count": 7}, {"_id": "ink", "count": 2}],
+    })
+    docs, facets, next_cursor = await text_search(collection, "monsoon", {"status": "available"}, ["category"], None, 2)
+    assert [doc["id"] for doc in docs] == ["a", "b"]
+    assert facets == {"category": {"oil": 7, "ink": 2}}
+    assert decode_cursor(next_cursor, 2) == [1.5, "b"]
+    assert collection.pipeline[0] == {"$match": {"$text": {"$search": "monsoon"}, "status": "available"}}
+
+    await text_search(collection, "monsoon", {}, ["category"], next_cursor, 2)
+    page = collection.pipeline[2]["$facet"]["results"]
+    assert page[0] == {"$match": {"score": {"$lte": 1.5}, "$or": [{"score": {"$lt": 1.5}}, {"id": {"$gt": "b"}}]}}
+    # Facets still count every match, not just what follows the cursor
+    assert collection.pipeline[2]["$facet"]["category"][0] == {"$unwind": "$category"}
+
+async def test_search_filters_artists_by_city_and_skill(client, monkeypatch):
+    calls = []
+    async def fake_text_search(collection, text, query, facets, cursor, limit):
+        calls.append((text, query, facets, cursor, limit))
+        return [], {}, None
+    monkeypatch.setattr(server, "text_search", fake_text_search)
+
+    response = await client.get("/api/search", params={"q": "oil portraits", "type": "artists", "city": "Pune", "skill": "Oil"})
+    assert response.status_code == 200
+    assert calls == [("oil portraits", {"annual_fee_paid": True, "city": "Pune", "skills": "Oil"}, ["city", "skills"], None, 20)]
+    assert (await client.get("/api/search", params={"q": "x", "type": "exhibitions"})).status_code == 422
+    assert (await client.get("/api/search", params={"q": ""})).status_code == 422
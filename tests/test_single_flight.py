@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from server import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+async def test_concurrent_calls_share_one_load():
+    flight, release, loads = SingleFlight(), asyncio.Event(), []
+    async def loader():
+        loads.append(1)
+        await release.wait()
+        return {"id": "x"}
+
+    calls = [asyncio.ensure_future(flight.do("k", loader)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*calls) == [{"id": "x"}] * 5
+    assert len(loads) == 1
+    assert flight.stats() == {"loads": 1, "shared": 4, "cached": 0, "in_flight": 0}
+
+async def test_failure_reaches_every_caller_and_is_not_kept():
+    flight = SingleFlight()
+    async def loader():
+        await asyncio.sleep(0)
+        raise LookupError("down")
+
+    results = await asyncio.gather(*(flight.do("k", loader) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, LookupError) for result in results)
+    assert flight.in_flight == {}
+    async def recovered():
+        return "ok"
+    assert await flight.do("k", recovered) == "ok"
+
+async def test_cancelled_caller_does_not_cancel_the_load():
+    flight, release = SingleFlight(), asyncio.Event()
+    async def loader():
+        await release.wait()
+        return "ok"
+
+    first = asyncio.ensure_future(flight.do("k", loader))
+    second = asyncio.ensure_future(flight.do("k", loader))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+    assert await second == "ok"
+
+async def test_recent_results_are_cached_including_none():
+    flight, loads = SingleFlight(cache_seconds=60), []
+    async def loader():
+        loads.append(1)
+        return None
+
+    assert await flight.do("k", loader) is None
+    assert await flight.do("k", loader) is None
+    assert len(loads) == 1
+    assert flight.cached == 1
@@ -0,0 +1,45 @@
+import pytest
+
+from server import ARTIST_VIEWS, ARTWORK_VIEWS, NEWEST_FIRST, RANKED, ArtworkResponse, list_view
+
+pytestmark = pytest.mark.anyio
+
+VARIANT = {"url": "/api/media/x.webp", "width": 10, "height": 10}
+
+async def insert_artworks(mongo, count):
+    await mongo.artworks.insert_many([
+        {"id": f"aw-{i}", "artist_id": "artist-1", "title": f"T{i}", "description": "long text", "category": "oil",
+         "price": 100.0 + i, "currency": "INR", "image_url": "/api/media/x.webp", "dimensions": "",
+         "image_variants": {"original": VARIANT, "thumb": VARIANT, "w960": VARIANT},
+         "status": "available", "created_at": f"2024-01-0{i + 1}T00:00:00"}
+        for i in range(count)
+    ])
+
+async def test_fields_limit_what_a_listing_returns_and_paging_still_works(client, mongo):
+    await insert_artworks(mongo, 3)
+    first = await client.get("/api/artworks", params={"fields": "title, price", "limit": 2})
+    assert first.json() == [{"title": "T2", "price": 102.0}, {"title": "T1", "price": 101.0}]
+    rest = await client.get("/api/artworks", params={"fields": "title,price", "limit": 2, "cursor": first.headers["x-next-cursor"]})
+    assert rest.json() == [{"title": "T0", "price": 100.0}]
+
+async def test_summary_view_drops_the_description_and_extra_variants(client, mongo):
+    await insert_artworks(mongo, 1)
+    [tile] = (await client.get("/api/artworks", params={"view": "summary"})).json()
+    assert "description" not in tile
+    assert tile["image_variants"] == {"thumb": VARIANT}
+
+async def test_unknown_views_and_fields_are_rejected(client, mongo):
+    assert (await client.get("/api/artworks", params={"view": "poster"})).status_code == 400
+    response = await client.get("/api/artworks", params={"fields": "title,secret"})
+    assert response.status_code == 400
+    assert "secret" in response.json()["detail"]
+
+def test_projection_reads_the_sort_keys_and_slices_card_arrays():
+    view = list_view(ARTIST_VIEWS, "card", "city", RANKED)
+    assert list(view.model.model_fields) == ["city"]
+    assert view.projection == {"_id": 0, "city": 1, **{field: 1 for field, _ in RANKED}}
+    card = list_view(ARTIST_VIEWS, "card", None).projection
+    assert card["portfolio_images"] == {"$concatArrays": [{"$slice": [{"$ifNull": ["$portfolio_images", []]}, 1]}]}
+    # Asking for every field of the full view is just the full view
+    every_field = ",".join(ArtworkResponse.model_fields)
+    assert list_view(ARTWORK_VIEWS, "full", every_field, NEWEST_FIRST).full is True